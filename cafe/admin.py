@@ -1,5 +1,10 @@
-from django.contrib import admin
-from .models import Item, ItemCategory, Customer, Address, Cart, CartItem, Order, OrderItem, PaymentConfig, Offer, WishlistItem, Payment
+from collections import Counter
+
+from django.contrib import admin, messages
+from django.db import transaction
+from .models import Item, ItemCategory, Customer, Address, Cart, CartItem, Order, OrderItem, PaymentConfig, Offer, WishlistItem, Payment, ArchivedOrder, ArchivedOrderItem, TypoCorrection
+from .rollups import order_snapshot, record_order_edits, record_orders_placed
+from .services import settle_payments
 
 
 @admin.register(ItemCategory)
@@ -16,6 +21,13 @@ class ItemAdmin(admin.ModelAdmin):
     search_fields = ("name", "description")
 
 
+@admin.register(TypoCorrection)
+class TypoCorrectionAdmin(admin.ModelAdmin):
+    list_display = ("wrong", "correct", "updated_at")
+    list_editable = ("correct",)
+    search_fields = ("wrong", "correct")
+
+
 @admin.register(PaymentConfig)
 class PaymentConfigAdmin(admin.ModelAdmin):
     list_display = ("upi_id", "ifsc_code", "account_number", "created_at")
@@ -43,10 +55,67 @@ class OrderAdmin(admin.ModelAdmin):
     list_filter = ("status", "order_type")
     inlines = [OrderItemInline]
 
+    def save_model(self, request, obj, form, change):
+        # Keep the reporting rollups in step with hand edits: note what the order counted
+        # for before the save, and move them by the difference once the lines are saved too
+        obj._rollup_before = order_snapshot([obj.pk]) if change else None
+        super().save_model(request, obj, form, change)
+
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        obj = form.instance
+        if obj._rollup_before is None:
+            record_orders_placed([obj])
+        else:
+            record_order_edits(obj._rollup_before)
+
+    def delete_model(self, request, obj):
+        before = order_snapshot([obj.pk])
+        super().delete_model(request, obj)
+        record_order_edits(before)
+
+    def delete_queryset(self, request, queryset):
+        with transaction.atomic():
+            before = order_snapshot(list(queryset.values_list("pk", flat=True)))
+            super().delete_queryset(request, queryset)
+            record_order_edits(before)
+
+
+class ArchivedOrderItemInline(admin.TabularInline):
+    model = ArchivedOrderItem
+    extra = 0
+    can_delete = False
+    readonly_fields = ("item", "quantity", "unit_price")
+
+
+@admin.register(ArchivedOrder)
+class ArchivedOrderAdmin(admin.ModelAdmin):
+    # Read-only: archived orders are history and already counted in the rollups
+    list_display = ("id", "order_type", "status", "customer", "total_amount", "created_at", "archived_at")
+    list_filter = ("status", "order_type")
+    inlines = [ArchivedOrderItemInline]
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
 
 @admin.register(Customer)
 class CustomerAdmin(admin.ModelAdmin):
-    list_display = ("name", "phone", "email", "total_spent", "created_at")
+    list_display = ("name", "phone", "email", "lifetime_spend", "lifetime_orders", "lifetime_items", "last_order_at", "created_at")
+    readonly_fields = ("lifetime_spend", "lifetime_orders", "lifetime_items", "last_order_at")
+
+    def save_model(self, request, obj, form, change):
+        if not change:
+            obj.save()
+        elif form.changed_data:
+            # The stats are incremented in place by orders; never write back the loaded values
+            obj.save(update_fields=[*form.changed_data, 'updated_at'])
 
 
 @admin.register(Address)
@@ -73,19 +142,18 @@ class PaymentAdmin(admin.ModelAdmin):
     list_filter = ("status",)
     actions = ["mark_verified", "mark_failed"]
 
+    def _settle(self, request, queryset, action):
+        results = settle_payments(queryset.values_list('pk', flat=True), action)
+        counts = Counter(results.values())
+        done = counts.pop('verified', 0) + counts.pop('rejected', 0)
+        self.message_user(request, f"{'Verified' if action == 'verify' else 'Rejected'} {done} payment(s)")
+        if counts:
+            skipped = ", ".join(f"{n} {reason.replace('_', ' ')}" for reason, n in counts.items())
+            self.message_user(request, f"Skipped: {skipped}", level=messages.WARNING)
+
     def mark_verified(self, request, queryset):
-        from django.utils import timezone
-        updated = 0
-        for p in queryset:
-            p.status = 'VERIFIED'
-            p.verified_at = timezone.now()
-            p.save()
-            # mark order as PAID when payment verified
-            p.order.status = 'PAID'
-            p.order.save()
-            updated += 1
-        self.message_user(request, f"Verified {updated} payment(s)")
+        # mark orders as PAID when payments verified
+        self._settle(request, queryset, 'verify')
 
     def mark_failed(self, request, queryset):
-        updated = queryset.update(status='FAILED')
-        self.message_user(request, f"Marked {updated} payment(s) as failed")
+        self._settle(request, queryset, 'reject')
@@ -5,8 +5,11 @@ from decimal import Decimal
 from typing import Dict, List, Optional, Tuple
 import difflib
 from django.db import transaction
-from django.db.models import Sum
-from .models import Address, Customer, Item, Order, OrderItem, Payment
+from .models import Address, Customer, Order
+from .combos import parse_budget_query
+from .intents import Intent, IntentRouter
+from .menu import get_menu_snapshot, top_sellers
+from .services import OrderPlacementError, find_idempotent_order_id, place_order
 
 # ---------- State Management ----------
 
@@ -61,23 +64,50 @@ class CafeAIEngine:
     DINING_FIELDS = ["name", "phone", "table_number"]
     DELIVERY_FIELDS = ["name", "phone", "address_line1", "city", "postal_code"]
 
-    def __init__(self, request):
+    # What a message can ask for, best first: when several match, the earliest
+    # one whose handler answers wins (a handler returning None passes it on)
+    ROUTER = IntentRouter([
+        Intent("delivery", keywords=DELIVERY_KEYWORDS),  # order type only, no reply
+        Intent("dining", keywords=DINING_KEYWORDS),  # order type only, no reply
+        Intent("remove", keywords=("remove", "clear", "cancel")),
+        Intent("fresh_order", keywords=("only", "just")),
+        Intent("details"),  # added while checkout details are being collected
+        Intent("best_sellers", keywords=("best seller", "best-selling", "popular", "trend")),
+        Intent("most_expensive", keywords=("most expensive", "highest price")),
+        Intent("best_item", keywords=("best", "top rated", "best selling")),
+        Intent("price", keywords=("price",)),
+        Intent("budget", keywords=("budget", "combo"),
+               patterns=(r"(?:under|below|less than|within)\s*(?:₹|rs\.?)?\s*\d+",)),
+        Intent("menu", keywords=("menu",)),
+        Intent("category", keywords=("flavour", "type", "available")),
+        Intent("greeting", keywords=("hello",)),
+        Intent("thanks", keywords=("thanks", "thank you")),
+        Intent("summary", keywords=("summary", "cart")),
+        Intent("reset", keywords=("reset", "clear")),
+        Intent("confirm", keywords=("confirm",)),
+        Intent("order", keywords=ORDER_KEYWORDS),
+    ])
+
+    def __init__(self, request, idempotency_key: Optional[str] = None):
         self.request = request
+        self.idempotency_key = idempotency_key
         self.message = ""
         self.state = AssistantState.from_session(request.session.get("ai_state"))
-        self.menu = self._load_menu()
-        self.top_sellers = self._load_top_sellers()
-
-    @staticmethod
-    def _has_keywords(text: str, keywords: Tuple[str, ...]) -> bool:
-        """Check if any of the keywords are present in the text."""
-        return any(keyword in text for keyword in keywords)
-
-    def _detect_order_type(self, text: str) -> None:
+        # Shared per-process snapshot and a briefly cached best-seller list (see cafe.menu)
+        snapshot = get_menu_snapshot()
+        self.menu = snapshot.items
+        self.index = snapshot.index
+        self.normalizer = snapshot.normalizer
+        self.planner = snapshot.planner
+        self._typo_fixed: Dict[str, str] = {}
+        self.top_sellers = top_sellers()
+        self.intents: List[str] = []
+
+    def _detect_order_type(self) -> None:
         """Detect whether the order type is delivery or dining based on message."""
-        if any(keyword in text for keyword in self.DELIVERY_KEYWORDS):
+        if "delivery" in self.intents:
             self.state.order_type = "DELIVERY"
-        elif any(keyword in text for keyword in self.DINING_KEYWORDS):
+        elif "dining" in self.intents:
             self.state.order_type = "DINING"
 
     def handle(self, message: str) -> Dict:
@@ -90,119 +120,117 @@ class CafeAIEngine:
             return self._reply("Please type a question about the menu, pricing, or ordering.")
 
         text = self.message.lower()
-        self._detect_order_type(text)
-
-        # --- Cart removal logic ---
-        if any(word in text for word in ("remove", "clear", "cancel")):
-            to_remove = self._extract_remove_items(text)
-            if to_remove:
-                for item_id in to_remove:
-                    self.state.items = [item for item in self.state.items if item.get("id") != item_id]
-                if self.state.items:
-                    return self._order_summary("Updated cart after removal:")
-                else:
-                    self.state.reset()
-                    return self._reply("All requested items removed. Your cart is now empty. What would you like to order?")
-            elif self.state.items:
-                self.state.reset()
-                return self._reply("I've cleared your cart. What would you like to order now?")
-            return self._reply("Your cart is already empty. What would you like to order?")
-
-        # --- Only/just new order intent (discard previous cart) ---
-        if "only" in text or "just" in text:
-            self.state.items = []
-            if re.search(r"\d", text) or self._match_items(text):
-                return self._handle_order_intent(text)
-
-        # --- Awaiting details for order completion ---
-        if self.state.awaiting_fields:
-            return self._capture_detail_input()
-
-        # --- Best-selling item logic ---
-        if self._has_keywords(text, ("best seller", "best-selling", "popular", "trend")):
-            return self._best_selling_reply()
-
-        # --- Most expensive item query ---
-        if "most expensive" in text or "highest price" in text:
-            expensive_item = max(self.menu, key=lambda x: float(x["price"]), default=None)
-            if expensive_item:
-                self.state.last_item = expensive_item["name"]
-                return self._reply(f"The most expensive item is {expensive_item['name']} (₹{expensive_item['price']}). Would you like to order it?")
-            return self._reply("Sorry, currently I don't have this information.")
-
-        # --- Best item query, also sets context for follow-up ---
-        if "best" in text or "top rated" in text or "best selling" in text:
-            if self.top_sellers:
-                best = self.top_sellers[0]
-                self.state.last_item = best['name']
-                return self._reply(f"Our best selling item right now is {best['name']}. Would you like to know its price or add it to your cart?")
-            return self._reply("Sorry, currently I don't have this information.")
-
-        # --- Handle price queries contextually/professionally ---
-        if "price" in text:
-            probable_item = self._get_item_from_text(text)
-            if not probable_item and self.state.last_item:
-                probable_item = self.state.last_item
-            if probable_item:
-                for item in self.menu:
-                    if probable_item.lower() == item["name"].lower():
-                        self.state.last_item = item["name"]
-                        return self._reply(f"The price of {item['name']} is ₹{item['price']}. Would you like to add it to your cart?")
-                return self._reply("Sorry, price information not found for that item.")
-            return self._reply("Which item would you like the price for? Please specify.")
-
-        # --- Budget-based suggestions ---
-        if self._is_budget_query(text):
-            return self._budget_reply(text)
-
-        # --- Menu display: full menu, or category menu if specified/fuzzy matched ---
-        if "menu" in text:
-            if "category" in text or self._mentions_category(text):
-                return self._category_reply(text)
-            else:
-                return self._full_menu_overview()
-
-        # --- Flavour/type/availability queries; fuzzy match with category names ---
-        if "flavour" in text or "type" in text or "available" in text:
-            for cat in self._category_names():
-                if cat.lower() in text:
-                    items = [m for m in self.menu if (m["category__name"] or "").lower() == cat.lower()]
-                    listing = ", ".join(f"{m['name']} (₹{m['price']})" for m in items)
-                    return self._reply(f"In {cat}, we have: {listing}.")
-            return self._full_menu_overview()
-
-        # --- intro and end + Show summary/cart ---
-        # if "hello" or "Hello" in text:
-        #     return self._reply("Hi! I have limited permission and abilities however order, menu or pricing related issues are pea nuts for me 😉. Please tell me how can I help you?")
-        # if "Thanks" or "thanks" in text:
-        #     return ("I am glad! 😌") 
-
-        if "Hello" in text or "hello" in text:
-            return self._reply("Hi! I have limited permission and abilities however order, menu or pricing related issues are pea nuts for me 😉. Please tell me how can I help you?")
-        if "Thanks" in text or "thanks" in text or "thank you" in text or "Thank you" in text:
-            return self._reply("I am glad! 😌")
-        if "summary" in text or "cart" in text:
-            return self._order_summary()
-
-        # --- Reset/clear ---
-        if "reset" in text or "clear" in text:
-            self.state.reset()
-            return self._reply("Your AI cart is now empty. What would you like to order?")
-
-        # --- Confirm/checkout ---
-        if "confirm" in text:
-            self.state.summary_confirmed = True
-            return self._finalize_order()
-
-        # --- Order placement logic via keywords and item matching ---
-        if self._has_order_intent(text):
-            return self._handle_order_intent(text)
+        self.intents = self.ROUTER.route(text, also=("details",) if self.state.awaiting_fields else ())
+        self._detect_order_type()
+        for intent in self.intents:
+            handler = self.ROUTER.handlers.get(intent)
+            reply = handler(self, text) if handler else None
+            if reply is not None:
+                return reply
 
         # --- Fallback generic help reply ---
         return self._reply(
             "I can show best sellers, the full menu, suggest items by budget or category, and place orders. What would you like to do?"
         )
 
+    # ---------- Intent Handlers ----------
+
+    @ROUTER.handles("remove")
+    def _remove_reply(self, text: str) -> Dict:
+        to_remove = self._extract_remove_items(text)
+        if to_remove:
+            for item_id in to_remove:
+                self.state.items = [item for item in self.state.items if item.get("id") != item_id]
+            if self.state.items:
+                return self._order_summary("Updated cart after removal:")
+            self.state.reset()
+            return self._reply("All requested items removed. Your cart is now empty. What would you like to order?")
+        if self.state.items:
+            self.state.reset()
+            return self._reply("I've cleared your cart. What would you like to order now?")
+        return self._reply("Your cart is already empty. What would you like to order?")
+
+    @ROUTER.handles("fresh_order")
+    def _fresh_order_reply(self, text: str) -> Optional[Dict]:
+        """'Only'/'just' starts the cart over; an actual order in the same message is then placed."""
+        self.state.items = []
+        if re.search(r"\d", text) or self._match_items(text):
+            return self._handle_order_intent(text)
+        return None
+
+    @ROUTER.handles("details")
+    def _details_reply(self, text: str) -> Dict:
+        return self._capture_detail_input()
+
+    @ROUTER.handles("most_expensive")
+    def _most_expensive_reply(self, text: str) -> Dict:
+        expensive_item = max(self.menu, key=lambda x: float(x["price"]), default=None)
+        if expensive_item:
+            self.state.last_item = expensive_item["name"]
+            return self._reply(f"The most expensive item is {expensive_item['name']} (₹{expensive_item['price']}). Would you like to order it?")
+        return self._reply("Sorry, currently I don't have this information.")
+
+    @ROUTER.handles("best_item")
+    def _best_item_reply(self, text: str) -> Dict:
+        """The single best seller, remembered for follow-ups ("its price?")."""
+        if self.top_sellers:
+            best = self.top_sellers[0]
+            self.state.last_item = best['name']
+            return self._reply(f"Our best selling item right now is {best['name']}. Would you like to know its price or add it to your cart?")
+        return self._reply("Sorry, currently I don't have this information.")
+
+    @ROUTER.handles("price")
+    def _price_reply(self, text: str) -> Dict:
+        probable_item = self._get_item_from_text(text)
+        if not probable_item and self.state.last_item:
+            probable_item = self.state.last_item
+        if probable_item:
+            item = self.index.item_named(probable_item)
+            if item:
+                self.state.last_item = item["name"]
+                return self._reply(f"The price of {item['name']} is ₹{item['price']}. Would you like to add it to your cart?")
+            return self._reply("Sorry, price information not found for that item.")
+        return self._reply("Which item would you like the price for? Please specify.")
+
+    @ROUTER.handles("menu")
+    def _menu_reply(self, text: str) -> Dict:
+        """The full menu, or one category's items if the message names one (typos allowed)."""
+        if "category" in text or self._mentions_category(text):
+            return self._category_reply(text)
+        return self._full_menu_overview()
+
+    @ROUTER.handles("category")
+    def _category_query_reply(self, text: str) -> Dict:
+        """Flavour/type/availability questions, answered per category when one is named."""
+        for cat in self._category_names():
+            if cat.lower() in text:
+                items = [m for m in self.menu if (m["category__name"] or "").lower() == cat.lower()]
+                listing = ", ".join(f"{m['name']} (₹{m['price']})" for m in items)
+                return self._reply(f"In {cat}, we have: {listing}.")
+        return self._full_menu_overview()
+
+    @ROUTER.handles("greeting")
+    def _greeting_reply(self, text: str) -> Dict:
+        return self._reply("Hi! I have limited permission and abilities however order, menu or pricing related issues are pea nuts for me 😉. Please tell me how can I help you?")
+
+    @ROUTER.handles("thanks")
+    def _thanks_reply(self, text: str) -> Dict:
+        return self._reply("I am glad! 😌")
+
+    @ROUTER.handles("summary")
+    def _summary_reply(self, text: str) -> Dict:
+        return self._order_summary()
+
+    @ROUTER.handles("reset")
+    def _reset_reply(self, text: str) -> Dict:
+        self.state.reset()
+        return self._reply("Your AI cart is now empty. What would you like to order?")
+
+    @ROUTER.handles("confirm")
+    def _confirm_reply(self, text: str) -> Dict:
+        self.state.summary_confirmed = True
+        return self._finalize_order()
+
     # ---------- Utility & Data Access Methods ----------
 
     def persist(self) -> None:
@@ -210,29 +238,8 @@ class CafeAIEngine:
         self.request.session["ai_state"] = self.state.as_dict()
         self.request.session.modified = True
 
-    def _load_menu(self) -> List[Dict]:
-        """Load all active menu items from the database."""
-        qs = (
-            Item.objects.filter(is_active=True)
-            .select_related("category")
-            .values("id", "name", "price", "description", "category__name")
-            .order_by("category__display_order", "name")
-        )
-        return list(qs)
-
-    def _load_top_sellers(self) -> List[Dict]:
-        """Find top-selling items for highlights (from OrderItem table)."""
-        top_qs = (
-            OrderItem.objects.values("item_id", "item__name")
-            .annotate(total_qty=Sum("quantity"))
-            .order_by("-total_qty")[:5]
-        )
-        return [
-            {"id": row["item_id"], "name": row["item__name"], "total": row["total_qty"]}
-            for row in top_qs if row["item_id"]
-        ]
-
-    def _best_selling_reply(self) -> Dict:
+    @ROUTER.handles("best_sellers")
+    def _best_selling_reply(self, text: str = "") -> Dict:
         """Reply with best sellers, for generic highlight queries."""
         if not self.top_sellers:
             preview = ", ".join(f"{m['name']} (₹{m['price']})" for m in self.menu[:3])
@@ -240,21 +247,33 @@ class CafeAIEngine:
         names = ", ".join(f"{row['name']}" for row in self.top_sellers)
         return self._reply(f"Our best sellers right now are {names}. Should I add one to your order?")
 
-    def _is_budget_query(self, text: str) -> bool:
-        """Detect budget queries using regex."""
-        return "budget" in text or bool(re.search(r"(under|below|less than)\s*\d+", text))
-
+    @ROUTER.handles("budget")
     def _budget_reply(self, text: str) -> Dict:
-        """Suggest items below a user-specified price ceiling."""
-        match = re.search(r"(\d+)(?:\s*rs|₹)?", text)
-        if not match:
-            return self._reply("Share your target budget (e.g., 'under 150') and I'll suggest items.")
-        ceiling = float(match.group(1))
-        filtered = [m for m in self.menu if float(m["price"]) <= ceiling]
+        """Suggest items, or combos for a group ("for 3 under 500"), within a price ceiling."""
+        ceiling, people = parse_budget_query(text)
+        if ceiling is None:
+            return self._reply("Share your target budget (e.g., 'under 150' or 'for 3 under 500') and I'll suggest items.")
+        if people or "combo" in text:
+            return self._combo_reply(ceiling, people or 1)
+        filtered = self.planner.under(ceiling)
         if not filtered:
-            return self._reply(f"I don't have anything under ₹{ceiling:.0f}. Try a higher budget?")
-        preview = ", ".join(f"{m['name']} (₹{m['price']})" for m in filtered[:6])
-        return self._reply(f"Within ₹{ceiling:.0f}, you could try {preview}. Want me to add any of these?")
+            return self._reply(f"I don't have anything under ₹{ceiling}. Try a higher budget?")
+        # The priciest items that still fit: the most you can get for the money
+        preview = ", ".join(f"{m['name']} (₹{m['price']})" for m in reversed(filtered[-6:]))
+        return self._reply(f"Within ₹{ceiling}, you could try {preview}. Want me to add any of these?")
+
+    def _combo_reply(self, ceiling: int, people: int) -> Dict:
+        """Reply with the best combos for ``people`` within ``ceiling`` rupees."""
+        combos = self.planner.plan(ceiling, people, popular_ids=[row["id"] for row in self.top_sellers])
+        group = "you" if people == 1 else f"{people} people"
+        if not combos:
+            return self._reply(f"I couldn't put together a combo for {group} within ₹{ceiling}. Try a higher budget?")
+        options = "; ".join(
+            f"{n}) " + ", ".join(f"{qty} x {item['name']}" for item, qty in combo.lines) + f" (₹{combo.total})"
+            for n, combo in enumerate(combos, start=1)
+        )
+        item, qty = combos[0].lines[0]
+        return self._reply(f"For {group} within ₹{ceiling}: {options}. Tell me what to add, e.g. 'order {qty} {item['name']}'.")
 
     def _mentions_category(self, text: str) -> bool:
         """Return True if a category or its fuzzy match is in the message."""
@@ -292,17 +311,14 @@ class CafeAIEngine:
         """Get all available category names in sorted order."""
         return sorted({row["category__name"] or "Others" for row in self.menu})
 
-    def _has_order_intent(self, text: str) -> bool:
-        """Detect if the user wishes to place or update an order."""
-        return any(keyword in text for keyword in self.ORDER_KEYWORDS)
-
+    @ROUTER.handles("order")
     def _handle_order_intent(self, text: str) -> Dict:
         """Parse and handle user messages with ordering intent."""
         matched = self._match_items(text)
         if not matched:
             return self._reply("I couldn't find that item. Try 'order 1 cappuccino' or 'add veg biryani x2'.")
         for item_id, qty in matched:
-            menu_item = next((m for m in self.menu if m["id"] == item_id), None)
+            menu_item = self.index.item(item_id)
             if not menu_item:
                 continue
             existing = next((row for row in self.state.items if row["id"] == item_id), None)
@@ -321,83 +337,30 @@ class CafeAIEngine:
     def _get_item_from_text(self, text: str) -> Optional[str]:
         """
         Detect which item is mentioned in the user’s text, robust to typos.
-        Uses fuzzy matching.
+        Exact names win; otherwise the most specific fuzzy match.
         """
         text_lower = self._fix_typos(text.lower())
-        item_names = [item["name"].lower() for item in self.menu]
-        for name in item_names:
-            if name in text_lower:
-                return name
-        probable_item = difflib.get_close_matches(text_lower, item_names, n=1, cutoff=0.7)
-        if probable_item:
-            return probable_item[0]
-        return None
+        named = self.index.mentioned(text_lower)
+        item = named[0] if named else self.index.closest(text_lower)
+        return item["name"].lower() if item else None
 
     def _match_items(self, text: str) -> List[Tuple[int, int]]:
         """
         Find and return items matched in the message,
-        with quantity handling and typo correction.
+        with quantity handling and typo correction (see cafe.matching).
         """
-        matches: List[Tuple[int, int]] = []
-        text_lower = self._fix_typos(text.lower())
-        seen_ids = set()
-
-        for item in self.menu:
-            name = item["name"].lower()
-            words = [w for w in name.split() if len(w) > 2]
-            qty = 0
-            # Direct substring / word matches
-            if name in text_lower or all(w in text_lower for w in words):
-                qty = self._extract_quantity(text_lower, words[-1] if words else name)
-            else:
-                best_match = difflib.get_close_matches(name, [text_lower], n=1, cutoff=0.7)
-                if best_match:
-                    qty = self._extract_quantity(text_lower, words[-1] if words else name)
-            if qty and item["id"] not in seen_ids:
-                matches.append((item["id"], qty))
-                seen_ids.add(item["id"])
-        return matches
+        return self.index.match_items(self._fix_typos(text.lower()))
 
     def _fix_typos(self, text: str) -> str:
-        """Correct common spelling mistakes in item names within messages."""
-        typo_map = {
-            "coffe": "coffee",
-            "cofee": "coffee",
-            "expresso": "espresso",
-            "mocctail": "mocktail",
-            "mojitoo": "mojito",
-            "samosaa": "samosa",
-            "samos": "samosa",
-            "latte": "latte",
-            "lattte": "latte",
-            "capuccino": "cappuccino",
-            "capucino": "cappuccino",
-            "piza": "pizza",
-        }
-        for wrong, correct in typo_map.items():
-            text = re.sub(rf"\b{re.escape(wrong)}\b", correct, text)
-        return text
-
-    def _extract_quantity(self, text: str, token: str) -> int:
-        """Extract numerical quantity for an order given a matched token."""
-        pattern = rf"(\d+)\s+{re.escape(token)}"
-        match = re.search(pattern, text)
-        if match:
-            return max(1, int(match.group(1)))
-        match = re.search(rf"{re.escape(token)}\s*x?(\d+)", text)
-        if match:
-            return max(1, int(match.group(1)))
-        return 1
+        """Correct known misspellings (Typo corrections in the admin); memoized for this request."""
+        fixed = self._typo_fixed.get(text)
+        if fixed is None:
+            fixed = self._typo_fixed[text] = self.normalizer(text)
+        return fixed
 
     def _extract_remove_items(self, text: str) -> List[int]:
         """Only remove specifically mentioned items, not all by default."""
-        ids = []
-        text_lower = self._fix_typos(text.lower())
-        for item in self.menu:
-            name = item["name"].lower()
-            if name in text_lower:
-                ids.append(item["id"])
-        return ids
+        return [item_id for item_id, _qty in self._match_items(text)]
 
     def _order_summary(self, prefix: str = "Here is your current order:") -> Dict:
         """Summarize all items currently in the order."""
@@ -473,18 +436,22 @@ class CafeAIEngine:
             self.state.awaiting_fields = missing
             label = self._field_label(missing[0])
             return self._reply(f"I need your {label} to continue.")
-        order = self._create_order(order_type)
+        try:
+            order = self._create_order(order_type)
+        except OrderPlacementError as exc:
+            return self._reply(f"{exc} Please review your cart and try again.")
         self.state.reset()
+        return self.order_placed_reply(order.id)
+
+    @staticmethod
+    def order_placed_reply(order_id: int) -> Dict:
         return {
-            "reply": f"Order #{order.id} is placed! Thank you for ordering; our team will take care of the rest.",
-            "order_id": order.id,
+            "reply": f"Order #{order_id} is placed! Thank you for ordering; our team will take care of the rest.",
+            "order_id": order_id,
         }
 
     def _guess_order_type(self) -> str:
-        text = self.message.lower()
-        if any(keyword in text for keyword in self.DELIVERY_KEYWORDS):
-            return "DELIVERY"
-        return "DINING"
+        return "DELIVERY" if "delivery" in self.intents else "DINING"
 
     def _collect_missing_details(self, order_type: str) -> List[str]:
         required = self.DELIVERY_FIELDS if order_type == "DELIVERY" else self.DINING_FIELDS
@@ -493,17 +460,12 @@ class CafeAIEngine:
 
     def _create_order(self, order_type: str) -> Order:
         """Create Order, Items, Address, and Payment in atomic DB transaction."""
-        items = self.state.items
-        total = sum(Decimal(str(row["price"])) * int(row["qty"]) for row in items)
+        # A retried message whose order already exists creates nothing, not even an address
+        existing_id = find_idempotent_order_id(self.idempotency_key)
+        if existing_id:
+            return Order.objects.get(pk=existing_id)
         customer = self._get_or_create_customer()
         with transaction.atomic():
-            order = Order.objects.create(
-                customer=customer,
-                order_type=order_type,
-                table_no=self.state.details.get("table_number", "") if order_type == "DINING" else "",
-                total_amount=total,
-                status="PENDING_PAYMENT",
-            )
             address = None
             if order_type == "DELIVERY":
                 address = Address.objects.create(
@@ -512,22 +474,20 @@ class CafeAIEngine:
                     city=self.state.details.get("city", ""),
                     postal_code=self.state.details.get("postal_code", ""),
                 )
-                order.delivery_address = address
-                order.save(update_fields=["delivery_address"])
-            for row in items:
-                OrderItem.objects.create(
-                    order=order,
-                    item_id=row["id"],
-                    quantity=int(row["qty"]),
-                    unit_price=Decimal(str(row["price"])),
-                )
-            Payment.objects.create(
-                order=order,
-                amount=total,
+            placed = place_order(
+                customer=customer,
+                order_type=order_type,
+                lines=[(row["id"], row["qty"]) for row in self.state.items],
+                table_no=self.state.details.get("table_number", ""),
+                delivery_address=address,
                 reference=self.state.details.get("payment_reference", ""),
-                status="PENDING",
+                idempotency_key=self.idempotency_key,
+                idempotency_scope="AI_CHAT",
             )
-        return order
+            if placed.replayed:
+                # A concurrent submission with the same key got there first; drop our address
+                transaction.set_rollback(True)
+        return placed.order
 
     def _get_or_create_customer(self) -> Customer:
         user = self.request.user
@@ -0,0 +1,70 @@
+"""
+Cold storage for finished orders.
+
+Orders that reached a final status (COMPLETED, CANCELED, REJECTED) and have
+not been touched for a while are moved, with their items and payment, from
+Order/OrderItem/Payment into the ArchivedOrder tables by
+``manage.py archive_orders``. The kitchen, floor and payment queues then
+only ever scan live orders.
+
+Archived rows keep their primary keys and timestamps, and the rollups are
+left as they are, so analytics, order history, exports and order tracking
+read the archive alongside the live tables and see the same totals as
+before.
+"""
+import heapq
+from datetime import timedelta
+
+from django.db import transaction
+from django.utils import timezone
+
+from .models import ArchivedOrder, ArchivedOrderItem, ArchivedPayment, Order, OrderItem, Payment
+
+FINISHED_STATUSES = ('COMPLETED', 'CANCELED', 'REJECTED')
+DEFAULT_ARCHIVE_AFTER_DAYS = 90
+
+
+def _copied_fields(model):
+    return [f.attname for f in model._meta.concrete_fields if f.name != 'archived_at']
+
+
+def archivable_orders(older_than_days=DEFAULT_ARCHIVE_AFTER_DAYS):
+    """Finished orders whose last change is older than ``older_than_days``."""
+    cutoff = timezone.now() - timedelta(days=older_than_days)
+    return Order.objects.filter(status__in=FINISHED_STATUSES, updated_at__lt=cutoff)
+
+
+def archive_batch(orders, limit):
+    """
+    Move up to ``limit`` of ``orders`` (lowest ids first) into the archive,
+    with their items and payment, in one transaction. Returns how many moved.
+    """
+    with transaction.atomic():
+        ids = list(orders.select_for_update().order_by('pk').values_list('pk', flat=True)[:limit])
+        if not ids:
+            return 0
+        ArchivedOrder.objects.bulk_create(
+            ArchivedOrder(**row) for row in Order.objects.filter(pk__in=ids).values(*_copied_fields(ArchivedOrder))
+        )
+        ArchivedOrderItem.objects.bulk_create(
+            ArchivedOrderItem(**row)
+            for row in OrderItem.objects.filter(order_id__in=ids).values(*_copied_fields(ArchivedOrderItem))
+        )
+        ArchivedPayment.objects.bulk_create(
+            ArchivedPayment(**row)
+            for row in Payment.objects.filter(order_id__in=ids).values(*_copied_fields(ArchivedPayment))
+        )
+        # Cascades to the copied items and payment. The rollups are deliberately left alone:
+        # these orders still count, they just live elsewhere now.
+        Order.objects.filter(pk__in=ids).delete()
+    return len(ids)
+
+
+def archive_includes(status):
+    """Whether a history filtered to ``status`` ('all' for none) can contain archived orders."""
+    return status == 'all' or status in FINISHED_STATUSES
+
+
+def iter_merged(*iterables):
+    """Merge order iterators that are each sorted by (created_at, id) into one sorted stream."""
+    return heapq.merge(*iterables, key=lambda order: (order.created_at, order.id))
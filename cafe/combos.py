@@ -0,0 +1,234 @@
+"""
+Budget combos for the chat assistant: "food for 3 under 500".
+
+``BudgetPlanner`` is built once per menu snapshot (see ``cafe.menu``): prices
+converted to whole paise once and the items kept in a price-sorted index, so
+"what's under ₹X" is a bisect and the combo search starts from only the
+items that fit.
+
+``plan`` answers "best combos within ₹X for N people" with a bounded
+knapsack over the items: a combo has at least N and at most ``MAX_COURSES``
+x N servings, no more than N from any one category, and its score is one
+point per serving, more for dearer (more filling) items, plus a bonus for top
+sellers (``popular_ids``, best first) and for every category it draws from,
+so combos mix categories. The dynamic programme walks the menu category by
+category, keeping the best combo per (cost, servings) state minus any state a
+cheaper one beats on score. To answer in a few milliseconds whatever the
+menu size, it counts money in at most ``MAX_BUDGET_STEPS`` steps (exact
+totals are checked at the end), only searches the top sellers and
+``CANDIDATES_PER_CATEGORY`` price points per category (bisected out of the
+index) in at most ``MAX_CATEGORIES`` categories, and plans a group of more
+than ``MAX_TABLE`` as identical tables.
+
+``parse_budget_query`` pulls the amount and head count out of a chat message.
+"""
+import bisect
+import math
+import re
+from collections import defaultdict
+from dataclasses import dataclass
+from decimal import Decimal
+from typing import List, Mapping, Optional, Sequence, Tuple
+
+MAX_PEOPLE = 20
+MAX_TABLE = 3
+MAX_COURSES = 2
+CANDIDATES_PER_CATEGORY = 5
+MAX_CATEGORIES = 5
+# Resolution of the search over money: a budget is split into at most this many steps
+MAX_BUDGET_STEPS = 60
+PORTION_WEIGHT = 1.0
+POPULARITY_WEIGHT = 0.6
+CATEGORY_BONUS = 1.0
+
+_NUMBER_WORDS = {
+    "one": 1, "two": 2, "three": 3, "four": 4, "five": 5,
+    "six": 6, "seven": 7, "eight": 8, "nine": 9, "ten": 10,
+}
+_COUNT = r"(\d+|" + "|".join(_NUMBER_WORDS) + r")"
+_AMOUNT_RE = re.compile(
+    r"(?:\b(?:under|below|less than|within|up ?to|max(?:imum)?|budget(?: of| is)?|rs\.?)|₹)\s*(?:₹|rs\.?)?\s*(\d+)"
+    r"|(\d+)\s*(?:₹|rs\b|rupees)"
+)
+_PEOPLE_RE = re.compile(
+    r"\b" + _COUNT + r"\s*(?:people|persons|pax|guests|friends|of us)\b"
+    r"|(?:for|feed|serve)\s+(?:the\s+)?" + _COUNT + r"\b(?!\s*(?:₹|rs\b|rupees))"
+)
+
+
+@dataclass(frozen=True)
+class Combo:
+    lines: Tuple[Tuple[Mapping, int], ...]  # (menu row, quantity)
+    total: Decimal
+    score: float
+
+    @property
+    def servings(self) -> int:
+        return sum(qty for _, qty in self.lines)
+
+    def as_dict(self) -> dict:
+        return {
+            "items": [
+                {"id": item["id"], "name": item["name"], "category": item["category__name"] or "Others",
+                 "quantity": qty, "price": str(item["price"]), "subtotal": str(item["price"] * qty)}
+                for item, qty in self.lines
+            ],
+            "total": str(self.total),
+            "servings": self.servings,
+        }
+
+
+def _paise(price) -> int:
+    return int(Decimal(price) * 100)
+
+
+def parse_budget_query(text: str) -> Tuple[Optional[int], Optional[int]]:
+    """
+    ``(amount, people)`` from a lowercased message such as "food for 3 under
+    500" (either may be None). A lone number counts as the amount.
+    """
+    people = None
+    for match in _PEOPLE_RE.finditer(text):
+        word = match.group(1) or match.group(2)
+        count = int(word) if word.isdigit() else _NUMBER_WORDS[word]
+        if 0 < count <= MAX_PEOPLE:
+            people = count
+            break
+    amount = _AMOUNT_RE.search(text)
+    if amount:
+        return int(amount.group(1) or amount.group(2)), people
+    numbers = [int(n) for n in re.findall(r"\d+", text)]
+    if people is not None and people in numbers:
+        numbers.remove(people)
+    return (max(numbers) if numbers else None), people
+
+
+def _pareto(states: dict) -> dict:
+    """
+    Drop states beaten by a cheaper one with the same rest of the key
+    (servings, and servings from the current category) and at least the
+    score: whatever completes them completes that one too.
+    """
+    best = {}
+    kept = {}
+    for key in sorted(states):
+        score = states[key][0]
+        if score > best.get(key[1:], -1.0):
+            best[key[1:]] = score
+            kept[key] = states[key]
+    return kept
+
+
+class BudgetPlanner:
+    """Price-sorted view of one menu snapshot's items, for budget questions."""
+
+    def __init__(self, items: Sequence[Mapping]):
+        order = sorted(range(len(items)), key=lambda pos: (_paise(items[pos]["price"]), items[pos]["name"]))
+        self._items = [items[pos] for pos in order]
+        self._prices = [_paise(item["price"]) for item in self._items]
+        self._position = {item["id"]: pos for pos, item in enumerate(self._items)}
+        # Category -> positions in the index (so cheapest first) and their prices, for bisecting
+        self._by_category = defaultdict(list)
+        for pos, item in enumerate(self._items):
+            self._by_category[item["category__name"] or "Others"].append(pos)
+        self._category_prices = {
+            category: [self._prices[pos] for pos in positions] for category, positions in self._by_category.items()
+        }
+
+    def under(self, ceiling) -> List[Mapping]:
+        """Items costing at most ``ceiling`` rupees, cheapest first."""
+        return self._items[:bisect.bisect_right(self._prices, _paise(ceiling))]
+
+    def plan(self, budget, people: int = 1, popular_ids: Sequence[int] = (), limit: int = 3) -> List[Combo]:
+        """Up to ``limit`` of the best combos for ``people`` within ``budget`` rupees, best first."""
+        people = max(1, min(int(people), MAX_PEOPLE))
+        # Bigger groups get identical tables of up to MAX_TABLE people each, so the search stays small
+        tables = math.ceil(people / MAX_TABLE)
+        seats = math.ceil(people / tables)
+        combos, seen = [], []
+        for score, lines in self._search(_paise(budget) // tables, seats, popular_ids):
+            chosen = {i for i, _ in lines}
+            # Skip combos that only drop items from one already suggested
+            if any(chosen <= other for other in seen):
+                continue
+            seen.append(chosen)
+            lines = sorted(lines, key=lambda line: self._prices[line[0]], reverse=True)
+            combos.append(Combo(
+                lines=tuple((self._items[i], qty * tables) for i, qty in lines),
+                total=sum((self._items[i]["price"] * qty * tables for i, qty in lines), Decimal("0")),
+                score=round(score * tables, 3),
+            ))
+            if len(combos) >= limit:
+                break
+        return combos
+
+    def _search(self, budget: int, people: int, popular_ids: Sequence[int]) -> List[Tuple[float, tuple]]:
+        """``(score, ((position, qty), ...))`` for ``people`` within ``budget`` paise, best first."""
+        fits = bisect.bisect_right(self._prices, budget)
+        if not fits:
+            return []
+        popularity = {
+            self._position[item_id]: 1 - rank / len(popular_ids)
+            for rank, item_id in enumerate(popular_ids) if item_id in self._position
+        }
+        groups = []
+        for category, positions in self._by_category.items():
+            affordable = bisect.bisect_right(self._category_prices[category], budget)
+            if not affordable:
+                continue
+            # Price points spread from the cheapest to the dearest affordable item, plus any top sellers
+            last = affordable - 1
+            spread = {positions[round(k * last / (CANDIDATES_PER_CATEGORY - 1))] for k in range(CANDIDATES_PER_CATEGORY)}
+            spread.update(
+                pos for pos in popularity
+                if pos < fits and (self._items[pos]["category__name"] or "Others") == category
+            )
+            groups.append(sorted(spread))
+        # Categories with top sellers first, then the ones with the cheapest items
+        groups.sort(key=lambda positions: (-max(popularity.get(i, 0.0) for i in positions), self._prices[positions[0]]))
+        groups = groups[:MAX_CATEGORIES]
+
+        # The dearest item that fits stands in for a full meal; a samosa is a fraction of one
+        portion = self._prices[fits - 1] or 1
+        value = {
+            i: 1 + PORTION_WEIGHT * self._prices[i] / portion + POPULARITY_WEIGHT * popularity.get(i, 0.0)
+            for positions in groups for i in positions
+        }
+
+        # Count money in whole steps, at most MAX_BUDGET_STEPS of them; when that is coarser than the
+        # prices, round to the nearest step and check the exact totals at the end
+        candidates = [i for positions in groups for i in positions]
+        step = math.gcd(*(self._prices[i] for i in candidates)) or 1
+        step = max(step, math.ceil(budget / MAX_BUDGET_STEPS))
+        cost = {i: max(1, round(self._prices[i] / step)) for i in candidates}
+        capacity = budget // step
+        max_servings = people * MAX_COURSES
+
+        # (cost, servings) -> (score, ((position, qty), ...))
+        states = {(0, 0): (0.0, ())}
+        for positions in groups:
+            # Combos that use this category, by (cost, servings, servings from this category)
+            used = {}
+            for i in positions:
+                extended = dict(used)
+                sources = [((spent, servings, 0), entry, CATEGORY_BONUS) for (spent, servings), entry in states.items()]
+                sources += [(key, entry, 0.0) for key, entry in used.items()]
+                for (spent, servings, in_category), (score, lines), bonus in sources:
+                    for qty in range(1, people - in_category + 1):
+                        key = (spent + qty * cost[i], servings + qty, in_category + qty)
+                        if key[0] > capacity or key[1] > max_servings:
+                            break
+                        candidate = score + qty * value[i] + bonus
+                        if candidate > extended.get(key, (-1.0,))[0]:
+                            extended[key] = (candidate, lines + ((i, qty),))
+                used = _pareto(extended)
+            for (spent, servings, _), entry in used.items():
+                if entry[0] > states.get((spent, servings), (-1.0,))[0]:
+                    states[(spent, servings)] = entry
+            states = _pareto(states)
+
+        finished = [
+            entry for (_, servings), entry in states.items()
+            if servings >= people and sum(self._prices[i] * qty for i, qty in entry[1]) <= budget
+        ]
+        return sorted(finished, key=lambda entry: -entry[0])
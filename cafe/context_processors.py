@@ -1,14 +1,22 @@
-from .utils import get_or_create_cart
+from decimal import Decimal
+from django.utils.functional import SimpleLazyObject
+from .utils import get_cart_summary
+
 
 def cart_context(request):
-    try:
-        cart = get_or_create_cart(request)
-        count = sum(ci.quantity for ci in cart.items.all())
-        total = sum(ci.subtotal for ci in cart.items.all())
-    except Exception:
-        count = 0
-        total = 0
+    """
+    Expose the cart badge lazily: templates that never print ``cart_count`` or
+    ``cart_total`` cost nothing, and the ones that do read a session-cached
+    summary instead of creating a cart on every render.
+    """
+    def _summary():
+        try:
+            return get_cart_summary(request)
+        except Exception:
+            return {'count': 0, 'total': Decimal('0')}
+
+    summary = SimpleLazyObject(_summary)
     return {
-        'cart_count': count,
-        'cart_total': total,
+        'cart_count': SimpleLazyObject(lambda: summary['count']),
+        'cart_total': SimpleLazyObject(lambda: summary['total']),
     }
@@ -0,0 +1,108 @@
+"""
+Metrics for the manager dashboard.
+
+Everything comes from the rollup tables (see ``cafe.rollups``): one grouped
+query over ``DailySalesRollup`` yields the order count, status and
+order-type breakdowns and revenue figures via conditional aggregation, a
+second one the 7-day trend, and ``HourlyOrderRollup`` the orders-by-hour
+histogram. The assembled payload
+is cached for ``DASHBOARD_CACHE_TIMEOUT`` seconds and dropped whenever an
+order is created or changes status, so a busy dashboard costs a cache read.
+"""
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.db.models import Q, Sum
+from django.utils import timezone
+
+from .models import Customer, DailySalesRollup, HourlyOrderRollup, Payment
+from .rollups import REVENUE_STATUSES, item_sales
+
+DASHBOARD_CACHE_KEY = "cafe:manager-dashboard"
+DASHBOARD_CACHE_TIMEOUT = 30
+
+
+def invalidate_dashboard():
+    cache.delete(DASHBOARD_CACHE_KEY)
+
+
+def dashboard_metrics() -> dict:
+    """The dashboard template context, from the cache when fresh."""
+    metrics = cache.get(DASHBOARD_CACHE_KEY)
+    if metrics is None:
+        metrics = _build_metrics()
+        cache.set(DASHBOARD_CACHE_KEY, metrics, DASHBOARD_CACHE_TIMEOUT)
+    return metrics
+
+
+def _build_metrics() -> dict:
+    revenue = Q(status__in=REVENUE_STATUSES)
+
+    # Order statistics, revenue metrics and order type distribution in one pass
+    breakdown = (
+        DailySalesRollup.objects
+        .values('status', 'order_type')
+        .annotate(
+            orders=Sum('order_count'),
+            paid_orders=Sum('order_count', filter=revenue),
+            paid_revenue=Sum('revenue', filter=revenue),
+        )
+        .order_by()
+    )
+    by_status = defaultdict(int)
+    by_type = defaultdict(int)
+    paid_orders, total_revenue = 0, Decimal('0')
+    for row in breakdown:
+        by_status[row['status']] += row['orders']
+        by_type[row['order_type']] += row['orders']
+        paid_orders += row['paid_orders'] or 0
+        total_revenue += row['paid_revenue'] or 0
+    status_counts = [{'status': s, 'c': c} for s, c in sorted(by_status.items()) if c]
+    order_type_dist = [{'order_type': t, 'c': c} for t, c in sorted(by_type.items()) if c]
+    total_orders = sum(by_status.values())
+    avg_order_value = total_revenue / paid_orders if paid_orders else Decimal('0')
+
+    # Daily revenue trend (last 7 days)
+    week_ago = timezone.localdate() - timedelta(days=6)
+    daily_revenue = (
+        DailySalesRollup.objects
+        .filter(date__gte=week_ago, status__in=REVENUE_STATUSES)
+        .values('date')
+        .annotate(revenue=Sum('revenue'), orders=Sum('order_count'))
+        .order_by('date')
+    )
+
+    # Orders by hour of day
+    orders_by_hour = (
+        HourlyOrderRollup.objects
+        .values('hour')
+        .annotate(c=Sum('order_count'))
+        .filter(c__gt=0)
+        .order_by('hour')
+    )
+
+    # Calculate percentage for status distribution
+    status_percentages = [
+        {'status': sc['status'], 'count': sc['c'], 'percentage': round(sc['c'] / total_orders * 100, 1)}
+        for sc in status_counts
+    ]
+
+    return {
+        'top_items': list(item_sales().order_by('-total_qty')[:10]),
+        'orders_by_hour': list(orders_by_hour),
+        'daily_revenue': list(daily_revenue),
+        'total_orders': total_orders,
+        'total_revenue': total_revenue,
+        'avg_order_value': avg_order_value,
+        'status_counts': status_counts,
+        'status_percentages': status_percentages,
+        'order_type_dist': order_type_dist,
+        'payments_pending': list(
+            Payment.objects.filter(status='PENDING')
+            .select_related('order', 'order__customer').order_by('-created_at')[:20]
+        ),
+        # Recent customers (lifetime stats are stored on the row)
+        'customers': list(Customer.objects.order_by('-created_at')[:10]),
+    }
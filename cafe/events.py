@@ -0,0 +1,245 @@
+"""
+Broadcast hub feeding the Server-Sent Events endpoints.
+
+Publishers (sync code, any thread) call ``broadcast(channel, event)``.
+Subscribers are async SSE responses running on the ASGI event loop; each one
+is just an ``asyncio.Queue`` registered under the channels it listens to, so
+thousands of idle connections cost a queue and a suspended coroutine each.
+
+How events travel between processes is up to the backend, chosen with the
+``CAFE_EVENT_BACKEND`` setting:
+
+* ``cafe.events.InProcessBackend`` (default) delivers within the current
+  process only, which is right for a single ASGI worker.
+* ``cafe.events.FileLogBackend`` appends events to a shared log file
+  (``CAFE_EVENT_LOG``) that every worker tails. It is a local stand-in for a
+  real pub/sub server when several workers run on one host.
+"""
+import asyncio
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+from typing import Dict, Iterable, Optional, Set
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+SUBSCRIBER_QUEUE_SIZE = 100
+
+
+class Subscription:
+    """One listener's mailbox, bound to the event loop it was created on."""
+
+    def __init__(self, channels: Iterable[str]):
+        self.channels = tuple(channels)
+        self.loop = asyncio.get_running_loop()
+        self.queue: asyncio.Queue = asyncio.Queue(SUBSCRIBER_QUEUE_SIZE)
+        # Set when events had to be dropped; the client should resync
+        self.lagged = False
+
+    def push(self, channel: str, event: dict) -> None:
+        """Thread-safe: hand the event over to the subscriber's loop."""
+        try:
+            self.loop.call_soon_threadsafe(self._put, channel, event)
+        except RuntimeError:
+            # Loop already closed; the hub drops us on unsubscribe
+            pass
+
+    def _put(self, channel: str, event: dict) -> None:
+        try:
+            self.queue.put_nowait((channel, event))
+        except asyncio.QueueFull:
+            self.lagged = True
+
+    async def get(self, timeout: float):
+        """Next ``(channel, event)``, or None if nothing arrived within ``timeout``."""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class EventHub:
+    def __init__(self, backend):
+        self._subscribers: Dict[str, Set[Subscription]] = defaultdict(set)
+        self._lock = threading.Lock()
+        self.backend = backend
+        backend.attach(self._deliver)
+
+    def publish(self, channel: str, event: dict) -> None:
+        self.backend.publish(channel, event)
+
+    def subscribe(self, channels: Iterable[str]) -> Subscription:
+        sub = Subscription(channels)
+        with self._lock:
+            for channel in sub.channels:
+                self._subscribers[channel].add(sub)
+        self.backend.on_subscribe()
+        return sub
+
+    def unsubscribe(self, sub: Subscription) -> None:
+        with self._lock:
+            for channel in sub.channels:
+                listeners = self._subscribers.get(channel)
+                if listeners is not None:
+                    listeners.discard(sub)
+                    if not listeners:
+                        del self._subscribers[channel]
+
+    def subscriber_count(self) -> int:
+        with self._lock:
+            return len({sub for subs in self._subscribers.values() for sub in subs})
+
+    def _deliver(self, channel: str, event: dict) -> None:
+        with self._lock:
+            listeners = list(self._subscribers.get(channel, ()))
+        for sub in listeners:
+            sub.push(channel, event)
+
+
+class InProcessBackend:
+    """Deliver events to subscribers in this process only."""
+
+    def attach(self, deliver) -> None:
+        self._deliver = deliver
+
+    def on_subscribe(self) -> None:
+        pass
+
+    def publish(self, channel: str, event: dict) -> None:
+        self._deliver(channel, event)
+
+
+class FileLogBackend:
+    """
+    Share events between worker processes through an append-only log file.
+
+    Publishing appends one JSON line under an exclusive ``flock``; a daemon
+    thread per process tails the file and delivers new lines locally. Once
+    the log grows past ``max_bytes`` it is rotated: renamed to ``<path>.1``
+    (replacing the previous generation) so the next event starts a fresh
+    file. Tailers follow the file by inode rather than size, so they finish
+    reading the old generation and then start the new one from the top,
+    however much was written to it in between. (Only a tailer that sleeps
+    through two whole rotations, megabytes of events in one poll, loses the
+    generation between them.)
+    """
+
+    def __init__(self, path: Optional[str] = None, poll_interval: float = 0.2, max_bytes: int = 4 * 1024 * 1024):
+        self.path = str(path or getattr(settings, 'CAFE_EVENT_LOG', settings.BASE_DIR / 'events.log'))
+        self.poll_interval = poll_interval
+        self.max_bytes = max_bytes
+        self._tailer: Optional[threading.Thread] = None
+        self._tailer_lock = threading.Lock()
+        self._log = None
+        self._partial = b''
+
+    def attach(self, deliver) -> None:
+        self._deliver = deliver
+
+    def publish(self, channel: str, event: dict) -> None:
+        import fcntl  # POSIX only, like the backend itself
+        line = (json.dumps({'channel': channel, 'event': event}, separators=(',', ':')) + '\n').encode('utf-8')
+        while True:
+            with open(self.path, 'ab') as fh:
+                fcntl.flock(fh, fcntl.LOCK_EX)
+                try:
+                    # Rotated while we waited for the lock: write to the new generation instead
+                    if not self._is_current(fh):
+                        continue
+                    if os.fstat(fh.fileno()).st_size > self.max_bytes:
+                        os.replace(self.path, self.path + '.1')
+                        continue
+                    fh.write(line)
+                    return
+                finally:
+                    fcntl.flock(fh, fcntl.LOCK_UN)
+
+    def on_subscribe(self) -> None:
+        # Start tailing lazily: processes that never serve SSE never poll the file
+        with self._tailer_lock:
+            if self._tailer is None:
+                self._tailer = threading.Thread(target=self._tail, name='cafe-event-tail', daemon=True)
+                self._tailer.start()
+
+    def _is_current(self, fh) -> bool:
+        """Whether ``fh`` is still the file at ``self.path`` (same inode)."""
+        try:
+            return os.path.samestat(os.fstat(fh.fileno()), os.stat(self.path))
+        except OSError:
+            return False
+
+    def _open_current(self):
+        try:
+            return open(self.path, 'rb')
+        except OSError:
+            return None
+
+    def _tail(self) -> None:
+        self._log = self._open_current()
+        if self._log is not None:
+            self._log.seek(0, os.SEEK_END)
+        while True:
+            time.sleep(self.poll_interval)
+            self._read_new()
+
+    def _read_new(self) -> None:
+        """Deliver the lines appended since the last call, following the log across rotations."""
+        if self._log is None:
+            self._log = self._open_current()
+            if self._log is None:
+                return
+        self._feed(self._log.read())
+        if not self._is_current(self._log):
+            # Nothing is appended to a generation once it has been renamed, so
+            # draining it now loses nothing; the new one is read from the top
+            self._feed(self._log.read())
+            self._log.close()
+            self._log, self._partial = self._open_current(), b''
+
+    def _feed(self, chunk: bytes) -> None:
+        if not chunk:
+            return
+        *lines, self._partial = (self._partial + chunk).split(b'\n')
+        for raw in lines:
+            try:
+                msg = json.loads(raw)
+            except ValueError:
+                continue
+            self._deliver(msg['channel'], msg['event'])
+
+
+_hub: Optional[EventHub] = None
+_hub_lock = threading.Lock()
+
+
+def get_hub() -> EventHub:
+    global _hub
+    if _hub is None:
+        with _hub_lock:
+            if _hub is None:
+                backend_path = getattr(settings, 'CAFE_EVENT_BACKEND', 'cafe.events.InProcessBackend')
+                _hub = EventHub(import_string(backend_path)())
+    return _hub
+
+
+def broadcast(channel: str, event: dict) -> None:
+    get_hub().publish(channel, event)
+
+
+# ---- Channels ----
+
+STAFF_CHANNEL = 'staff'
+
+
+def order_channel(order_id: int) -> str:
+    return f'order:{order_id}'
+
+
+def broadcast_order_state(order_id: int, state: dict) -> None:
+    """Fan an order status change out to its trackers and to the staff dashboards."""
+    event = {'id': order_id, 'status': state['status'], 'version': state['version']}
+    broadcast(order_channel(order_id), event)
+    broadcast(STAFF_CHANNEL, event)
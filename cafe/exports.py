@@ -0,0 +1,173 @@
+"""
+Streaming exports of the order ledger.
+
+Used by the manager export endpoint and ``manage.py export_orders``. Live
+and archived orders are read with ``iterator(chunk_size=...)`` (items
+prefetched per chunk), merged by creation time and rendered one row at a
+time by generators, so memory stays flat however long the date range is.
+Under ASGI the endpoint wraps the generator in ``aiter_export``, which pulls
+batches of lines through ``sync_to_async``; Django would otherwise buffer a
+sync iterator into one list before sending a byte.
+
+* CSV: one row per order line, order columns repeated on each line; orders
+  without lines get a single row with empty item columns.
+* JSON lines: one JSON object per order with its ``items`` nested.
+"""
+import csv
+import json
+from datetime import datetime, time, timedelta
+from itertools import islice
+
+from asgiref.sync import sync_to_async
+from django.core.exceptions import ObjectDoesNotExist
+from django.utils import timezone
+
+from .archive import iter_merged
+from .models import ArchivedOrder, Order
+
+EXPORT_FORMATS = ('csv', 'jsonl')
+EXPORT_CHUNK_SIZE = 500
+# Lines handed to the ASGI server per thread hop
+EXPORT_LINES_PER_CHUNK = 200
+
+CSV_COLUMNS = [
+    'order_id', 'created_at', 'order_type', 'status', 'table_no', 'total_amount',
+    'customer_name', 'customer_phone', 'customer_email',
+    'payment_status', 'payment_reference', 'payment_verified_at',
+    'item_id', 'item_name', 'quantity', 'unit_price', 'line_total',
+]
+
+
+def parse_date_range(date_from='', date_to=''):
+    """
+    Turn inclusive ``YYYY-MM-DD`` bounds (either may be blank) into aware
+    ``(start, end)`` datetimes for ``created_at__gte`` / ``created_at__lt``.
+    Raises ``ValueError`` on a malformed date.
+    """
+    tz = timezone.get_current_timezone()
+    start = end = None
+    if date_from:
+        start = timezone.make_aware(datetime.combine(datetime.strptime(date_from, '%Y-%m-%d').date(), time.min), tz)
+    if date_to:
+        day_after = datetime.strptime(date_to, '%Y-%m-%d').date() + timedelta(days=1)
+        end = timezone.make_aware(datetime.combine(day_after, time.min), tz)
+    return start, end
+
+
+def orders_for_export(start=None, end=None):
+    """
+    Live and archived orders created in ``[start, end)``, each oldest first,
+    with everything the exporters read.
+    """
+    lookups = {}
+    if start is not None:
+        lookups['created_at__gte'] = start
+    if end is not None:
+        lookups['created_at__lt'] = end
+    return [
+        model.objects.filter(**lookups)
+        .select_related('customer', 'payment')
+        .prefetch_related('items__item')
+        .order_by('created_at', 'id')
+        for model in (Order, ArchivedOrder)
+    ]
+
+
+def _iter_orders(orders, chunk_size):
+    return iter_merged(*(qs.iterator(chunk_size=chunk_size) for qs in orders))
+
+
+def _payment(order):
+    try:
+        return order.payment
+    except ObjectDoesNotExist:
+        return None
+
+
+def _iso(value):
+    return value.isoformat() if value else ''
+
+
+class _Echo:
+    """File-like object whose write() hands back the line, for csv.writer in a generator."""
+
+    def write(self, value):
+        return value
+
+
+def iter_csv(orders, chunk_size=EXPORT_CHUNK_SIZE):
+    """Yield the CSV export of ``orders`` line by line, header first."""
+    writer = csv.writer(_Echo())
+    yield writer.writerow(CSV_COLUMNS)
+    for order in _iter_orders(orders, chunk_size):
+        customer = order.customer
+        payment = _payment(order)
+        head = [
+            order.id, _iso(order.created_at), order.order_type, order.status, order.table_no, order.total_amount,
+            customer.name if customer else '', customer.phone if customer else '',
+            (customer.email or '') if customer else '',
+            payment.status if payment else '', payment.reference if payment else '',
+            _iso(payment.verified_at) if payment else '',
+        ]
+        lines = order.items.all()
+        if not lines:
+            yield writer.writerow(head + [''] * 5)
+        for line in lines:
+            yield writer.writerow(head + [
+                line.item_id or '', line.item.name if line.item else '',
+                line.quantity, line.unit_price, line.subtotal,
+            ])
+
+
+def iter_jsonl(orders, chunk_size=EXPORT_CHUNK_SIZE):
+    """Yield the JSON-lines export of ``orders``, one order per line."""
+    for order in _iter_orders(orders, chunk_size):
+        customer = order.customer
+        payment = _payment(order)
+        record = {
+            'id': order.id,
+            'created_at': _iso(order.created_at),
+            'order_type': order.order_type,
+            'status': order.status,
+            'table_no': order.table_no,
+            'total_amount': str(order.total_amount),
+            'customer': {
+                'name': customer.name, 'phone': customer.phone, 'email': customer.email,
+            } if customer else None,
+            'payment': {
+                'status': payment.status, 'reference': payment.reference,
+                'verified_at': _iso(payment.verified_at) or None,
+            } if payment else None,
+            'items': [
+                {
+                    'item_id': line.item_id,
+                    'name': line.item.name if line.item else None,
+                    'quantity': line.quantity,
+                    'unit_price': str(line.unit_price),
+                }
+                for line in order.items.all()
+            ],
+        }
+        yield json.dumps(record) + '\n'
+
+
+EXPORTERS = {'csv': iter_csv, 'jsonl': iter_jsonl}
+
+
+def _next_chunk(rows, size):
+    return ''.join(islice(rows, size))
+
+
+async def aiter_export(rows, lines_per_chunk=EXPORT_LINES_PER_CHUNK):
+    """
+    Async iterator over a sync export generator, ``lines_per_chunk`` lines
+    per chunk. Every step runs in the same worker thread (thread-sensitive
+    ``sync_to_async``), so the queryset iterators keep their connection.
+    """
+    next_chunk = sync_to_async(_next_chunk)
+    try:
+        while chunk := await next_chunk(rows, lines_per_chunk):
+            yield chunk
+    finally:
+        # The client may disconnect mid-export; release the cursors
+        await sync_to_async(rows.close)()
@@ -0,0 +1,177 @@
+"""
+Demand forecasts for prep planning.
+
+Unit sales per item over the last ``weeks`` weeks are loaded with one query
+(live and archived order lines, UNION ALL) and binned with NumPy into an
+``(items, weeks, 168)`` array: one slot per hour of the week in the cafe's
+local time, oldest week first. Each item/slot series is then exponentially
+smoothed week over week -- a handful of whole-array operations however big
+the menu is -- giving an hour-of-week baseline from which the next hour and
+tomorrow are read off.
+
+Timestamps come back from the database as text and are parsed by NumPy in
+one go rather than turned into ``datetime`` objects row by row, and the join
+is answered from the covering ``orderitem_order_item_qty_idx``; that is what
+keeps 100k+ orders well under a second.
+
+NumPy is only needed by this module (and the manager forecast page, which
+imports it lazily).
+"""
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+
+import numpy as np
+from django.db.models import CharField
+from django.db.models.functions import Cast
+from django.utils import timezone
+
+from .models import ArchivedOrderItem, OrderItem
+
+HOURS_PER_WEEK = 168
+# Orders that turned into food; unpaid, canceled and rejected ones never reached the kitchen
+DEMAND_STATUSES = ('PAID', 'PREPARING', 'READY_FOR_DELIVERY', 'OUT_FOR_DELIVERY', 'COMPLETED')
+DEFAULT_WEEKS = 8
+FORECAST_MAX_WEEKS = 26
+DEFAULT_ALPHA = 0.3
+
+
+@dataclass
+class DemandForecast:
+    item_ids: np.ndarray        # (items,)
+    baseline: np.ndarray        # (items, 168) smoothed units per hour-of-week slot, Monday 00:00 first
+    next_hour_start: datetime   # local start of the forecast hour
+    next_hour: np.ndarray       # (items,) units expected in that hour
+    tomorrow: date
+    tomorrow_hourly: np.ndarray  # (items, 24) units expected in each hour of tomorrow
+
+    @property
+    def tomorrow_total(self):
+        """(items,) units expected over the whole of tomorrow."""
+        return self.tomorrow_hourly.sum(axis=1)
+
+
+def hour_of_week(local_hours):
+    """Slot 0..167 (Monday 00:00 = 0) of local hour numbers counted from the epoch."""
+    # 1970-01-01 was a Thursday, day 3 when Monday is 0
+    return ((local_hours // 24 + 3) % 7) * 24 + local_hours % 24
+
+
+def local_hours(epoch_seconds, tz=None):
+    """Local hour numbers (hours since the epoch on local wall clocks) for UTC epoch seconds."""
+    tz = tz or timezone.get_current_timezone()
+    utc_hours, inverse = np.unique(epoch_seconds // 3600, return_inverse=True)
+    # One offset per distinct UTC hour, so DST and half-hour zones come out right without a per-row call
+    offsets = np.array(
+        [datetime.fromtimestamp(int(h) * 3600, tz).utcoffset().total_seconds() for h in utc_hours],
+        dtype=np.int64,
+    )
+    return (epoch_seconds + offsets[inverse.reshape(-1)]) // 3600
+
+
+def load_demand(since, until):
+    """
+    ``(item_ids, quantities, epoch_seconds)`` arrays for every demand line
+    placed in ``[since, until)``, from one query over live and archived lines.
+    """
+    def lines(model):
+        return (
+            model.objects
+            .filter(item_id__isnull=False, order__status__in=DEMAND_STATUSES,
+                    order__created_at__gte=since, order__created_at__lt=until)
+            .values_list('item_id', 'quantity', Cast('order__created_at', CharField()))
+            .order_by()
+        )
+
+    rows = list(lines(OrderItem).union(lines(ArchivedOrderItem), all=True))
+    # "YYYY-MM-DD HH:MM:SS[.ffffff][+00]" in UTC; U19 keeps the first 19 characters, all that is needed
+    table = np.array(rows, dtype=[('item', np.int64), ('quantity', np.float64), ('placed', 'U19')])
+    return table['item'], table['quantity'], table['placed'].astype('datetime64[s]').astype(np.int64)
+
+
+def weekly_slots(item_ids, quantities, epoch_seconds, now_hour, weeks):
+    """
+    Bin demand lines into ``(items, weeks, 168)`` unit counts. Week ``weeks - 1``
+    is the 168 hours before local hour ``now_hour``; earlier weeks precede it.
+    Returns ``(menu_item_ids, counts)``.
+    """
+    hours = local_hours(epoch_seconds)
+    hours_ago = now_hour - 1 - hours
+    keep = (hours_ago >= 0) & (hours_ago < weeks * HOURS_PER_WEEK)
+    menu, item_index = np.unique(item_ids[keep], return_inverse=True)
+    week = weeks - 1 - hours_ago[keep] // HOURS_PER_WEEK
+    flat = (item_index.reshape(-1) * weeks + week) * HOURS_PER_WEEK + hour_of_week(hours[keep])
+    counts = np.bincount(flat, weights=quantities[keep], minlength=len(menu) * weeks * HOURS_PER_WEEK)
+    return menu, counts.reshape(len(menu), weeks, HOURS_PER_WEEK)
+
+
+def smooth(counts, alpha):
+    """Exponentially smooth ``(items, weeks, 168)`` counts across weeks into ``(items, 168)`` baselines."""
+    level = counts[:, 0, :].astype(np.float64)
+    for week in range(1, counts.shape[1]):
+        level *= 1 - alpha
+        level += alpha * counts[:, week, :]
+    return level
+
+
+def build_forecast(now=None, weeks=DEFAULT_WEEKS, alpha=DEFAULT_ALPHA):
+    """Forecast the next hour and tomorrow for every item sold in the last ``weeks`` weeks."""
+    now = now or timezone.now()
+    tz = timezone.get_current_timezone()
+    now_hour = int(local_hours(np.array([int(now.timestamp())]), tz)[0])
+    since = now - timedelta(weeks=weeks, hours=1)
+    menu, counts = weekly_slots(*load_demand(since, now), now_hour, weeks)
+    baseline = smooth(counts, alpha)
+
+    local_now = timezone.localtime(now, tz)
+    next_hour_start = local_now.replace(minute=0, second=0, microsecond=0) + timedelta(hours=1)
+    tomorrow = local_now.date() + timedelta(days=1)
+    first_slot = tomorrow.weekday() * 24
+    return DemandForecast(
+        item_ids=menu,
+        baseline=baseline,
+        next_hour_start=next_hour_start,
+        next_hour=baseline[:, hour_of_week(now_hour + 1)],
+        tomorrow=tomorrow,
+        tomorrow_hourly=baseline[:, first_slot:first_slot + 24],
+    )
+
+
+def naive_forecast(now=None, weeks=DEFAULT_WEEKS, alpha=DEFAULT_ALPHA):
+    """
+    The same forecast computed the obvious way -- one ORM query and pure
+    Python loops per item. Only used by ``benchmark_forecast`` as the
+    baseline (and to check the vectorized numbers). Returns
+    ``{item_id: (next_hour, tomorrow_total)}``.
+    """
+    from .models import Item
+
+    now = now or timezone.now()
+    tz = timezone.get_current_timezone()
+    now_hour = int(local_hours(np.array([int(now.timestamp())]), tz)[0])
+    since = now - timedelta(weeks=weeks, hours=1)
+    tomorrow = timezone.localtime(now, tz).date() + timedelta(days=1)
+    results = {}
+    for item_id in Item.objects.values_list('pk', flat=True):
+        series = [[0.0] * HOURS_PER_WEEK for _ in range(weeks)]
+        seen = False
+        for model in (OrderItem, ArchivedOrderItem):
+            lines = model.objects.filter(
+                item_id=item_id, order__status__in=DEMAND_STATUSES,
+                order__created_at__gte=since, order__created_at__lt=now,
+            ).values_list('quantity', 'order__created_at')
+            for quantity, placed in lines:
+                local = timezone.localtime(placed, tz)
+                hour = int((local.replace(tzinfo=dt_timezone.utc).timestamp()) // 3600)
+                hours_ago = now_hour - 1 - hour
+                if 0 <= hours_ago < weeks * HOURS_PER_WEEK:
+                    series[weeks - 1 - hours_ago // HOURS_PER_WEEK][local.weekday() * 24 + local.hour] += quantity
+                    seen = True
+        if not seen:
+            continue
+        level = series[0][:]
+        for week in series[1:]:
+            level = [alpha * x + (1 - alpha) * s for x, s in zip(week, level)]
+        first_slot = tomorrow.weekday() * 24
+        next_slot = int(hour_of_week(now_hour + 1))
+        results[item_id] = (level[next_slot], sum(level[first_slot:first_slot + 24]))
+    return results
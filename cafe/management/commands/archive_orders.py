@@ -0,0 +1,62 @@
+"""
+Move old finished orders into the archive tables.
+
+COMPLETED, CANCELED and REJECTED orders untouched for ``--days`` are copied
+with their items and payment into ArchivedOrder/ArchivedOrderItem/
+ArchivedPayment and removed from the live tables, in primary-key order and
+small batches, each in its own short transaction. Rollups are unaffected, and
+history, exports and order tracking keep showing archived orders.
+
+Schedule it from cron next to reap_carts, e.g. every night at 03:45:
+
+    45 3 * * * cd /path/to/project && python3 manage.py archive_orders >> archive_orders.log 2>&1
+"""
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from cafe.archive import DEFAULT_ARCHIVE_AFTER_DAYS, archivable_orders, archive_batch
+from cafe.models import OrderItem
+
+
+class Command(BaseCommand):
+    help = "Move finished orders older than --days (with items and payment) into the archive tables."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=DEFAULT_ARCHIVE_AFTER_DAYS,
+                            help=f'Archive finished orders untouched for this many days (default: {DEFAULT_ARCHIVE_AFTER_DAYS}).')
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Orders moved per transaction (default: 500).')
+        parser.add_argument('--pause', type=float, default=0.05,
+                            help='Seconds to sleep between batches so other writers get the lock (default: 0.05).')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Only count what would be archived.')
+
+    def handle(self, *args, **options):
+        if options['days'] < 1:
+            raise CommandError('--days must be at least 1')
+        batch_size = max(1, options['batch_size'])
+        started = time.monotonic()
+
+        if options['dry_run']:
+            orders = archivable_orders(options['days'])
+            lines = OrderItem.objects.filter(order__in=orders).count()
+            self.stdout.write(self.style.SUCCESS(
+                f"Would archive {orders.count()} order(s) with {lines} item line(s)"
+            ))
+            return
+
+        moved = 0
+        while True:
+            count = archive_batch(archivable_orders(options['days']), batch_size)
+            if not count:
+                break
+            moved += count
+            if options['pause']:
+                time.sleep(options['pause'])
+
+        elapsed = time.monotonic() - started
+        rate = moved / elapsed if elapsed > 0 else 0.0
+        self.stdout.write(self.style.SUCCESS(
+            f"Archived {moved} order(s) in {elapsed:.2f}s ({rate:.0f} orders/sec)"
+        ))
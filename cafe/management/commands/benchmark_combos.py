@@ -0,0 +1,83 @@
+"""
+Time budget combo planning on a large synthetic catalogue.
+
+Builds ``--items`` made-up menu items with prices and categories in memory
+(no database access), the ``cafe.combos.BudgetPlanner`` the chat assistant
+keeps per menu snapshot, and then plans combos for a grid of budgets and
+group sizes the way "food for 3 under 500" or ``/api/ai/combos`` does:
+
+    python3 manage.py benchmark_combos
+    python3 manage.py benchmark_combos --items 50000 --repeat 20
+
+Reports the build time and the median and worst planning time per group
+size, and checks that every suggested combo stays within its budget and
+feeds the whole group.
+"""
+import random
+import statistics
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+
+from cafe.combos import BudgetPlanner
+
+from .benchmark_matching import DISHES, FLAVOURS, STYLES
+
+CATEGORIES = ["Beverages", "Snacks", "Rice", "Breads", "Desserts", "Soups", "Salads", "Combos"]
+BUDGETS = [150, 300, 500, 800, 1200, 2000, 5000]
+GROUPS = [1, 2, 3, 4, 6, 10, 20]
+
+
+def _catalogue(count, rng):
+    items = []
+    for pk in range(1, count + 1):
+        name = f"{rng.choice(STYLES)} {rng.choice(FLAVOURS)} {rng.choice(DISHES)} {pk}".title()
+        items.append({
+            "id": pk,
+            "name": name,
+            "price": Decimal(rng.randrange(3, 40) * 10),
+            "description": "",
+            "category__name": rng.choice(CATEGORIES),
+        })
+    return tuple(items)
+
+
+class Command(BaseCommand):
+    help = "Time budget combo planning for a grid of budgets and group sizes on a synthetic catalogue."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--items', type=int, default=10000,
+                            help='Catalogue size (default: 10000).')
+        parser.add_argument('--repeat', type=int, default=5,
+                            help='Plans per budget and group size (default: 5).')
+        parser.add_argument('--seed', type=int, default=0,
+                            help='Random seed (default: 0).')
+
+    def handle(self, *args, **options):
+        if options['items'] < 1 or options['repeat'] < 1:
+            raise CommandError('--items and --repeat must be positive')
+        rng = random.Random(options['seed'])
+        items = _catalogue(options['items'], rng)
+        popular_ids = [item["id"] for item in rng.sample(items, min(5, len(items)))]
+
+        started = time.perf_counter()
+        planner = BudgetPlanner(items)
+        self.stdout.write(f"Built the planner over {len(items)} items in {(time.perf_counter() - started) * 1000:.0f} ms")
+
+        problems = 0
+        for people in GROUPS:
+            timings = []
+            for budget in BUDGETS:
+                for _ in range(options['repeat']):
+                    started = time.perf_counter()
+                    combos = planner.plan(budget, people, popular_ids=popular_ids)
+                    timings.append(time.perf_counter() - started)
+                problems += sum(1 for combo in combos if combo.total > budget or combo.servings < people)
+            self.stdout.write(
+                f"{people:>3} people: median {statistics.median(timings) * 1000:7.2f} ms, "
+                f"worst {max(timings) * 1000:7.2f} ms over budgets {BUDGETS[0]}-{BUDGETS[-1]}"
+            )
+        if problems:
+            raise CommandError(f"{problems} combos broke their budget or group size")
+        self.stdout.write(self.style.SUCCESS('Every combo fits its budget and group.'))
@@ -0,0 +1,123 @@
+"""
+Time the vectorized demand forecast against a per-item ORM loop.
+
+Seeds ``--orders`` synthetic orders spread over the forecast window (busier
+at lunch and dinner, weekends heavier), then builds the forecast both ways,
+checks they agree and prints the timings:
+
+    python3 manage.py benchmark_forecast
+    python3 manage.py benchmark_forecast --orders 200000 --items 80
+
+Everything runs in one transaction that is rolled back at the end, so none
+of the seeded rows persist. It still takes the database write lock while it
+runs; point it at a copy rather than a live cafe.
+"""
+import random
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from cafe.forecast import DEFAULT_WEEKS, build_forecast, naive_forecast
+from cafe.models import Customer, Item, Order, OrderItem
+
+# Relative order volume per hour of the day
+HOURLY_WEIGHTS = [1, 1, 1, 1, 1, 1, 2, 4, 6, 5, 4, 6, 10, 12, 8, 5, 5, 6, 9, 12, 11, 7, 4, 2]
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = "Seed order history and compare the NumPy demand forecast with a naive per-item ORM loop."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--orders', type=int, default=100000,
+                            help='Orders to seed (default: 100000).')
+        parser.add_argument('--items', type=int, default=40,
+                            help='Menu items to spread them over (default: 40).')
+        parser.add_argument('--weeks', type=int, default=DEFAULT_WEEKS,
+                            help=f'Forecast window in weeks (default: {DEFAULT_WEEKS}).')
+        parser.add_argument('--repeat', type=int, default=3,
+                            help='Runs of the vectorized forecast; the best time is reported (default: 3).')
+        parser.add_argument('--skip-naive', action='store_true',
+                            help='Only time the vectorized forecast.')
+        parser.add_argument('--seed', type=int, default=0,
+                            help='Random seed for the synthetic history (default: 0).')
+
+    def handle(self, *args, **options):
+        if options['orders'] < 1 or options['items'] < 1:
+            raise CommandError('--orders and --items must be positive')
+        try:
+            with transaction.atomic():
+                started = time.monotonic()
+                lines = self._seed(options, random.Random(options['seed']))
+                self.stdout.write(
+                    f"Seeded {options['orders']} orders / {lines} lines in {time.monotonic() - started:.1f}s"
+                )
+                self._compare(options)
+                raise _Rollback
+        except _Rollback:
+            pass
+
+    def _seed(self, options, rng):
+        now = timezone.now()
+        window_hours = options['weeks'] * 168
+        items = Item.objects.bulk_create(
+            [Item(name=f'Bench item {i}', price=Decimal(rng.randrange(30, 300))) for i in range(options['items'])]
+        )
+        popularity = [rng.paretovariate(1.2) for _ in items]
+        customer = Customer.objects.create(name='Bench', phone='0000000000')
+
+        hours_back = list(range(1, window_hours + 1))
+        weights = []
+        for back in hours_back:
+            local = timezone.localtime(now - timedelta(hours=back))
+            weights.append(HOURLY_WEIGHTS[local.hour] * (1.4 if local.weekday() >= 5 else 1.0))
+
+        orders = Order.objects.bulk_create(
+            [Order(customer=customer, order_type='DINING', total_amount=0, status='COMPLETED')
+             for _ in range(options['orders'])],
+            batch_size=2000,
+        )
+        # created_at is auto_now_add, so spread the orders over the window afterwards
+        for order, back in zip(orders, rng.choices(hours_back, weights=weights, k=len(orders))):
+            order.created_at = now - timedelta(hours=back, seconds=rng.randrange(3600))
+        Order.objects.bulk_update(orders, ['created_at'], batch_size=2000)
+
+        lines = []
+        for order in orders:
+            for item in set(rng.choices(items, weights=popularity, k=rng.randint(1, 4))):
+                lines.append(OrderItem(order=order, item=item, quantity=rng.randint(1, 3), unit_price=item.price))
+        OrderItem.objects.bulk_create(lines, batch_size=2000)
+        return len(lines)
+
+    def _compare(self, options):
+        now = timezone.now()
+        weeks = options['weeks']
+        best = float('inf')
+        for _ in range(max(1, options['repeat'])):
+            started = time.perf_counter()
+            forecast = build_forecast(now=now, weeks=weeks)
+            best = min(best, time.perf_counter() - started)
+        self.stdout.write(self.style.SUCCESS(
+            f"vectorized: {best * 1000:8.1f} ms for {len(forecast.item_ids)} items"
+        ))
+        if options['skip_naive']:
+            return
+
+        started = time.perf_counter()
+        naive = naive_forecast(now=now, weeks=weeks)
+        elapsed = time.perf_counter() - started
+        self.stdout.write(f"naive loop: {elapsed * 1000:8.1f} ms ({elapsed / best:.0f}x slower)")
+
+        expected = np.array([naive.get(int(pk), (0.0, 0.0)) for pk in forecast.item_ids])
+        got = np.column_stack([forecast.next_hour, forecast.tomorrow_total])
+        if set(naive) != set(int(pk) for pk in forecast.item_ids) or not np.allclose(got, expected):
+            raise CommandError('Vectorized and naive forecasts disagree')
+        self.stdout.write('Forecasts agree.')
@@ -0,0 +1,180 @@
+"""
+Show how the dashboard indexes change the query plans of the hot queries.
+
+Seeds a large synthetic history (mostly completed orders, a handful in each
+live lane, checked-out carts), then prints EXPLAIN QUERY PLAN and the best
+of ``--repeat`` timings for every dashboard query, first without the indexes
+from migration 0012 and then with them:
+
+    python3 manage.py benchmark_indexes
+    python3 manage.py benchmark_indexes --orders 200000 --repeat 10
+
+Everything runs in one transaction that is rolled back at the end, so the
+seeded rows and the temporarily dropped indexes never persist. It still
+takes the database write lock while it runs; point it at a copy rather than
+a live cafe.
+"""
+import random
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, models, transaction
+from django.utils import timezone
+
+from cafe.models import Cart, Customer, Order, Payment
+
+# Indexes added for these queries (migration 0012_dashboard_indexes)
+BENCHMARKED_INDEXES = {
+    Order: ['order_chef_queue_idx', 'order_preparing_idx', 'order_ready_idx'],
+    Payment: ['payment_pending_idx', 'payment_status_verified_idx'],
+    Customer: ['customer_phone_name_idx'],
+    Cart: ['cart_customer_open_idx'],
+}
+# Indexes that 0012 replaced, recreated for the "before" plans
+REPLACED_INDEXES = [
+    (Customer, models.Index(fields=['phone'], name='customer_phone_bench_idx')),
+]
+
+LIVE_LANE_SIZE = 25
+LIVE_STATUSES = ('PAID', 'PREPARING', 'READY_FOR_DELIVERY', 'OUT_FOR_DELIVERY', 'PENDING_PAYMENT')
+PAYMENT_STATUS = {'PENDING_PAYMENT': 'PENDING', 'REJECTED': 'FAILED'}
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = "Seed a large history and compare dashboard query plans without and with the dashboard indexes."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--orders', type=int, default=50000,
+                            help='Orders to seed (default: 50000).')
+        parser.add_argument('--repeat', type=int, default=5,
+                            help='Runs per query; the best time is reported (default: 5).')
+        parser.add_argument('--seed', type=int, default=0,
+                            help='Random seed for the synthetic history (default: 0).')
+
+    def handle(self, *args, **options):
+        if options['orders'] < LIVE_LANE_SIZE * len(LIVE_STATUSES):
+            raise CommandError(f'--orders must be at least {LIVE_LANE_SIZE * len(LIVE_STATUSES)}')
+        try:
+            with transaction.atomic():
+                started = time.monotonic()
+                probe = self._seed(options['orders'], random.Random(options['seed']))
+                with connection.cursor() as cursor:
+                    cursor.execute('ANALYZE')
+                self.stdout.write(f"Seeded {options['orders']} orders in {time.monotonic() - started:.1f}s\n")
+
+                queries = self._queries(probe)
+                after = self._measure(queries, options['repeat'])
+                self._swap_indexes()
+                before = self._measure(queries, options['repeat'])
+                self._report(queries, before, after)
+                raise _Rollback
+        except _Rollback:
+            pass
+
+    def _seed(self, n, rng):
+        now = timezone.now()
+        customers = Customer.objects.bulk_create(
+            [Customer(name=f'Bench {i}', phone=f'9{i:09d}') for i in range(max(n // 10, 1))],
+            batch_size=1000,
+        )
+
+        statuses = [s for s in LIVE_STATUSES for _ in range(LIVE_LANE_SIZE)]
+        statuses += rng.choices(['COMPLETED', 'CANCELED', 'REJECTED'], weights=[90, 7, 3], k=n - len(statuses))
+        rng.shuffle(statuses)
+        orders = []
+        for status in statuses:
+            placed = now - timedelta(minutes=rng.randrange(60 * 24 * 365))
+            orders.append(Order(
+                customer=rng.choice(customers),
+                order_type=rng.choice(['DINING', 'DELIVERY']),
+                total_amount=Decimal(rng.randrange(50, 1500)),
+                status=status,
+                sent_to_chef_at=placed + timedelta(minutes=1) if status != 'PENDING_PAYMENT' else None,
+                preparing_started_at=placed + timedelta(minutes=3) if status not in ('PENDING_PAYMENT', 'PAID') else None,
+                ready_at=placed + timedelta(minutes=15) if status in ('READY_FOR_DELIVERY', 'OUT_FOR_DELIVERY', 'COMPLETED') else None,
+            ))
+        orders = Order.objects.bulk_create(orders, batch_size=1000)
+
+        Payment.objects.bulk_create(
+            [
+                Payment(
+                    order=order,
+                    amount=order.total_amount,
+                    status=PAYMENT_STATUS.get(order.status, 'VERIFIED'),
+                    verified_at=(now - timedelta(minutes=rng.randrange(60 * 24 * 365))
+                                 if PAYMENT_STATUS.get(order.status, 'VERIFIED') == 'VERIFIED' else None),
+                )
+                for order in orders
+            ],
+            batch_size=1000,
+        )
+
+        # Every checkout leaves a CHECKED_OUT cart behind; regulars also have one OPEN
+        Cart.objects.bulk_create(
+            [Cart(session_key=f'bench{o.pk}', customer_id=o.customer_id, status='CHECKED_OUT') for o in orders]
+            + [Cart(session_key=f'bench-open{c.pk}', customer=c, status='OPEN') for c in customers[::3]],
+            batch_size=1000,
+        )
+        return customers[0]
+
+    def _queries(self, customer):
+        """The dashboard and checkout queries, shaped as in cafe.views / cafe.utils."""
+        lane = Order.objects.select_related('customer', 'delivery_address')
+        today_start = timezone.now().replace(hour=0, minute=0, second=0, microsecond=0)
+        week_ago = timezone.now() - timedelta(days=7)
+        return [
+            ('chef: waiting', lane.filter(status='PAID').order_by('sent_to_chef_at', 'created_at')),
+            ('chef: preparing', lane.filter(status='PREPARING').order_by('preparing_started_at')),
+            ('waiter: ready', lane.filter(status='READY_FOR_DELIVERY').order_by('ready_at')),
+            ('waiter: out', lane.filter(status='OUT_FOR_DELIVERY').order_by('updated_at')),
+            ('payments: pending',
+             Payment.objects.filter(status='PENDING').select_related('order', 'order__customer').order_by('-created_at')),
+            ('payments: verified today',
+             Payment.objects.filter(status='VERIFIED', verified_at__gte=today_start)),
+            ('history: last 7 days',
+             Order.objects.filter(created_at__gte=week_ago).order_by('-created_at', '-id')[:50]),
+            ('checkout: customer lookup', Customer.objects.filter(name=customer.name, phone=customer.phone)),
+            ('cart: open cart for customer', Cart.objects.filter(customer=customer, status='OPEN')),
+        ]
+
+    def _measure(self, queries, repeat):
+        results = []
+        for _, qs in queries:
+            best = float('inf')
+            for _ in range(repeat):
+                started = time.perf_counter()
+                list(qs.all())
+                best = min(best, time.perf_counter() - started)
+            results.append((qs.explain(), best * 1000))
+        return results
+
+    def _swap_indexes(self):
+        """Drop the benchmarked indexes and restore the ones they replaced (inside the transaction)."""
+        editor = connection.schema_editor()
+        with connection.cursor() as cursor:
+            for model, names in BENCHMARKED_INDEXES.items():
+                for index in model._meta.indexes:
+                    if index.name in names:
+                        cursor.execute(editor.sql_delete_index % {
+                            'table': editor.quote_name(model._meta.db_table),
+                            'name': editor.quote_name(index.name),
+                        })
+            for model, index in REPLACED_INDEXES:
+                cursor.execute(str(index.create_sql(model, editor)))
+
+    def _report(self, queries, before, after):
+        for (name, _), (plan_before, ms_before), (plan_after, ms_after) in zip(queries, before, after):
+            self.stdout.write(self.style.MIGRATE_HEADING(name))
+            self.stdout.write(f'  before  {ms_before:8.2f} ms')
+            for line in plan_before.splitlines():
+                self.stdout.write(f'          {line}')
+            self.stdout.write(f'  after   {ms_after:8.2f} ms')
+            for line in plan_after.splitlines():
+                self.stdout.write(f'          {line}')
+            self.stdout.write('')
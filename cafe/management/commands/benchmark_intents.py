@@ -0,0 +1,94 @@
+"""
+Measure the chat assistant's intent router against the labelled corpus.
+
+Every line of ``cafe/intent_corpus.jsonl`` is a chat message with the intent
+a person would expect it to get (``help`` for the fallback reply). The
+command routes each message the way ``CafeAIEngine.handle`` does and reports
+throughput, overall and per-intent accuracy, and the most common confusions:
+
+    python3 manage.py benchmark_intents
+    python3 manage.py benchmark_intents --show-misses 20 --min-accuracy 0.85
+
+Use ``--min-accuracy`` in CI when tuning keywords or intent order, so a
+change that helps one intent can't quietly break others. No database access.
+"""
+import json
+import time
+from collections import Counter
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from cafe.ai_engine import CafeAIEngine
+
+DEFAULT_CORPUS = Path(__file__).resolve().parents[2] / 'intent_corpus.jsonl'
+# handle() falls back to the help reply when no handler answers
+FALLBACK_INTENT = 'help'
+
+
+def load_corpus(path):
+    with open(path, encoding='utf-8') as corpus:
+        return [json.loads(line) for line in corpus if line.strip()]
+
+
+def routed_intent(router, text):
+    """The best-ranked intent with a handler, the one ``handle`` asks first (``help`` if none)."""
+    return next((name for name in router.route(text) if name in router.handlers), FALLBACK_INTENT)
+
+
+class Command(BaseCommand):
+    help = "Report messages/sec and accuracy of the chat intent router on the labelled corpus."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--corpus', default=str(DEFAULT_CORPUS),
+                            help='JSON lines of {"message", "intent"} (default: cafe/intent_corpus.jsonl).')
+        parser.add_argument('--repeat', type=int, default=5,
+                            help='Passes over the corpus for the timing; the best is reported (default: 5).')
+        parser.add_argument('--show-misses', type=int, default=0,
+                            help='Print up to this many misrouted messages.')
+        parser.add_argument('--min-accuracy', type=float, default=None,
+                            help='Exit with an error if overall accuracy is below this fraction.')
+
+    def handle(self, *args, **options):
+        try:
+            corpus = load_corpus(options['corpus'])
+        except (OSError, ValueError) as exc:
+            raise CommandError(f"Can't read the corpus: {exc}")
+        if not corpus:
+            raise CommandError('The corpus is empty')
+        router = CafeAIEngine.ROUTER
+        texts = [row['message'].strip().lower() for row in corpus]
+
+        best = float('inf')
+        for _ in range(max(1, options['repeat'])):
+            started = time.perf_counter()
+            for text in texts:
+                router.route(text)
+            best = min(best, time.perf_counter() - started)
+        self.stdout.write(self.style.SUCCESS(
+            f"Routed {len(texts)} messages in {best * 1000:.1f} ms ({len(texts) / best:,.0f} messages/sec)"
+        ))
+
+        predicted = [routed_intent(router, text) for text in texts]
+        expected = [row['intent'] for row in corpus]
+        correct = sum(p == e for p, e in zip(predicted, expected))
+        accuracy = correct / len(corpus)
+        self.stdout.write(f"Accuracy: {correct}/{len(corpus)} ({accuracy:.1%})")
+
+        totals = Counter(expected)
+        hits = Counter(e for p, e in zip(predicted, expected) if p == e)
+        for intent in sorted(totals, key=lambda name: hits[name] / totals[name]):
+            self.stdout.write(f"  {intent:<15} {hits[intent]:>5}/{totals[intent]:<5} {hits[intent] / totals[intent]:6.1%}")
+
+        confusions = Counter((e, p) for p, e in zip(predicted, expected) if p != e)
+        if confusions:
+            self.stdout.write('Most common confusions (expected -> routed):')
+            for (e, p), count in confusions.most_common(8):
+                self.stdout.write(f"  {e} -> {p}: {count}")
+
+        misses = [(row['message'], e, p) for row, p, e in zip(corpus, predicted, expected) if p != e]
+        for message, e, p in misses[:options['show_misses']]:
+            self.stdout.write(f"  {message!r}: expected {e}, routed {p}")
+
+        if options['min_accuracy'] is not None and accuracy < options['min_accuracy']:
+            raise CommandError(f"Accuracy {accuracy:.1%} is below --min-accuracy {options['min_accuracy']:.1%}")
@@ -0,0 +1,113 @@
+"""
+Time chat item matching on a large synthetic catalogue.
+
+Builds ``--items`` made-up menu items in memory (no database access), then
+matches a batch of chat messages against them with the indexed matcher the
+assistant uses (``cafe.matching.MenuIndex``) and with the old linear scan:
+
+    python3 manage.py benchmark_matching
+    python3 manage.py benchmark_matching --items 50000 --messages 500
+
+Messages name an item with a quantity ("2 paneer masala wrap", "... x3"),
+misspell one of its words, or name nothing at all. Besides the timings it
+reports how often each matcher found the intended item with the right
+quantity.
+"""
+import random
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from cafe.matching import MenuIndex, linear_match_items
+
+FLAVOURS = [
+    "masala", "paneer", "chicken", "mutton", "egg", "mushroom", "corn", "aloo", "gobi", "palak",
+    "tandoori", "schezwan", "peri", "garlic", "butter", "cheese", "chilli", "pepper", "mint", "lemon",
+    "mango", "strawberry", "chocolate", "vanilla", "caramel", "hazelnut", "coconut", "ginger", "honey", "smoked",
+]
+DISHES = [
+    "wrap", "burger", "sandwich", "pizza", "biryani", "pulao", "noodles", "momos", "rolls", "tikka",
+    "curry", "rice", "paratha", "dosa", "salad", "soup", "shake", "smoothie", "mojito", "latte",
+    "cappuccino", "mocktail", "lassi", "cake", "muffin", "brownie", "waffle", "pasta", "nachos", "fries",
+]
+STYLES = ["classic", "special", "jumbo", "mini", "double", "royal", "street", "fusion", "crispy", "loaded", "deluxe", "homestyle"]
+OUTLETS = ["", "indiranagar", "koramangala", "bandra", "andheri", "saket", "hauz", "jubilee", "salt", "park"]
+FILLER = ["hello what do you recommend", "is the kitchen open", "thanks a lot", "show me something sweet"]
+
+
+def _catalogue(count, rng):
+    names = set()
+    while len(names) < count:
+        words = [rng.choice(STYLES), rng.choice(FLAVOURS), rng.choice(DISHES), rng.choice(OUTLETS)]
+        names.add(" ".join(w for w in words if w).title())
+    return tuple({"id": pk, "name": name} for pk, name in enumerate(sorted(names), start=1))
+
+
+def _misspell(word, rng):
+    if len(word) < 5:
+        return word
+    i = rng.randrange(1, len(word) - 1)
+    return word[:i] + word[i + 1:]
+
+
+def _messages(items, count, rng):
+    messages = []
+    for n in range(count):
+        if n % 10 == 9:
+            messages.append((rng.choice(FILLER), None, None))
+            continue
+        item = rng.choice(items)
+        qty = rng.randint(1, 5)
+        name = item["name"].lower()
+        kind = n % 3
+        if kind == 0:
+            text = f"order {qty} {name}"
+        elif kind == 1:
+            text = f"add {name} x{qty} please"
+        else:
+            words = name.split()
+            longest = max(range(len(words)), key=lambda i: len(words[i]))
+            words[longest] = _misspell(words[longest], rng)
+            text = f"i want {qty} {' '.join(words)}"
+        messages.append((text, item["id"], qty))
+    return messages
+
+
+class Command(BaseCommand):
+    help = "Compare the indexed chat item matcher with the old linear scan on a synthetic catalogue."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--items', type=int, default=10000,
+                            help='Catalogue size (default: 10000).')
+        parser.add_argument('--messages', type=int, default=200,
+                            help='Chat messages to match (default: 200).')
+        parser.add_argument('--skip-linear', action='store_true',
+                            help='Only time the indexed matcher.')
+        parser.add_argument('--seed', type=int, default=0,
+                            help='Random seed (default: 0).')
+
+    def handle(self, *args, **options):
+        if options['items'] < 1 or options['messages'] < 1:
+            raise CommandError('--items and --messages must be positive')
+        rng = random.Random(options['seed'])
+        items = _catalogue(options['items'], rng)
+        messages = _messages(items, options['messages'], rng)
+
+        started = time.perf_counter()
+        index = MenuIndex(items)
+        self.stdout.write(f"Built the index over {len(items)} items in {(time.perf_counter() - started) * 1000:.0f} ms")
+
+        matchers = [('indexed', index.match_items)]
+        if not options['skip_linear']:
+            matchers.append(('linear', lambda text: linear_match_items(items, text)))
+        for label, match in matchers:
+            started = time.perf_counter()
+            results = [match(text) for text, _, _ in messages]
+            elapsed = time.perf_counter() - started
+            hits = sum(1 for (_, pk, qty), found in zip(messages, results) if pk is not None and (pk, qty) in found)
+            wanted = sum(1 for _, pk, _ in messages if pk is not None)
+            self.stdout.write(
+                f"{label:>8}: {elapsed / len(messages) * 1000:8.3f} ms/message, "
+                f"intended item found {hits}/{wanted}, "
+                f"{sum(map(len, results)) / len(messages):.1f} items matched per message on average"
+            )
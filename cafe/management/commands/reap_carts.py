@@ -0,0 +1,100 @@
+"""
+Delete abandoned carts.
+
+OPEN carts with no activity for ``--open-days`` and CHECKED_OUT carts older
+than ``--checked-out-days`` are removed together with their CartItem rows.
+Carts are walked in primary-key order and deleted in small batches, each in
+its own short transaction, so SQLite never holds the write lock for long.
+
+Schedule it from cron, e.g. every night at 03:30:
+
+    30 3 * * * cd /path/to/project && python3 manage.py reap_carts >> reap_carts.log 2>&1
+
+or keep it running in the foreground with ``--every 60`` (minutes).
+"""
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Exists, OuterRef, Q
+from django.utils import timezone
+
+from cafe.models import Cart, CartItem
+
+
+class Command(BaseCommand):
+    help = "Delete abandoned OPEN carts and old CHECKED_OUT carts in bounded batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--open-days', type=int, default=7,
+                            help='Delete OPEN carts idle for this many days (default: 7).')
+        parser.add_argument('--checked-out-days', type=int, default=1,
+                            help='Delete CHECKED_OUT carts older than this many days (default: 1).')
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Carts deleted per transaction (default: 500).')
+        parser.add_argument('--pause', type=float, default=0.05,
+                            help='Seconds to sleep between batches so other writers get the lock (default: 0.05).')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Only count what would be deleted.')
+        parser.add_argument('--every', type=int, default=0,
+                            help='Repeat every N minutes instead of exiting (default: run once).')
+
+    def handle(self, *args, **options):
+        while True:
+            self._reap(options)
+            if not options['every']:
+                break
+            time.sleep(options['every'] * 60)
+
+    def _expired_carts(self, options):
+        now = timezone.now()
+        open_cutoff = now - timedelta(days=options['open_days'])
+        checked_out_cutoff = now - timedelta(days=options['checked_out_days'])
+        # Cart mutations update CartItem rows without touching the cart itself,
+        # so an OPEN cart only counts as idle when none of its lines changed either.
+        recent_line = CartItem.objects.filter(cart=OuterRef('pk'), updated_at__gte=open_cutoff)
+        return Cart.objects.filter(
+            Q(status='OPEN', updated_at__lt=open_cutoff) & ~Q(Exists(recent_line))
+            | Q(status='CHECKED_OUT', updated_at__lt=checked_out_cutoff)
+        )
+
+    def _reap(self, options):
+        batch_size = max(1, options['batch_size'])
+        dry_run = options['dry_run']
+        started = time.monotonic()
+        last_pk = 0
+        carts_deleted = 0
+        items_deleted = 0
+
+        while True:
+            ids = list(
+                self._expired_carts(options)
+                .filter(pk__gt=last_pk)
+                .order_by('pk')
+                .values_list('pk', flat=True)[:batch_size]
+            )
+            if not ids:
+                break
+            last_pk = ids[-1]
+
+            if dry_run:
+                carts_deleted += len(ids)
+                items_deleted += CartItem.objects.filter(cart_id__in=ids).count()
+                continue
+
+            with transaction.atomic():
+                # Re-check expiry inside the transaction: a cart may have been used since we read it
+                ids = list(self._expired_carts(options).filter(pk__in=ids).values_list('pk', flat=True))
+                items_deleted += CartItem.objects.filter(cart_id__in=ids).delete()[0]
+                carts_deleted += Cart.objects.filter(pk__in=ids).delete()[0]
+            if options['pause']:
+                time.sleep(options['pause'])
+
+        elapsed = time.monotonic() - started
+        rate = (carts_deleted + items_deleted) / elapsed if elapsed > 0 else 0.0
+        verb = 'Would delete' if dry_run else 'Deleted'
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} {carts_deleted} cart(s) and {items_deleted} cart item(s) "
+            f"in {elapsed:.2f}s ({rate:.0f} rows/sec)"
+        ))
@@ -0,0 +1,57 @@
+"""
+Rebuild or verify the reporting rollups from order history.
+
+The rollups are maintained incrementally as orders are placed and change
+status; run this after loading historical data, after editing orders outside
+the app, or whenever the numbers look off:
+
+    python3 manage.py rebuild_rollups            # rebuild everything
+    python3 manage.py rebuild_rollups --check    # only report differences
+    python3 manage.py rebuild_rollups item_sales # one rollup
+
+``customer_stats`` backfills the lifetime figures stored on each Customer.
+``kitchen_sla`` rebuilds the kitchen latency sketches from order timestamps.
+
+``--check`` exits with status 1 when a rollup disagrees with the raw rows,
+so it can run from cron or CI.
+"""
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from cafe import rollups
+
+
+class Command(BaseCommand):
+    help = "Recompute (or with --check, verify) the sales rollups and customer stats from order history."
+
+    def add_arguments(self, parser):
+        parser.add_argument('names', nargs='*', choices=[[]] + list(rollups.ROLLUPS), metavar='rollup',
+                            help=f"Rollups to process: {', '.join(rollups.ROLLUPS)} (default: all).")
+        parser.add_argument('--check', action='store_true',
+                            help='Compare with the raw rows instead of rebuilding; exit 1 on differences.')
+        parser.add_argument('--show', type=int, default=10,
+                            help='Differences to print per rollup with --check (default: 10).')
+
+    def handle(self, *args, **options):
+        names = options['names'] or list(rollups.ROLLUPS)
+        failed = []
+        for name in names:
+            started = time.monotonic()
+            if not options['check']:
+                rows = rollups.rebuild(name)
+                self.stdout.write(self.style.SUCCESS(
+                    f"Rebuilt {name}: {rows} row(s) in {time.monotonic() - started:.2f}s"
+                ))
+                continue
+            mismatches = rollups.check(name)
+            elapsed = time.monotonic() - started
+            if not mismatches:
+                self.stdout.write(self.style.SUCCESS(f"{name}: consistent ({elapsed:.2f}s)"))
+                continue
+            failed.append(name)
+            self.stdout.write(self.style.ERROR(f"{name}: {len(mismatches)} bucket(s) differ ({elapsed:.2f}s)"))
+            for key, stored, expected in mismatches[:options['show']]:
+                self.stdout.write(f"  {key}: stored={stored} expected={expected}")
+        if failed:
+            raise CommandError(f"Inconsistent rollups: {', '.join(failed)} (run without --check to rebuild)")
@@ -0,0 +1,208 @@
+"""
+Finding menu items in chat messages.
+
+``MenuIndex`` is built once per menu snapshot (see ``cafe.menu``) so that
+matching a message costs work proportional to the words in the message (and
+the few items filed under each), not to the size of the menu:
+
+* Each item's key words are the words of its name longer than two letters
+  (all of them if there are none). The item is filed in an inverted index
+  under its *anchor*, the rarest of those words. A message can only name the
+  item if it contains the anchor, so a lookup per message word yields every
+  candidate, and a candidate matches when all its key words are present.
+* A message word that is not on the menu may be a typo. A character-trigram
+  index over the menu vocabulary finds the menu words that share enough
+  trigrams with it. Those scoring ``FUZZY_CUTOFF`` or better with difflib
+  count as present too, so "2 capuchino" still finds Cappuccino.
+* A table of whole names, keyed by token tuple, answers "is this exact name
+  in the message".
+* Quantities ("2 latte", "latte x2", "latte x 2") for every word come out of
+  one pass over the message's tokens. An item takes the number before its
+  last or first key word ("2 cold coffee"), else the one after its last.
+
+Before any of that the assistant runs the message through a
+``TypoNormalizer``, which rewrites the misspellings managers keep in the
+``TypoCorrection`` table in one regex pass with a dictionary lookup per word,
+so a long correction list costs no more than a short one.
+"""
+import difflib
+import re
+from collections import Counter, defaultdict
+from types import MappingProxyType
+from typing import Dict, List, Mapping, Optional, Sequence, Tuple
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+WORD_RE = re.compile(r"\w+")
+FUZZY_CUTOFF = 0.7
+# Shorter words are too ambiguous to correct ("tea" vs "pea")
+MIN_FUZZY_LENGTH = 4
+# Cheap trigram-overlap (Dice) screen before the difflib check
+_MIN_TRIGRAM_DICE = 0.4
+
+
+def tokenize(text: str) -> List[str]:
+    return TOKEN_RE.findall(text.lower())
+
+
+def trigrams(word: str) -> set:
+    padded = f" {word} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def key_words(tokens: Sequence[str]) -> List[str]:
+    """The words of a name that must appear in a message naming it, in order."""
+    words = [token for token in tokens if len(token) > 2]
+    return list(dict.fromkeys(words or tokens))
+
+
+def quantities(tokens: Sequence[str]) -> Tuple[Dict[str, int], Dict[str, int]]:
+    """
+    ``({word: n}, {word: n})`` for numbers before ("2 latte") and after
+    ("latte 2", "latte x2", "latte x 2") the words of a message.
+    """
+    before: Dict[str, int] = {}
+    after: Dict[str, int] = {}
+    for i, token in enumerate(tokens):
+        following = tokens[i + 1] if i + 1 < len(tokens) else ""
+        if token.isdigit():
+            if following and not following.isdigit():
+                before.setdefault(following, int(token))
+        elif following.isdigit():
+            after.setdefault(token, int(following))
+        elif following[:1] == "x" and following[1:].isdigit():
+            after.setdefault(token, int(following[1:]))
+        elif following == "x" and i + 2 < len(tokens) and tokens[i + 2].isdigit():
+            after.setdefault(token, int(tokens[i + 2]))
+    return before, after
+
+
+class TypoNormalizer:
+    """Rewrites known misspellings (``{wrong word: correction}``) in lowercased text."""
+
+    def __init__(self, corrections: Mapping[str, str]):
+        self.corrections = MappingProxyType({wrong.lower(): correct.lower() for wrong, correct in corrections.items()})
+
+    def __call__(self, text: str) -> str:
+        if not self.corrections:
+            return text
+        lookup = self.corrections.get
+        return WORD_RE.sub(lambda match: lookup(match.group(), match.group()), text)
+
+
+class MenuIndex:
+    """Lookup structures over one menu snapshot's items (rows with ``id`` and ``name``)."""
+
+    def __init__(self, items: Sequence[Mapping]):
+        self.items = items
+        self._position = {item["id"]: pos for pos, item in enumerate(items)}
+        self._named = {}
+        self._phrases = defaultdict(list)
+        self._keys = []
+        for pos, item in enumerate(items):
+            tokens = tokenize(item["name"])
+            self._named.setdefault(item["name"].lower(), item)
+            if tokens:
+                self._phrases[tuple(tokens)].append(pos)
+            self._keys.append(key_words(tokens))
+        self._phrase_lengths = sorted({len(phrase) for phrase in self._phrases})
+
+        frequency = Counter(word for keys in self._keys for word in keys)
+        self._key_sets = [frozenset(keys) for keys in self._keys]
+        self._anchored = defaultdict(list)
+        for pos, keys in enumerate(self._keys):
+            if keys:
+                self._anchored[min(keys, key=lambda word: (frequency[word], word))].append(pos)
+
+        self._vocabulary = frozenset(frequency)
+        self._by_trigram = defaultdict(list)
+        for word in self._vocabulary:
+            for gram in trigrams(word):
+                self._by_trigram[gram].append(word)
+
+    def item(self, item_id) -> Optional[Mapping]:
+        pos = self._position.get(item_id)
+        return None if pos is None else self.items[pos]
+
+    def item_named(self, name: str) -> Optional[Mapping]:
+        return self._named.get(name.lower())
+
+    def corrections(self, word: str) -> List[str]:
+        """Menu words that ``word`` is probably a misspelling of."""
+        grams = trigrams(word)
+        shared = Counter(candidate for gram in grams for candidate in self._by_trigram.get(gram, ()))
+        matcher = difflib.SequenceMatcher(b=word)
+        found = []
+        for candidate, count in shared.items():
+            if 2 * count / (len(grams) + len(candidate)) < _MIN_TRIGRAM_DICE:
+                continue
+            matcher.set_seq1(candidate)
+            if matcher.ratio() >= FUZZY_CUTOFF:
+                found.append(candidate)
+        return found
+
+    def _present_words(self, tokens: Sequence[str]) -> Dict[str, str]:
+        """``{menu word: message word}`` for menu words said outright or misspelt."""
+        present = {token: token for token in tokens if token in self._vocabulary}
+        for token in set(tokens):
+            if token in present or len(token) < MIN_FUZZY_LENGTH or token.isdigit():
+                continue
+            for word in self.corrections(token):
+                present.setdefault(word, token)
+        return present
+
+    def _candidates(self, present: Mapping[str, str]) -> List[int]:
+        found = set()
+        for word in present:
+            for pos in self._anchored.get(word, ()):
+                if self._key_sets[pos].issubset(present):
+                    found.add(pos)
+        return sorted(found)
+
+    def match_items(self, text: str) -> List[Tuple[int, int]]:
+        """``(item_id, quantity)`` for every item the message names, in menu order."""
+        tokens = tokenize(text)
+        present = self._present_words(tokens)
+        before, after = quantities(tokens)
+        matches = []
+        for pos in self._candidates(present):
+            first, last = present[self._keys[pos][0]], present[self._keys[pos][-1]]
+            qty = before.get(last) or before.get(first) or after.get(last) or 1
+            matches.append((self.items[pos]["id"], max(1, qty)))
+        return matches
+
+    def mentioned(self, text: str) -> List[Mapping]:
+        """Items whose exact name appears in the message, in menu order."""
+        tokens = tokenize(text)
+        found = set()
+        for start in range(len(tokens)):
+            for length in self._phrase_lengths:
+                if start + length > len(tokens):
+                    break
+                found.update(self._phrases.get(tuple(tokens[start:start + length]), ()))
+        return [self.items[pos] for pos in sorted(found)]
+
+    def closest(self, text: str) -> Optional[Mapping]:
+        """The most specific item the message names, allowing for typos (None if none)."""
+        candidates = self._candidates(self._present_words(tokenize(text)))
+        if not candidates:
+            return None
+        return self.items[max(candidates, key=lambda pos: (len(self._keys[pos]), -pos))]
+
+
+def linear_match_items(items: Sequence[Mapping], text_lower: str) -> List[Tuple[int, int]]:
+    """
+    The matcher the assistant used before ``MenuIndex``: a substring and
+    difflib check against every item plus per-item quantity regexes. Only
+    kept as the baseline for ``benchmark_matching``.
+    """
+    matches = []
+    for item in items:
+        name = item["name"].lower()
+        words = [w for w in name.split() if len(w) > 2]
+        token = words[-1] if words else name
+        if not (name in text_lower or all(w in text_lower for w in words)
+                or difflib.get_close_matches(name, [text_lower], n=1, cutoff=FUZZY_CUTOFF)):
+            continue
+        match = re.search(rf"(\d+)\s+{re.escape(token)}", text_lower) or re.search(rf"{re.escape(token)}\s*x?(\d+)", text_lower)
+        matches.append((item["id"], max(1, int(match.group(1))) if match else 1))
+    return matches
@@ -0,0 +1,111 @@
+"""
+Menu data for the chat assistant, shared across requests.
+
+Each worker process keeps one immutable ``MenuSnapshot`` of the active items
+(id, name, price, description, category), with its ``MenuIndex`` for
+matching chat messages and the ``TypoNormalizer`` for the managers' typo
+corrections (``cafe.matching``) and its ``BudgetPlanner`` for budget and
+combo questions (``cafe.combos``), tagged with the menu version it was built
+from. The version is a counter in the Django cache that the ``Item``,
+``ItemCategory`` and ``TypoCorrection`` save/delete signals bump after commit, so a chat request
+costs a single cache read while the menu is unchanged and the first request
+after an edit rebuilds it. Every worker sees the bump through the shared
+cache in settings (``CACHES``). In case a bump is lost anyway (a
+per-process cache, an evicted key) a snapshot is also rebuilt once it is
+``MENU_SNAPSHOT_MAX_AGE`` seconds old, so a stale worker catches up within
+a minute.
+
+Best sellers come from the item sales rollup and are cached for
+``TOP_SELLERS_CACHE_TIMEOUT`` seconds; they drift slowly and a slightly
+stale list is fine for "what's popular?".
+"""
+import time
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import Mapping, Tuple
+
+from django.core.cache import cache
+
+from .combos import BudgetPlanner
+from .matching import MenuIndex, TypoNormalizer
+from .models import Item, TypoCorrection
+from .rollups import item_sales
+
+MENU_VERSION_KEY = "cafe:menu-version"
+TOP_SELLERS_CACHE_KEY = "cafe:top-sellers"
+TOP_SELLERS_CACHE_TIMEOUT = 300
+TOP_SELLERS_LIMIT = 5
+MENU_SNAPSHOT_MAX_AGE = 60
+
+
+@dataclass(frozen=True)
+class MenuSnapshot:
+    version: int
+    items: Tuple[Mapping, ...]  # read-only rows in menu order
+    index: MenuIndex  # item matching for chat messages, built once per snapshot
+    normalizer: TypoNormalizer  # applied to messages before matching
+    planner: BudgetPlanner  # price-sorted items for budget questions
+    built_at: float  # time.monotonic() when taken
+
+
+_snapshot = None
+
+
+def menu_version() -> int:
+    version = cache.get(MENU_VERSION_KEY)
+    if version is None:
+        # Seeded from the clock so a cleared cache never hands out a version a worker already holds
+        cache.add(MENU_VERSION_KEY, time.time_ns(), None)
+        version = cache.get(MENU_VERSION_KEY)
+    return version
+
+
+def bump_menu_version() -> None:
+    """Mark every worker's menu snapshot stale; call after the change is committed."""
+    try:
+        cache.incr(MENU_VERSION_KEY)
+    except ValueError:
+        # Not in the cache (cleared or evicted): seeding a fresh version has the same effect
+        menu_version()
+    cache.delete(TOP_SELLERS_CACHE_KEY)
+
+
+def get_menu_snapshot() -> MenuSnapshot:
+    """
+    This process's menu snapshot, rebuilt first if the menu changed since it
+    was taken or it is older than ``MENU_SNAPSHOT_MAX_AGE``.
+    """
+    global _snapshot
+    # Read the version before the items: an edit committed in between bumps it again
+    version = menu_version()
+    snapshot = _snapshot
+    now = time.monotonic()
+    if snapshot is None or snapshot.version != version or now - snapshot.built_at > MENU_SNAPSHOT_MAX_AGE:
+        items = _load_items()
+        corrections = dict(TypoCorrection.objects.values_list("wrong", "correct"))
+        snapshot = _snapshot = MenuSnapshot(
+            version=version, items=items, index=MenuIndex(items), normalizer=TypoNormalizer(corrections),
+            planner=BudgetPlanner(items), built_at=now,
+        )
+    return snapshot
+
+
+def _load_items() -> Tuple[Mapping, ...]:
+    rows = (
+        Item.objects.filter(is_active=True)
+        .values("id", "name", "price", "description", "category__name")
+        .order_by("category__display_order", "name")
+    )
+    return tuple(MappingProxyType(row) for row in rows)
+
+
+def top_sellers() -> list:
+    """The best-selling items (``id``, ``name``, ``total``) from the rollup, cached briefly."""
+    rows = cache.get(TOP_SELLERS_CACHE_KEY)
+    if rows is None:
+        rows = [
+            {"id": row["item_id"], "name": row["item__name"], "total": row["total_qty"]}
+            for row in item_sales().order_by("-total_qty")[:TOP_SELLERS_LIMIT]
+        ]
+        cache.set(TOP_SELLERS_CACHE_KEY, rows, TOP_SELLERS_CACHE_TIMEOUT)
+    return rows
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-16 22:21
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cafe', '0005_itemcategory_alter_order_options_order_completed_at_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IdempotencyKey',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('key', models.CharField(max_length=64, unique=True)),
+                ('scope', models.CharField(choices=[('CHECKOUT', 'Checkout'), ('AI_CHAT', 'AI Chat')], max_length=20)),
+                ('order', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='idempotency_key', to='cafe.order')),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.18 on 2026-10-16 22:33
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+
+
+def backfill_daily_sales(apps, schema_editor):
+    Order = apps.get_model('cafe', 'Order')
+    DailySalesRollup = apps.get_model('cafe', 'DailySalesRollup')
+    rows = (
+        Order.objects
+        .annotate(date=TruncDate('created_at'))
+        .values('date', 'order_type', 'status')
+        .annotate(revenue=Sum('total_amount'), order_count=Count('id'))
+        .order_by()
+    )
+    DailySalesRollup.objects.bulk_create([DailySalesRollup(**row) for row in rows], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cafe', '0007_order_status_updated_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailySalesRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('order_type', models.CharField(choices=[('DINING', 'Dining'), ('DELIVERY', 'Delivery')], max_length=20)),
+                ('status', models.CharField(choices=[('PENDING_PAYMENT', 'Pending Payment'), ('PAID', 'Paid'), ('PREPARING', 'Preparing'), ('READY_FOR_DELIVERY', 'Ready for Delivery'), ('OUT_FOR_DELIVERY', 'Out for Delivery'), ('COMPLETED', 'Completed'), ('CANCELED', 'Canceled'), ('REJECTED', 'Rejected')], max_length=20)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('order_count', models.IntegerField(default=0)),
+            ],
+            options={
+                'unique_together': {('date', 'order_type', 'status')},
+            },
+        ),
+        migrations.RunPython(backfill_daily_sales, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 5.2.18 on 2026-10-16 22:34
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDate
+
+
+def backfill_item_sales(apps, schema_editor):
+    OrderItem = apps.get_model('cafe', 'OrderItem')
+    ItemSalesRollup = apps.get_model('cafe', 'ItemSalesRollup')
+    rows = (
+        OrderItem.objects
+        .filter(item_id__isnull=False)
+        .annotate(date=TruncDate('order__created_at'), status=F('order__status'))
+        .values('date', 'item_id', 'status')
+        .annotate(
+            units=Sum('quantity'),
+            revenue=Sum(F('quantity') * F('unit_price')),
+            order_count=Count('order_id', distinct=True),
+        )
+        .order_by()
+    )
+    ItemSalesRollup.objects.bulk_create([
+        ItemSalesRollup(
+            date=row['date'], item_id=row['item_id'], status=row['status'],
+            quantity=row['units'], revenue=row['revenue'], order_count=row['order_count'],
+        )
+        for row in rows
+    ], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cafe', '0008_dailysalesrollup'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ItemSalesRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('status', models.CharField(choices=[('PENDING_PAYMENT', 'Pending Payment'), ('PAID', 'Paid'), ('PREPARING', 'Preparing'), ('READY_FOR_DELIVERY', 'Ready for Delivery'), ('OUT_FOR_DELIVERY', 'Out for Delivery'), ('COMPLETED', 'Completed'), ('CANCELED', 'Canceled'), ('REJECTED', 'Rejected')], max_length=20)),
+                ('quantity', models.IntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('order_count', models.IntegerField(default=0)),
+                ('item', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='sales_rollups', to='cafe.item')),
+            ],
+            options={
+                'unique_together': {('date', 'item', 'status')},
+            },
+        ),
+        migrations.RunPython(backfill_item_sales, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,60 @@
+# Generated by Django 5.2.18 on 2026-10-16 22:37
+
+from django.db import migrations, models
+from django.db.models import Count, Max, Q, Sum
+
+EXCLUDED_STATUSES = ('CANCELED', 'REJECTED')
+
+
+def backfill_customer_stats(apps, schema_editor):
+    Customer = apps.get_model('cafe', 'Customer')
+    Order = apps.get_model('cafe', 'Order')
+    OrderItem = apps.get_model('cafe', 'OrderItem')
+    counted = ~Q(status__in=EXCLUDED_STATUSES)
+    customers = {}
+    for row in (Order.objects.filter(customer_id__isnull=False).values('customer_id')
+                .annotate(spend=Sum('total_amount', filter=counted), orders=Count('id', filter=counted),
+                          last=Max('created_at'))
+                .order_by()):
+        customers[row['customer_id']] = Customer(
+            pk=row['customer_id'], lifetime_spend=row['spend'] or 0, lifetime_orders=row['orders'],
+            lifetime_items=0, last_order_at=row['last'],
+        )
+    for row in (OrderItem.objects.filter(order__customer_id__isnull=False)
+                .exclude(order__status__in=EXCLUDED_STATUSES)
+                .values('order__customer_id').annotate(units=Sum('quantity')).order_by()):
+        customers[row['order__customer_id']].lifetime_items = row['units']
+    Customer.objects.bulk_update(
+        customers.values(), ['lifetime_spend', 'lifetime_orders', 'lifetime_items', 'last_order_at'], batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cafe', '0009_itemsalesrollup'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customer',
+            name='last_order_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='customer',
+            name='lifetime_items',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='customer',
+            name='lifetime_orders',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='customer',
+            name='lifetime_spend',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=14),
+        ),
+        migrations.RunPython(backfill_customer_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 5.2.18 on 2026-10-16 22:45
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cafe', '0011_order_history_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='customer',
+            name='phone',
+            field=models.CharField(max_length=20),
+        ),
+        migrations.AddIndex(
+            model_name='cart',
+            index=models.Index(condition=models.Q(('status', 'OPEN')), fields=['customer'], name='cart_customer_open_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='customer',
+            index=models.Index(fields=['phone', 'name'], name='customer_phone_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(condition=models.Q(('status', 'PAID')), fields=['sent_to_chef_at', 'created_at'], name='order_chef_queue_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(condition=models.Q(('status', 'PREPARING')), fields=['preparing_started_at'], name='order_preparing_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(condition=models.Q(('status', 'READY_FOR_DELIVERY')), fields=['ready_at'], name='order_ready_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='payment',
+            index=models.Index(condition=models.Q(('status', 'PENDING')), fields=['-created_at'], name='payment_pending_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='payment',
+            index=models.Index(fields=['status', 'verified_at'], name='payment_status_verified_idx'),
+        ),
+    ]
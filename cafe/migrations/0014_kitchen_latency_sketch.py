@@ -0,0 +1,84 @@
+# Generated by Django 5.2.18 on 2026-10-16 22:51
+
+import math
+from collections import defaultdict
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.utils import timezone
+
+
+# Frozen copy of cafe.sla as of this migration: bucketing and metrics must not drift with the app code
+SKETCH_RELATIVE_ACCURACY = 0.02
+_LOG_GAMMA = math.log((1 + SKETCH_RELATIVE_ACCURACY) / (1 - SKETCH_RELATIVE_ACCURACY))
+MIN_SECONDS = 1.0
+SLA_METRICS = {
+    'queue': ('sent_to_chef_at', 'preparing_started_at'),
+    'prep': ('preparing_started_at', 'ready_at'),
+    'delivery': ('ready_at', 'completed_at'),
+}
+
+
+def backfill_kitchen_sla(apps, schema_editor):
+    KitchenLatencySketch = apps.get_model('cafe', 'KitchenLatencySketch')
+    sources = (
+        (apps.get_model('cafe', 'Order'), apps.get_model('cafe', 'OrderItem')),
+        (apps.get_model('cafe', 'ArchivedOrder'), apps.get_model('cafe', 'ArchivedOrderItem')),
+    )
+    # (date, hour, metric, category_id) -> {bucket: count}
+    sketches = defaultdict(lambda: defaultdict(int))
+    for order_model, line_model in sources:
+        for metric, (start_field, end_field) in SLA_METRICS.items():
+            measured = {f'{start_field}__isnull': False, f'{end_field}__isnull': False}
+            categories_of = defaultdict(set)
+            lines = (
+                line_model.objects
+                .filter(item__category_id__isnull=False, **{f'order__{k}': v for k, v in measured.items()})
+                .values_list('order_id', 'item__category_id').distinct()
+            )
+            for order_id, category_id in lines:
+                categories_of[order_id].add(category_id)
+            for order_id, start, end in order_model.objects.filter(**measured).values_list('id', start_field, end_field):
+                if end < start:
+                    continue
+                local = timezone.localtime(start)
+                seconds = max((end - start).total_seconds(), MIN_SECONDS)
+                bucket = math.ceil(math.log(seconds) / _LOG_GAMMA)
+                for category_id in (None, *categories_of.get(order_id, ())):
+                    sketches[(local.date(), local.hour, metric, category_id)][bucket] += 1
+    KitchenLatencySketch.objects.bulk_create(
+        [
+            KitchenLatencySketch(
+                date=date, hour=hour, metric=metric, category_id=category_id,
+                count=sum(bins.values()), bins={str(k): v for k, v in sorted(bins.items())},
+            )
+            for (date, hour, metric, category_id), bins in sketches.items()
+        ],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cafe', '0013_order_archive'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='KitchenLatencySketch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('hour', models.PositiveSmallIntegerField()),
+                ('metric', models.CharField(choices=[('queue', 'Queue wait'), ('prep', 'Prep time'), ('delivery', 'Handoff / delivery')], max_length=20)),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('bins', models.JSONField(default=dict)),
+                ('category', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='latency_sketches', to='cafe.itemcategory')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('date', 'hour', 'metric', 'category'), name='latency_sketch_uniq'), models.UniqueConstraint(condition=models.Q(('category__isnull', True)), fields=('date', 'hour', 'metric'), name='latency_sketch_all_uniq')],
+            },
+        ),
+        migrations.RunPython(backfill_kitchen_sla, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-16 22:58
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cafe', '0014_kitchen_latency_sketch'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='orderitem',
+            name='order',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='items', to='cafe.order'),
+        ),
+        migrations.AddIndex(
+            model_name='orderitem',
+            index=models.Index(fields=['order', 'item', 'quantity'], name='orderitem_order_item_qty_idx'),
+        ),
+    ]
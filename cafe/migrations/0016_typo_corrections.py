@@ -0,0 +1,51 @@
+# Generated by Django 5.2.18 on 2026-10-16 23:07
+
+import django.core.validators
+from django.db import migrations, models
+
+# The corrections CafeAIEngine._fix_typos used to hard-code
+INITIAL_CORRECTIONS = {
+    "coffe": "coffee",
+    "cofee": "coffee",
+    "expresso": "espresso",
+    "mocctail": "mocktail",
+    "mojitoo": "mojito",
+    "samosaa": "samosa",
+    "samos": "samosa",
+    "lattte": "latte",
+    "capuccino": "cappuccino",
+    "capucino": "cappuccino",
+    "piza": "pizza",
+}
+
+
+def seed_corrections(apps, schema_editor):
+    TypoCorrection = apps.get_model('cafe', 'TypoCorrection')
+    TypoCorrection.objects.bulk_create(
+        [TypoCorrection(wrong=wrong, correct=correct) for wrong, correct in INITIAL_CORRECTIONS.items()],
+        ignore_conflicts=True,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cafe', '0015_orderitem_covering_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TypoCorrection',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('wrong', models.CharField(help_text='The misspelt word, e.g. "capucino".', max_length=50, unique=True, validators=[django.core.validators.RegexValidator('^\\w+$', 'Enter a single word (letters and digits only).')])),
+                ('correct', models.CharField(help_text='What it should read, e.g. "cappuccino".', max_length=100)),
+            ],
+            options={
+                'ordering': ['wrong'],
+            },
+        ),
+        migrations.RunPython(seed_corrections, migrations.RunPython.noop),
+    ]
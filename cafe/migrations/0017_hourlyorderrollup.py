@@ -0,0 +1,46 @@
+# Generated by Django 5.2.18 on 2026-10-16 23:32
+
+from django.db import migrations, models
+from django.db.models import Count
+from django.db.models.functions import ExtractHour, TruncDate
+
+
+def backfill_hourly_orders(apps, schema_editor):
+    HourlyOrderRollup = apps.get_model('cafe', 'HourlyOrderRollup')
+    counts = {}
+    for model_name in ('Order', 'ArchivedOrder'):
+        rows = (
+            apps.get_model('cafe', model_name).objects
+            .annotate(date=TruncDate('created_at'), hour=ExtractHour('created_at'))
+            .values_list('date', 'hour')
+            .annotate(order_count=Count('id'))
+            .order_by()
+        )
+        for date, hour, order_count in rows:
+            counts[(date, hour)] = counts.get((date, hour), 0) + order_count
+    HourlyOrderRollup.objects.bulk_create(
+        [HourlyOrderRollup(date=date, hour=hour, order_count=n) for (date, hour), n in counts.items()], batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cafe', '0016_typo_corrections'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HourlyOrderRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('hour', models.PositiveSmallIntegerField()),
+                ('order_count', models.IntegerField(default=0)),
+            ],
+            options={
+                'unique_together': {('date', 'hour')},
+            },
+        ),
+        migrations.RunPython(backfill_hourly_orders, migrations.RunPython.noop),
+    ]
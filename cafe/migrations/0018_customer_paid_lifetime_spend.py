@@ -0,0 +1,35 @@
+from django.db import migrations
+from django.db.models import Q, Sum
+
+# Frozen copy of cafe.rollups.REVENUE_STATUSES
+PAID_STATUSES = ('PAID', 'PREPARING', 'COMPLETED')
+
+
+def recount_lifetime_spend(apps, schema_editor):
+    Customer = apps.get_model('cafe', 'Customer')
+    spend = {}
+    for model_name in ('Order', 'ArchivedOrder'):
+        rows = (
+            apps.get_model('cafe', model_name).objects
+            .filter(customer_id__isnull=False)
+            .values_list('customer_id')
+            .annotate(spend=Sum('total_amount', filter=Q(status__in=PAID_STATUSES)))
+            .order_by()
+        )
+        for customer_id, amount in rows:
+            spend[customer_id] = spend.get(customer_id, 0) + (amount or 0)
+    Customer.objects.update(lifetime_spend=0)
+    Customer.objects.bulk_update(
+        [Customer(pk=pk, lifetime_spend=amount) for pk, amount in spend.items()], ['lifetime_spend'], batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cafe', '0017_hourlyorderrollup'),
+    ]
+
+    operations = [
+        migrations.RunPython(recount_lifetime_spend, migrations.RunPython.noop),
+    ]
@@ -1,5 +1,6 @@
 from django.db import models
 from django.conf import settings
+from django.core.validators import RegexValidator
 from django.contrib.auth import get_user_model
 
 
@@ -41,19 +42,29 @@ class Customer(TimeStampedModel):
     name = models.CharField(max_length=200)
     phone = models.CharField(max_length=20)
     email = models.EmailField(blank=True, null=True)
+    # Lifetime stats over orders that weren't canceled or rejected, spend over paid
+    # orders only (cafe.rollups.REVENUE_STATUSES); maintained by cafe.rollups
+    lifetime_spend = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    lifetime_orders = models.PositiveIntegerField(default=0)
+    lifetime_items = models.PositiveIntegerField(default=0)
+    last_order_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        indexes = [
+            # Checkout get_or_create(name=, phone=); the phone prefix also serves the history phone filter
+            models.Index(fields=['phone', 'name'], name='customer_phone_name_idx'),
+        ]
 
     def __str__(self):
         return f"{self.name} ({self.phone})"
 
     @property
     def total_spent(self):
-        from django.db.models import Sum
-        agg = self.orders.aggregate(s=Sum('total_amount'))
-        return agg.get('s') or 0
+        return self.lifetime_spend
 
     @property
     def items_purchased_count(self):
-        return sum(oi.quantity for o in self.orders.all() for oi in o.items.all())
+        return self.lifetime_items
 
 
 class Address(TimeStampedModel):
@@ -79,6 +90,12 @@ class Cart(TimeStampedModel):
     customer = models.ForeignKey(Customer, on_delete=models.SET_NULL, blank=True, null=True, related_name='carts')
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='OPEN')
 
+    class Meta:
+        indexes = [
+            # get_or_create_cart: a customer's open cart, skipping their checked-out history
+            models.Index(fields=['customer'], condition=models.Q(status='OPEN'), name='cart_customer_open_idx'),
+        ]
+
     def __str__(self):
         return f"Cart {self.id} ({self.status})"
 
@@ -132,17 +149,39 @@ class Order(TimeStampedModel):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Kitchen/floor delta feed: "orders in these statuses changed since <cursor>"
+            models.Index(fields=['status', 'updated_at'], name='order_status_updated_idx'),
+            # Keyset-paginated history, newest first, optionally filtered by status/type/customer
+            models.Index(fields=['created_at', 'id'], name='order_created_idx'),
+            models.Index(fields=['status', 'created_at', 'id'], name='order_status_created_idx'),
+            models.Index(fields=['order_type', 'created_at', 'id'], name='order_type_created_idx'),
+            models.Index(fields=['customer', 'created_at', 'id'], name='order_customer_created_idx'),
+            # Kitchen and floor lanes: each reads one small status in its own order, so a
+            # partial index per lane stays tiny however much completed history piles up.
+            # (The out-for-delivery lane sorts by updated_at and is served by order_status_updated_idx.)
+            models.Index(fields=['sent_to_chef_at', 'created_at'], condition=models.Q(status='PAID'), name='order_chef_queue_idx'),
+            models.Index(fields=['preparing_started_at'], condition=models.Q(status='PREPARING'), name='order_preparing_idx'),
+            models.Index(fields=['ready_at'], condition=models.Q(status='READY_FOR_DELIVERY'), name='order_ready_idx'),
+        ]
 
     def __str__(self):
         return f"Order #{self.id} - {self.order_type} - {self.status}"
 
 
 class OrderItem(models.Model):
-    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='items')
+    # Indexed by orderitem_order_item_qty_idx below, which leads with order
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='items', db_index=False)
     item = models.ForeignKey(Item, on_delete=models.SET_NULL, null=True)
     quantity = models.PositiveIntegerField()
     unit_price = models.DecimalField(max_digits=10, decimal_places=2)
 
+    class Meta:
+        indexes = [
+            # Covers the demand forecast's order -> (item, quantity) join without touching the table
+            models.Index(fields=['order', 'item', 'quantity'], name='orderitem_order_item_qty_idx'),
+        ]
+
     @property
     def subtotal(self):
         return self.quantity * self.unit_price
@@ -160,10 +199,187 @@ class Payment(TimeStampedModel):
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='PENDING')
     verified_at = models.DateTimeField(blank=True, null=True)
 
+    class Meta:
+        indexes = [
+            # Payment queue (newest first) and the dashboard's pending list
+            models.Index(fields=['-created_at'], condition=models.Q(status='PENDING'), name='payment_pending_idx'),
+            # "Verified today" counts
+            models.Index(fields=['status', 'verified_at'], name='payment_status_verified_idx'),
+        ]
+
     def __str__(self):
         return f"Payment for Order #{self.order_id} - {self.status}"
 
 
+class ArchivedOrder(models.Model):
+    """
+    A finished order moved out of the hot Order table by cafe.archive.
+
+    Mirrors Order field for field (same primary key, timestamps kept as they
+    were), with ``items`` and ``payment`` related the same way, so history
+    pages and exports can render either kind.
+    """
+    is_archived = True
+
+    customer = models.ForeignKey(Customer, on_delete=models.SET_NULL, null=True, related_name='archived_orders')
+    order_type = models.CharField(max_length=20, choices=Order.ORDER_TYPE_CHOICES)
+    table_no = models.CharField(max_length=20, blank=True)
+    delivery_address = models.ForeignKey(Address, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    total_amount = models.DecimalField(max_digits=12, decimal_places=2)
+    status = models.CharField(max_length=20, choices=Order.STATUS_CHOICES)
+    sent_to_chef_at = models.DateTimeField(null=True, blank=True)
+    preparing_started_at = models.DateTimeField(null=True, blank=True)
+    ready_at = models.DateTimeField(null=True, blank=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            # Same keyset history shapes as Order
+            models.Index(fields=['created_at', 'id'], name='archorder_created_idx'),
+            models.Index(fields=['status', 'created_at', 'id'], name='archorder_status_created_idx'),
+            models.Index(fields=['order_type', 'created_at', 'id'], name='archorder_type_created_idx'),
+            models.Index(fields=['customer', 'created_at', 'id'], name='archorder_customer_created_idx'),
+        ]
+
+    def __str__(self):
+        return f"Archived order #{self.id} - {self.order_type} - {self.status}"
+
+
+class ArchivedOrderItem(models.Model):
+    order = models.ForeignKey(ArchivedOrder, on_delete=models.CASCADE, related_name='items')
+    item = models.ForeignKey(Item, on_delete=models.SET_NULL, null=True, related_name='+')
+    quantity = models.PositiveIntegerField()
+    unit_price = models.DecimalField(max_digits=10, decimal_places=2)
+
+    @property
+    def subtotal(self):
+        return self.quantity * self.unit_price
+
+
+class ArchivedPayment(models.Model):
+    order = models.OneToOneField(ArchivedOrder, on_delete=models.CASCADE, related_name='payment')
+    amount = models.DecimalField(max_digits=12, decimal_places=2)
+    reference = models.CharField(max_length=100, blank=True)
+    status = models.CharField(max_length=20, choices=Payment.STATUS_CHOICES)
+    verified_at = models.DateTimeField(blank=True, null=True)
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"Archived payment for Order #{self.order_id} - {self.status}"
+
+
+class DailySalesRollup(models.Model):
+    """Orders and revenue per day, order type and status; maintained by cafe.rollups."""
+    date = models.DateField()
+    order_type = models.CharField(max_length=20, choices=Order.ORDER_TYPE_CHOICES)
+    status = models.CharField(max_length=20, choices=Order.STATUS_CHOICES)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    order_count = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ('date', 'order_type', 'status')
+
+    def __str__(self):
+        return f"{self.date} {self.order_type} {self.status}: {self.order_count} orders"
+
+
+class ItemSalesRollup(models.Model):
+    """Units, revenue and orders per day, item and order status; maintained by cafe.rollups."""
+    date = models.DateField()
+    item = models.ForeignKey(Item, on_delete=models.CASCADE, related_name='sales_rollups')
+    status = models.CharField(max_length=20, choices=Order.STATUS_CHOICES)
+    quantity = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    # Orders containing the item (an order has one line per item, so these add up across days)
+    order_count = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ('date', 'item', 'status')
+
+    def __str__(self):
+        return f"{self.date} {self.item_id} {self.status}: {self.quantity} sold"
+
+
+class HourlyOrderRollup(models.Model):
+    """Orders placed per local date and hour of day, any status; maintained by cafe.rollups."""
+    date = models.DateField()
+    hour = models.PositiveSmallIntegerField()
+    order_count = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ('date', 'hour')
+
+    def __str__(self):
+        return f"{self.date} {self.hour:02d}h: {self.order_count} orders"
+
+
+class KitchenLatencySketch(models.Model):
+    """Quantile sketch of one kitchen latency per local date and hour; maintained by cafe.sla"""
+    METRIC_CHOICES = (
+        ('queue', 'Queue wait'),
+        ('prep', 'Prep time'),
+        ('delivery', 'Handoff / delivery'),
+    )
+    date = models.DateField()
+    hour = models.PositiveSmallIntegerField()
+    metric = models.CharField(max_length=20, choices=METRIC_CHOICES)
+    # NULL: every order; otherwise orders with at least one item in this category
+    category = models.ForeignKey(ItemCategory, on_delete=models.CASCADE, null=True, blank=True, related_name='latency_sketches')
+    count = models.PositiveIntegerField(default=0)
+    bins = models.JSONField(default=dict)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'hour', 'metric', 'category'], name='latency_sketch_uniq'),
+            models.UniqueConstraint(fields=['date', 'hour', 'metric'], condition=models.Q(category__isnull=True),
+                                    name='latency_sketch_all_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.date} {self.hour:02d}h {self.metric} {self.category_id or 'all'}: {self.count}"
+
+
+class IdempotencyKey(TimeStampedModel):
+    """Client-supplied token recording which order a submission created, so replays are not re-run."""
+    SCOPE_CHOICES = (
+        ('CHECKOUT', 'Checkout'),
+        ('AI_CHAT', 'AI Chat'),
+    )
+    key = models.CharField(max_length=64, unique=True)
+    scope = models.CharField(max_length=20, choices=SCOPE_CHOICES)
+    order = models.OneToOneField(Order, on_delete=models.CASCADE, related_name='idempotency_key')
+
+    def __str__(self):
+        return f"{self.scope} {self.key} -> Order #{self.order_id}"
+
+
+class TypoCorrection(TimeStampedModel):
+    """A misspelling the chat assistant rewrites before matching menu items (see cafe.matching)."""
+    wrong = models.CharField(
+        max_length=50, unique=True,
+        validators=[RegexValidator(r'^\w+$', 'Enter a single word (letters and digits only).')],
+        help_text='The misspelt word, e.g. "capucino".',
+    )
+    correct = models.CharField(max_length=100, help_text='What it should read, e.g. "cappuccino".')
+
+    class Meta:
+        ordering = ['wrong']
+
+    def save(self, *args, **kwargs):
+        # Messages are lowercased before they are corrected
+        self.wrong = self.wrong.strip().lower()
+        self.correct = self.correct.strip().lower()
+        super().save(*args, **kwargs)
+
+    def __str__(self):
+        return f"{self.wrong} -> {self.correct}"
+
+
 class PaymentConfig(TimeStampedModel):
     upi_id = models.CharField(max_length=100, blank=True)
     ifsc_code = models.CharField(max_length=20, blank=True)
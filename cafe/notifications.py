@@ -0,0 +1,76 @@
+"""
+In-process change notification for order status.
+
+Every status change publishes the order's new state (status plus a version
+derived from ``updated_at``) into the Django cache and wakes any request
+long-polling on an order. Readers answer from the cache, so an unchanged
+order costs no database query. Waiters also re-check the cache at least once
+a second, so they notice changes published by other worker processes
+through the shared cache configured in settings (``CACHES``; a per-process
+local-memory cache would leave other workers serving the old status). The
+same change is broadcast to SSE subscribers through ``cafe.events``.
+Archived orders are looked up in the archive once they leave the live table.
+"""
+import math
+import threading
+import time
+from typing import Optional
+
+from django.core.cache import cache
+
+from .events import broadcast_order_state
+from .models import ArchivedOrder, Order
+
+ORDER_STATE_CACHE_TIMEOUT = 60 * 60
+# Upper bound between cache re-checks while waiting (covers publishes from other processes)
+_WAIT_SLICE_SECONDS = 1.0
+
+_changed = threading.Condition()
+
+
+def _state_key(order_id: int) -> str:
+    return f"cafe:order-state:{order_id}"
+
+
+def order_version(status: str, updated_at) -> str:
+    return f"{status}.{int(updated_at.timestamp() * 1000)}"
+
+
+def publish_order_state(order_id: int, status: str, updated_at) -> dict:
+    state = {'status': status, 'version': order_version(status, updated_at)}
+    cache.set(_state_key(order_id), state, ORDER_STATE_CACHE_TIMEOUT)
+    with _changed:
+        _changed.notify_all()
+    broadcast_order_state(order_id, state)
+    return state
+
+
+def get_order_state(order_id: int) -> Optional[dict]:
+    """``{'status', 'version'}`` for an order, from the cache when possible; None if it doesn't exist."""
+    state = cache.get(_state_key(order_id))
+    if state is not None:
+        return state
+    row = (
+        Order.objects.filter(pk=order_id).values('status', 'updated_at').first()
+        or ArchivedOrder.objects.filter(pk=order_id).values('status', 'updated_at').first()
+    )
+    if row is None:
+        return None
+    state = {'status': row['status'], 'version': order_version(row['status'], row['updated_at'])}
+    cache.set(_state_key(order_id), state, ORDER_STATE_CACHE_TIMEOUT)
+    return state
+
+
+def wait_for_order_change(order_id: int, known_version: str, timeout: float) -> Optional[dict]:
+    """Block until the order's version differs from ``known_version`` or ``timeout`` passes."""
+    if not math.isfinite(timeout):
+        # A NaN deadline never passes; don't wait at all rather than forever
+        timeout = 0
+    deadline = time.monotonic() + timeout
+    while True:
+        state = get_order_state(order_id)
+        remaining = deadline - time.monotonic()
+        if state is None or state['version'] != known_version or remaining <= 0:
+            return state
+        with _changed:
+            _changed.wait(min(remaining, _WAIT_SLICE_SECONDS))
@@ -0,0 +1,423 @@
+"""
+Pre-aggregated reporting tables kept in step with orders.
+
+The manager analytics pages, the admin and the AI assistant read these
+instead of aggregating raw Order/OrderItem rows on every request. They are
+maintained incrementally by the code paths that write orders --
+``services.place_order`` (new orders), ``services.transition_orders``
+(status changes) and the order admin (hand edits, via ``order_snapshot`` and
+``record_order_edits``) -- inside the same transaction as the order write,
+and can be checked against or rebuilt from history (live and archived
+orders) at any time with ``manage.py rebuild_rollups``.
+
+* ``DailySalesRollup``: orders and revenue per day, order type and status.
+* ``ItemSalesRollup``: units, revenue and orders per day, item and status.
+* ``HourlyOrderRollup``: orders placed per day and hour of day.
+* ``Customer.lifetime_*`` / ``last_order_at``: per-customer lifetime stats.
+* ``KitchenLatencySketch``: kitchen latency quantile sketches (see ``cafe.sla``).
+"""
+from collections import defaultdict
+from decimal import Decimal
+from functools import reduce
+from operator import or_
+from typing import Iterable
+
+from django.db import transaction
+from django.db.models import Case, Count, DateTimeField, F, Max, Q, Sum, Value, When
+from django.db.models.functions import Coalesce, ExtractHour, Greatest, TruncDate
+from django.utils import timezone
+
+from .models import (
+    ArchivedOrder, ArchivedOrderItem, Customer, DailySalesRollup, HourlyOrderRollup, ItemSalesRollup, KitchenLatencySketch,
+    Order, OrderItem,
+)
+from .sla import kitchen_sla_from_orders
+
+# Statuses whose orders count towards revenue on the analytics pages
+REVENUE_STATUSES = ('PAID', 'PREPARING', 'COMPLETED')
+
+# Orders in these statuses don't count towards a customer's lifetime orders and
+# items; lifetime spend, like revenue, only counts REVENUE_STATUSES
+LIFETIME_EXCLUDED_STATUSES = ('CANCELED', 'REJECTED')
+
+
+def rollup_date(created_at):
+    """The reporting day an order belongs to (same boundaries as ``TruncDate``)."""
+    return timezone.localdate(created_at)
+
+
+def rollup_hour(created_at):
+    """The reporting day and hour an order belongs to (same boundaries as ``TruncDate``/``ExtractHour``)."""
+    local = timezone.localtime(created_at)
+    return local.date(), local.hour
+
+
+def _bump(model, key_fields, deltas, create=True):
+    """
+    Apply ``{key_tuple: {field: increment}}`` to ``model`` rows, creating missing ones.
+
+    At most two statements however many buckets: an INSERT ... ON CONFLICT DO NOTHING
+    for missing buckets, then one UPDATE adding each bucket's increment
+    through a CASE on its key (as the cart does for quantities).
+    """
+    deltas = {key: delta for key, delta in deltas.items() if any(delta.values())}
+    if not deltas:
+        return
+    if create:
+        # Make sure every bucket exists, then increment in place
+        model.objects.bulk_create(
+            [model(**dict(zip(key_fields, key))) for key in deltas],
+            ignore_conflicts=True,
+        )
+    buckets = {key: Q(**dict(zip(key_fields, key))) for key in deltas}
+    increments = {}
+    for field in {field for delta in deltas.values() for field in delta}:
+        output_field = model._meta.get_field(field).clone()
+        increments[field] = F(field) + Case(
+            *(When(buckets[key], then=Value(delta[field])) for key, delta in deltas.items() if delta.get(field)),
+            default=Value(0), output_field=output_field,
+        )
+    model.objects.filter(reduce(or_, buckets.values())).update(**increments)
+
+
+def _set_last_order_at(latest, keep_later=True):
+    """
+    Set ``{customer_id: datetime or None}`` as ``last_order_at`` in one UPDATE;
+    with ``keep_later`` a later stored value wins.
+    """
+    if not latest:
+        return
+    cases = []
+    for customer_id, created_at in latest.items():
+        value = Value(created_at, output_field=DateTimeField())
+        if keep_later and created_at is not None:
+            value = Greatest(Coalesce('last_order_at', value), value)
+        cases.append(When(pk=customer_id, then=value))
+    Customer.objects.filter(pk__in=latest.keys()).update(
+        last_order_at=Case(*cases, default=F('last_order_at'), output_field=DateTimeField()),
+    )
+
+
+class _Deltas:
+    """Increments for every rollup, accumulated across a batch of orders."""
+
+    def __init__(self):
+        self.daily = defaultdict(lambda: {'revenue': Decimal('0'), 'order_count': 0})
+        self.items = defaultdict(lambda: {'quantity': 0, 'revenue': Decimal('0'), 'order_count': 0})
+        self.hours = defaultdict(lambda: {'order_count': 0})
+        self.customers = defaultdict(
+            lambda: {'lifetime_spend': Decimal('0'), 'lifetime_orders': 0, 'lifetime_items': 0}
+        )
+
+    def add(self, orders, lines, sign, status_of):
+        """
+        Add ``sign`` times each order and its lines under ``status_of(order_id)``.
+
+        ``orders`` are ``(pk, created_at, order_type, total, customer_id)`` and
+        ``lines`` are ``(order_id, item_id, quantity, unit_price)``.
+        """
+        info = {}
+        for pk, created_at, order_type, total, customer_id in orders:
+            day, status = rollup_date(created_at), status_of(pk)
+            info[pk] = (day, status, customer_id)
+            daily = self.daily[(day, order_type, status)]
+            daily['revenue'] += sign * total
+            daily['order_count'] += sign
+            self.hours[rollup_hour(created_at)]['order_count'] += sign
+            if customer_id and status not in LIFETIME_EXCLUDED_STATUSES:
+                customer = self.customers[(customer_id,)]
+                customer['lifetime_orders'] += sign
+                if status in REVENUE_STATUSES:
+                    customer['lifetime_spend'] += sign * total
+        for order_id, item_id, quantity, unit_price in lines:
+            day, status, customer_id = info[order_id]
+            if customer_id and status not in LIFETIME_EXCLUDED_STATUSES:
+                self.customers[(customer_id,)]['lifetime_items'] += sign * quantity
+            if item_id is None:
+                continue
+            item = self.items[(day, item_id, status)]
+            item['quantity'] += sign * quantity
+            item['revenue'] += sign * quantity * unit_price
+            item['order_count'] += sign
+
+    def apply(self):
+        _bump(DailySalesRollup, ('date', 'order_type', 'status'), self.daily)
+        _bump(ItemSalesRollup, ('date', 'item_id', 'status'), self.items)
+        _bump(HourlyOrderRollup, ('date', 'hour'), self.hours)
+        _bump(Customer, ('pk',), self.customers, create=False)
+
+
+def _lines_of(order_ids):
+    return list(
+        OrderItem.objects.filter(order_id__in=order_ids)
+        .values_list('order_id', 'item_id', 'quantity', 'unit_price')
+    )
+
+
+def record_orders_placed(orders: Iterable[Order]):
+    """Count freshly created orders and their lines (call inside the transaction that created them)."""
+    orders = list(orders)
+    statuses = {order.pk: order.status for order in orders}
+    deltas = _Deltas()
+    deltas.add(
+        [(o.pk, o.created_at, o.order_type, o.total_amount, o.customer_id) for o in orders],
+        _lines_of(statuses.keys()), 1, statuses.__getitem__,
+    )
+    deltas.apply()
+
+    last_order = {}
+    for order in orders:
+        if order.customer_id:
+            last_order[order.customer_id] = max(order.created_at, last_order.get(order.customer_id, order.created_at))
+    _set_last_order_at(last_order)
+
+
+def record_status_changes(changes):
+    """
+    Move orders between status buckets.
+
+    ``changes`` is ``[(order_id, old_status, new_status), ...]`` as produced by
+    ``services.transition_orders``; call inside the transaction that made them.
+    """
+    changes = {pk: (old, new) for pk, old, new in changes if old != new}
+    if not changes:
+        return
+    orders = list(
+        Order.objects.filter(pk__in=changes.keys())
+        .values_list('pk', 'created_at', 'order_type', 'total_amount', 'customer_id')
+    )
+    lines = _lines_of(changes.keys())
+    deltas = _Deltas()
+    deltas.add(orders, lines, -1, lambda pk: changes[pk][0])
+    deltas.add(orders, lines, 1, lambda pk: changes[pk][1])
+    deltas.apply()
+
+
+def order_snapshot(order_ids):
+    """
+    What the given orders count for in the rollups right now; take it before
+    editing or deleting them in place and pass it to ``record_order_edits``.
+    """
+    order_ids = list(order_ids)
+    orders = list(
+        Order.objects.filter(pk__in=order_ids)
+        .values_list('pk', 'created_at', 'order_type', 'total_amount', 'customer_id', 'status')
+    )
+    return orders, _lines_of(order_ids)
+
+
+def record_order_edits(before):
+    """
+    Re-count orders changed in any way (status, total, type, customer, lines)
+    or deleted since ``before = order_snapshot(ids)`` was taken: their old
+    contribution is taken out and the current one added. Call inside the
+    transaction that changed them.
+    """
+    after = order_snapshot(row[0] for row in before[0])
+    deltas = _Deltas()
+    for (orders, lines), sign in ((before, -1), (after, 1)):
+        statuses = {row[0]: row[5] for row in orders}
+        deltas.add([row[:5] for row in orders], lines, sign, statuses.__getitem__)
+    deltas.apply()
+
+    # A customer who lost an order may have lost their latest one
+    customer_ids = {row[4] for orders, _ in (before, after) for row in orders if row[4]}
+    if customer_ids:
+        latest = {}
+        for order_model, _ in ORDER_SOURCES:
+            rows = (
+                order_model.objects.filter(customer_id__in=customer_ids)
+                .values('customer_id').annotate(last=Max('created_at')).order_by()
+            )
+            for row in rows:
+                latest[row['customer_id']] = max(row['last'], latest.get(row['customer_id'], row['last']))
+        _set_last_order_at({customer_id: latest.get(customer_id) for customer_id in customer_ids}, keep_later=False)
+
+
+# ---- Reading ----
+
+def item_sales(since=None, statuses=None):
+    """
+    Per-item totals from the rollup: ``item_id``, ``item__name``, ``item__price``,
+    ``total_qty``, ``total_revenue`` and ``order_count``; order it as needed.
+    """
+    rows = ItemSalesRollup.objects.all()
+    if since is not None:
+        rows = rows.filter(date__gte=since)
+    if statuses is not None:
+        rows = rows.filter(status__in=statuses)
+    return (
+        rows.values('item_id', 'item__name', 'item__price')
+        .annotate(total_qty=Sum('quantity'), total_revenue=Sum('revenue'), order_count=Sum('order_count'))
+        .filter(total_qty__gt=0)
+    )
+
+
+# ---- Rebuilding and checking ----
+
+# Live and archived (cafe.archive) orders both count; an order is only ever in one of them
+ORDER_SOURCES = ((Order, OrderItem), (ArchivedOrder, ArchivedOrderItem))
+
+
+def _summed(key_fields, sources):
+    """Add up per-source aggregate rows that share the same key."""
+    merged = {}
+    for rows in sources:
+        for row in rows:
+            key = tuple(row[f] for f in key_fields)
+            if key in merged:
+                for field, value in row.items():
+                    if field not in key_fields:
+                        merged[key][field] += value
+            else:
+                merged[key] = row
+    return list(merged.values())
+
+
+def daily_sales_from_orders():
+    """Re-derive the daily sales rollup rows from the live and archived orders."""
+    return _summed(('date', 'order_type', 'status'), (
+        order_model.objects
+        .annotate(date=TruncDate('created_at'))
+        .values('date', 'order_type', 'status')
+        .annotate(revenue=Sum('total_amount'), order_count=Count('id'))
+        .order_by()
+        for order_model, _ in ORDER_SOURCES
+    ))
+
+
+def hourly_orders_from_orders():
+    """Re-derive the hourly order counts from the live and archived orders."""
+    return _summed(('date', 'hour'), (
+        order_model.objects
+        .annotate(date=TruncDate('created_at'), hour=ExtractHour('created_at'))
+        .values('date', 'hour')
+        .annotate(order_count=Count('id'))
+        .order_by()
+        for order_model, _ in ORDER_SOURCES
+    ))
+
+
+def _item_sales_rows(line_model):
+    rows = (
+        line_model.objects
+        .filter(item_id__isnull=False)
+        .annotate(date=TruncDate('order__created_at'), status=F('order__status'))
+        .values('date', 'item_id', 'status')
+        .annotate(
+            units=Sum('quantity'),
+            revenue=Sum(F('quantity') * F('unit_price')),
+            order_count=Count('order_id', distinct=True),
+        )
+        .order_by()
+    )
+    # "quantity" can't be the aggregate's alias while revenue still refers to the column
+    for row in rows:
+        row['quantity'] = row.pop('units')
+        yield row
+
+
+def item_sales_from_orders():
+    """Re-derive the item sales rollup rows from the live and archived order lines."""
+    return _summed(('date', 'item_id', 'status'), (_item_sales_rows(line_model) for _, line_model in ORDER_SOURCES))
+
+
+def customer_stats_from_orders():
+    """Re-derive every ordering customer's lifetime stats from the live and archived orders."""
+    counted = ~Q(status__in=LIFETIME_EXCLUDED_STATUSES)
+    paid = Q(status__in=REVENUE_STATUSES)
+    stats = {}
+    for order_model, line_model in ORDER_SOURCES:
+        orders = (
+            order_model.objects.filter(customer_id__isnull=False)
+            .values('customer_id')
+            .annotate(spend=Sum('total_amount', filter=paid), orders=Count('id', filter=counted), last=Max('created_at'))
+            .order_by()
+        )
+        for row in orders:
+            entry = stats.setdefault(row['customer_id'], {
+                'id': row['customer_id'],
+                'lifetime_spend': Decimal('0'),
+                'lifetime_orders': 0,
+                'lifetime_items': 0,
+                'last_order_at': None,
+            })
+            entry['lifetime_spend'] += row['spend'] or Decimal('0')
+            entry['lifetime_orders'] += row['orders']
+            if entry['last_order_at'] is None or row['last'] > entry['last_order_at']:
+                entry['last_order_at'] = row['last']
+        items = (
+            line_model.objects.filter(order__customer_id__isnull=False)
+            .exclude(order__status__in=LIFETIME_EXCLUDED_STATUSES)
+            .values('order__customer_id')
+            .annotate(units=Sum('quantity'))
+            .order_by()
+        )
+        for row in items:
+            stats[row['order__customer_id']]['lifetime_items'] += row['units']
+    return list(stats.values())
+
+
+def _replace_rows(model, rows):
+    with transaction.atomic():
+        model.objects.all().delete()
+        model.objects.bulk_create([model(**row) for row in rows], batch_size=500)
+    return len(rows)
+
+
+def _update_customers(model, rows):
+    fields = ['lifetime_spend', 'lifetime_orders', 'lifetime_items', 'last_order_at']
+    with transaction.atomic():
+        model.objects.update(lifetime_spend=0, lifetime_orders=0, lifetime_items=0, last_order_at=None)
+        model.objects.bulk_update([model(**row) for row in rows], fields, batch_size=500)
+    return len(rows)
+
+
+# name -> (model, key fields, value fields, re-derivation, how to write the re-derived rows)
+ROLLUPS = {
+    'daily_sales': (DailySalesRollup, ('date', 'order_type', 'status'), ('revenue', 'order_count'),
+                    daily_sales_from_orders, _replace_rows),
+    'item_sales': (ItemSalesRollup, ('date', 'item_id', 'status'), ('quantity', 'revenue', 'order_count'),
+                   item_sales_from_orders, _replace_rows),
+    'hourly_orders': (HourlyOrderRollup, ('date', 'hour'), ('order_count',), hourly_orders_from_orders, _replace_rows),
+    'customer_stats': (Customer, ('id',), ('lifetime_spend', 'lifetime_orders', 'lifetime_items', 'last_order_at'),
+                       customer_stats_from_orders, _update_customers),
+    'kitchen_sla': (KitchenLatencySketch, ('date', 'hour', 'metric', 'category_id'), ('count', 'bins'),
+                    kitchen_sla_from_orders, _replace_rows),
+}
+
+
+def rebuild(name):
+    """Replace a rollup with a fresh aggregate of order history. Returns the row count."""
+    model, _, _, derive, write = ROLLUPS[name]
+    return write(model, list(derive()))
+
+
+def check(name):
+    """
+    Compare a rollup with a fresh aggregate of order history.
+
+    Returns ``[(key, stored, expected), ...]`` for every bucket that differs,
+    where stored/expected are tuples of the value fields (buckets holding only
+    default values count as missing).
+    """
+    model, key_fields, value_fields, derive, _ = ROLLUPS[name]
+
+    def normalize(values):
+        return tuple(Decimal(v) if isinstance(v, (Decimal, float)) else v for v in values)
+
+    empty = normalize(model._meta.get_field(f).get_default() for f in value_fields)
+    stored = {
+        tuple(row[f] for f in key_fields): normalize(row[f] for f in value_fields)
+        for row in model.objects.values(*key_fields, *value_fields)
+    }
+    expected = {
+        tuple(row[f] for f in key_fields): normalize(row[f] for f in value_fields)
+        for row in derive()
+    }
+    mismatches = []
+    for key in sorted(set(stored) | set(expected), key=str):
+        have, want = stored.get(key, empty), expected.get(key, empty)
+        if have != want:
+            mismatches.append((key, have, want))
+    return mismatches
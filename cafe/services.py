@@ -0,0 +1,317 @@
+"""
+Order placement shared by the checkout flow and the AI assistant.
+
+``place_order`` writes the Order, its OrderItems and the pending Payment (and
+closes the cart, if given) inside one transaction with a fixed number of
+queries, however many lines the order has.
+
+``transition_orders`` is the order state machine: every status change goes
+through it as a compare-and-swap UPDATE over any number of orders, and
+``settle_payments`` builds on it to verify or reject payments in bulk.
+"""
+from collections import defaultdict
+from dataclasses import dataclass
+from decimal import Decimal
+from typing import Iterable, Optional, Tuple
+import logging
+
+import re
+
+from django.db import IntegrityError, connection, transaction
+from django.utils import timezone
+
+from .models import Cart, CartItem, IdempotencyKey, Item, Order, OrderItem, Payment
+from .rollups import record_orders_placed, record_status_changes
+from .sla import record_transition
+from .signals import order_status_changed
+
+logger = logging.getLogger(__name__)
+
+
+class OrderPlacementError(Exception):
+    """Raised when an order cannot be placed (empty order, unknown or inactive items)."""
+
+
+@dataclass
+class PlacedOrder:
+    order: Order
+    query_count: int
+    # True when the idempotency key had already been used and no order was created
+    replayed: bool = False
+
+
+_IDEMPOTENCY_KEY_RE = re.compile(r'^[A-Za-z0-9_-]{16,64}$')
+
+
+def clean_idempotency_key(value) -> Optional[str]:
+    """Return the key if it is well-formed, else None (the request is then not deduplicated)."""
+    if isinstance(value, str) and _IDEMPOTENCY_KEY_RE.match(value):
+        return value
+    return None
+
+
+def find_idempotent_order_id(key: Optional[str]) -> Optional[int]:
+    """Order id previously created with this key, via a single unique-index lookup."""
+    if not key:
+        return None
+    return IdempotencyKey.objects.filter(key=key).values_list('order_id', flat=True).first()
+
+
+class _QueryCounter:
+    """Lightweight ``execute_wrapper`` that counts statements without capturing SQL."""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+def lines_from_cart(cart: Cart):
+    """Return ``[(item_id, quantity), ...]`` for a cart in one query."""
+    return list(CartItem.objects.filter(cart=cart).values_list('item_id', 'quantity'))
+
+
+def place_order(
+    *,
+    customer,
+    order_type: str,
+    lines: Iterable[Tuple[int, int]],
+    table_no: str = '',
+    delivery_address=None,
+    reference: str = '',
+    cart: Optional[Cart] = None,
+    idempotency_key: Optional[str] = None,
+    idempotency_scope: str = 'CHECKOUT',
+) -> PlacedOrder:
+    """
+    Create an order in PENDING_PAYMENT with a pending Payment.
+
+    ``lines`` are ``(item_id, quantity)`` pairs; prices always come from the
+    current ``Item`` rows, loaded in a single query, never from the caller.
+    When ``cart`` is given its lines are deleted and it is marked CHECKED_OUT
+    in the same transaction.
+
+    With an ``idempotency_key`` the key is recorded alongside the order; a
+    second call with the same key returns the original order with
+    ``replayed=True`` instead of creating another one.
+    """
+    quantities = {}
+    for item_id, qty in lines:
+        qty = int(qty)
+        if qty > 0:
+            quantities[item_id] = quantities.get(item_id, 0) + qty
+
+    counter = _QueryCounter()
+    with connection.execute_wrapper(counter):
+        existing_id = find_idempotent_order_id(idempotency_key)
+        if existing_id:
+            return PlacedOrder(order=Order.objects.get(pk=existing_id), query_count=counter.count, replayed=True)
+        if not quantities:
+            raise OrderPlacementError('Your order is empty.')
+        try:
+            order = _create_order_rows(
+                customer, order_type, quantities, table_no, delivery_address, reference, cart,
+                idempotency_key, idempotency_scope,
+            )
+        except IntegrityError:
+            # A concurrent submission with the same key won the race; hand back its order
+            existing_id = find_idempotent_order_id(idempotency_key)
+            if not existing_id:
+                raise
+            return PlacedOrder(order=Order.objects.get(pk=existing_id), query_count=counter.count, replayed=True)
+
+    logger.debug("Placed order #%s with %d line(s) in %d queries", order.id, len(quantities), counter.count)
+    return PlacedOrder(order=order, query_count=counter.count)
+
+
+def _create_order_rows(customer, order_type, quantities, table_no, delivery_address, reference, cart,
+                       idempotency_key, idempotency_scope) -> Order:
+    with transaction.atomic():
+        prices = dict(
+            Item.objects.filter(pk__in=quantities.keys(), is_active=True).values_list('id', 'price')
+        )
+        missing = set(quantities) - set(prices)
+        if missing:
+            raise OrderPlacementError('Some items in your order are no longer available.')
+
+        total = sum((prices[item_id] * qty for item_id, qty in quantities.items()), Decimal('0'))
+        order = Order.objects.create(
+            customer=customer,
+            order_type=order_type,
+            table_no=table_no if order_type == 'DINING' else '',
+            delivery_address=delivery_address,
+            total_amount=total,
+            status='PENDING_PAYMENT',
+        )
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, item_id=item_id, quantity=qty, unit_price=prices[item_id])
+            for item_id, qty in quantities.items()
+        ])
+        Payment.objects.create(order=order, amount=total, reference=reference, status='PENDING')
+        record_orders_placed([order])
+        if cart is not None:
+            CartItem.objects.filter(cart=cart).delete()
+            Cart.objects.filter(pk=cart.pk).update(status='CHECKED_OUT', updated_at=timezone.now())
+            cart.status = 'CHECKED_OUT'
+        if idempotency_key:
+            IdempotencyKey.objects.create(key=idempotency_key, scope=idempotency_scope, order=order)
+    return order
+
+
+# ---- Order state machine ----
+
+# name -> (statuses it may start from, resulting status, timestamp field stamped with "now")
+ORDER_TRANSITIONS = {
+    'verify_payment': (('PENDING_PAYMENT', 'REJECTED'), 'PAID', None),
+    'verify_and_send': (('PENDING_PAYMENT', 'REJECTED'), 'PAID', 'sent_to_chef_at'),
+    'reject_payment': (('PENDING_PAYMENT',), 'REJECTED', None),
+    'send_to_chef': (('PAID',), 'PAID', 'sent_to_chef_at'),
+    'abandon': (('PENDING_PAYMENT', 'PAID'), 'CANCELED', None),
+    'restore': (('CANCELED',), 'PAID', 'sent_to_chef_at'),
+    'start_preparing': (('PAID',), 'PREPARING', 'preparing_started_at'),
+    'mark_ready': (('PREPARING',), 'READY_FOR_DELIVERY', 'ready_at'),
+    'pickup': (('READY_FOR_DELIVERY',), 'OUT_FOR_DELIVERY', None),
+    'complete': (('OUT_FOR_DELIVERY',), 'COMPLETED', 'completed_at'),
+}
+
+
+class _LostRace(Exception):
+    """An UPDATE matched fewer rows than were read: another writer got to some first."""
+
+
+def _candidates(queryset, from_statuses):
+    """``{pk: status}`` of the rows in ``from_statuses``, locked where the backend supports it."""
+    return dict(queryset.select_for_update().filter(status__in=from_statuses).values_list('pk', 'status'))
+
+
+def _claim(queryset, from_statuses, values):
+    """
+    Write ``values`` to the rows of ``queryset`` still in one of
+    ``from_statuses``; returns ``{pk: status it had}`` for exactly the rows
+    this call changed.
+
+    The candidates are read with SELECT ... FOR UPDATE (SQLite has no row
+    locks but serializes writers), then moved with one conditional UPDATE per
+    from-status whose row count must match. Should another writer have taken
+    some of them in between, that UPDATE is rolled back to its savepoint and
+    its rows claimed one by one, so a row is never credited to two callers.
+    """
+    by_status = defaultdict(list)
+    for pk, status in _candidates(queryset, from_statuses).items():
+        by_status[status].append(pk)
+    won = {}
+    for status, pks in by_status.items():
+        rows = queryset.model.objects.filter(status=status)
+        if len(pks) > 1:
+            try:
+                with transaction.atomic():
+                    if rows.filter(pk__in=pks).update(**values) != len(pks):
+                        raise _LostRace
+            except _LostRace:
+                pass
+            else:
+                won.update(dict.fromkeys(pks, status))
+                continue
+        for pk in pks:
+            if rows.filter(pk=pk).update(**values):
+                won[pk] = status
+    return won
+
+
+@dataclass
+class TransitionResult:
+    applied: list
+    skipped: list
+
+    def __bool__(self):
+        return bool(self.applied)
+
+
+def transition_orders(order_ids: Iterable[int], transition: str) -> TransitionResult:
+    """
+    Apply a named transition to many orders with one conditional UPDATE per
+    status they start from.
+
+    The write is ``UPDATE ... WHERE id IN (...) AND status = <from>`` with its
+    row count checked (see ``_claim``), so two staff members racing on the
+    same ticket can't both win, every winner knows the status it moved the
+    order from, and only ``status``, ``updated_at`` and the transition's
+    timestamp are written. Orders not in an allowed status are reported in
+    ``skipped``.
+    """
+    from_statuses, to_status, stamp_field = ORDER_TRANSITIONS[transition]
+    ids = list(dict.fromkeys(int(pk) for pk in order_ids))
+    if not ids:
+        return TransitionResult(applied=[], skipped=[])
+
+    now = timezone.now()
+    values = {'status': to_status, 'updated_at': now}
+    if stamp_field:
+        values[stamp_field] = now
+    with transaction.atomic():
+        before = _claim(Order.objects.filter(pk__in=ids), from_statuses, values)
+        applied = sorted(before)
+        if applied:
+            changes = [(pk, before[pk], to_status) for pk in applied]
+            record_status_changes(changes)
+            record_transition(transition, applied)
+            transaction.on_commit(
+                lambda: order_status_changed.send(sender=Order, changes=changes, changed_at=now)
+            )
+    applied_set = set(applied)
+    return TransitionResult(applied=applied, skipped=[pk for pk in ids if pk not in applied_set])
+
+
+PAYMENT_SETTLEMENTS = {
+    # action: (payment status, order transition)
+    'verify': ('VERIFIED', 'verify_payment'),
+    'reject': ('FAILED', 'reject_payment'),
+}
+
+
+def settle_payments(payment_ids: Iterable[int], action: str, send_to_chef: bool = True) -> dict:
+    """
+    Verify or reject many pending payments at once.
+
+    One transaction and a fixed handful of queries regardless of how many ids:
+    a lookup, a checked conditional UPDATE of the still-PENDING payments (see
+    ``_claim``), then ``transition_orders`` for their orders. Verified orders
+    are sent to the chef in that same UPDATE (``sent_to_chef_at``) unless
+    ``send_to_chef`` is false, for callers that ask the manager to confirm
+    each order separately.
+
+    Returns ``{payment_id: result}`` where result is ``'verified'``,
+    ``'rejected'``, ``'not_found'``, ``'not_pending'`` (already settled, e.g.
+    by another manager) or ``'order_skipped'`` (payment settled but the order
+    had already moved past the payment step).
+    """
+    payment_status, transition = PAYMENT_SETTLEMENTS[action]
+    if transition == 'verify_payment' and send_to_chef:
+        transition = 'verify_and_send'
+    ids = list(dict.fromkeys(int(pk) for pk in payment_ids))
+    if not ids:
+        return {}
+
+    now = timezone.now()
+    values = {'status': payment_status, 'updated_at': now}
+    if payment_status == 'VERIFIED':
+        values['verified_at'] = now
+    with transaction.atomic():
+        found = dict(Payment.objects.filter(pk__in=ids).values_list('pk', 'order_id'))
+        won = {}
+        if found:
+            won = {pk: found[pk] for pk in _claim(Payment.objects.filter(pk__in=found.keys()), ('PENDING',), values)}
+        moved = set(transition_orders(won.values(), transition).applied) if won else set()
+
+    done = 'verified' if action == 'verify' else 'rejected'
+    results = {}
+    for pk in ids:
+        if pk not in found:
+            results[pk] = 'not_found'
+        elif pk not in won:
+            results[pk] = 'not_pending'
+        else:
+            results[pk] = done if won[pk] in moved else 'order_skipped'
+    return results
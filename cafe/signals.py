@@ -1,8 +1,16 @@
-from django.db.models.signals import post_migrate
-from django.dispatch import receiver
+from django.db import transaction
+from django.db.models.signals import post_delete, post_migrate, post_save
+from django.dispatch import Signal, receiver
 from django.contrib.auth.models import Group, Permission
 from django.contrib.contenttypes.models import ContentType
-from .models import Item
+from .models import Item, ItemCategory, Order, TypoCorrection
+from .dashboard import invalidate_dashboard
+from .menu import bump_menu_version
+from .notifications import publish_order_state
+
+# Sent after commit by services.transition_orders, which bypasses post_save.
+# changes: [(order_id, old_status, new_status), ...]; changed_at: the new updated_at
+order_status_changed = Signal()
 
 
 @receiver(post_migrate)
@@ -18,4 +26,33 @@ def ensure_manager_group(sender, **kwargs):
     perms = Permission.objects.filter(content_type=ct, codename__in=[
         "add_item", "change_item", "delete_item", "view_item",
     ])
-    manager_group.permissions.add(*perms)
\ No newline at end of file
+    manager_group.permissions.add(*perms)
+    # ... and let managers maintain the chat assistant's typo corrections
+    ct = ContentType.objects.get_for_model(TypoCorrection)
+    manager_group.permissions.add(*Permission.objects.filter(content_type=ct))
+
+
+@receiver(post_save, sender=Order)
+def publish_order_change(sender, instance, **kwargs):
+    # Publish only once the change is visible to other connections
+    order_id, status, updated_at = instance.pk, instance.status, instance.updated_at
+    transaction.on_commit(lambda: publish_order_state(order_id, status, updated_at))
+    transaction.on_commit(invalidate_dashboard)
+
+
+@receiver(order_status_changed)
+def publish_order_transitions(sender, changes, changed_at, **kwargs):
+    for order_id, _old_status, new_status in changes:
+        publish_order_state(order_id, new_status, changed_at)
+    invalidate_dashboard()
+
+
+@receiver(post_save, sender=Item)
+@receiver(post_delete, sender=Item)
+@receiver(post_save, sender=ItemCategory)
+@receiver(post_delete, sender=ItemCategory)
+@receiver(post_save, sender=TypoCorrection)
+@receiver(post_delete, sender=TypoCorrection)
+def invalidate_menu_snapshot(sender, **kwargs):
+    # Bump after commit so no worker rebuilds from the pre-change rows
+    transaction.on_commit(bump_menu_version)
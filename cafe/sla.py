@@ -0,0 +1,213 @@
+"""
+Kitchen service-level metrics kept as mergeable quantile sketches.
+
+Three latencies are measured from the timestamps ``transition_orders`` stamps:
+
+* ``queue``: sent to the kitchen -> chef starts preparing
+* ``prep``: preparing -> ready
+* ``delivery``: ready -> served/delivered
+
+Each observation lands in a ``KitchenLatencySketch`` row keyed by the local
+date and hour the stage began and by metric: one row per key for all orders
+(``category`` NULL) plus one per item category on the order. A sketch is a
+log-bucketed histogram (the DDSketch layout): every value is counted in the
+bucket ``ceil(log_gamma(seconds))``, so any quantile read back is within
+``SKETCH_RELATIVE_ACCURACY`` of the true value, and sketches for different
+hours, days or categories merge by adding bucket counts. The manager pages
+therefore report p50/p90/p99 without touching Order at all.
+
+Recording happens inside the transition's transaction, like the sales
+rollups, and the sketches can be rebuilt from order history with
+``manage.py rebuild_rollups kitchen_sla``.
+"""
+import math
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db import transaction
+from django.utils import timezone
+
+from .models import ArchivedOrder, ArchivedOrderItem, ItemCategory, KitchenLatencySketch, Order, OrderItem
+
+SKETCH_RELATIVE_ACCURACY = 0.02
+_GAMMA = (1 + SKETCH_RELATIVE_ACCURACY) / (1 - SKETCH_RELATIVE_ACCURACY)
+_LOG_GAMMA = math.log(_GAMMA)
+# Everything under a second is "instant" and shares one bucket
+MIN_SECONDS = 1.0
+
+# metric -> (field the stage starts at, field it ends at, transition that ends it)
+SLA_METRICS = {
+    'queue': ('sent_to_chef_at', 'preparing_started_at', 'start_preparing'),
+    'prep': ('preparing_started_at', 'ready_at', 'mark_ready'),
+    'delivery': ('ready_at', 'completed_at', 'complete'),
+}
+SLA_QUANTILES = (0.5, 0.9, 0.99)
+SLA_MAX_DAYS = 90
+
+
+class LatencySketch:
+    """A mergeable log-bucketed histogram of durations in seconds."""
+
+    def __init__(self, bins=None, count=0):
+        self.bins = defaultdict(int, {int(k): v for k, v in (bins or {}).items()})
+        self.count = count
+
+    def add(self, seconds, times=1):
+        self.bins[math.ceil(math.log(max(seconds, MIN_SECONDS)) / _LOG_GAMMA)] += times
+        self.count += times
+
+    def merge(self, other):
+        for index, n in other.bins.items():
+            self.bins[index] += n
+        self.count += other.count
+        return self
+
+    def quantile(self, q):
+        """The ``q`` quantile in seconds (None when empty)."""
+        if not self.count:
+            return None
+        rank = q * (self.count - 1)
+        seen = 0
+        for index in sorted(self.bins):
+            seen += self.bins[index]
+            if seen > rank:
+                break
+        if index <= 0:
+            return 0.0
+        # Midpoint of (gamma^(i-1), gamma^i], relative error <= SKETCH_RELATIVE_ACCURACY
+        return 2 * _GAMMA ** index / (_GAMMA + 1)
+
+    def to_json(self):
+        return {str(k): v for k, v in sorted(self.bins.items()) if v}
+
+    def summary(self):
+        return {
+            'count': self.count,
+            **{f'p{round(q * 100)}': _round(self.quantile(q)) for q in SLA_QUANTILES},
+        }
+
+
+def _round(seconds):
+    return None if seconds is None else round(seconds, 1)
+
+
+def _observations(order_rows, categories_of, metric):
+    """Yield ``(date, hour, metric, category_id, seconds)`` for one metric over order rows."""
+    start_field, end_field, _ = SLA_METRICS[metric]
+    for row in order_rows:
+        start, end = row[start_field], row[end_field]
+        if start is None or end is None or end < start:
+            continue
+        local = timezone.localtime(start)
+        seconds = (end - start).total_seconds()
+        for category_id in (None, *categories_of.get(row['id'], ())):
+            yield local.date(), local.hour, metric, category_id, seconds
+
+
+def _measured(metric, prefix=''):
+    """Filter kwargs for the orders that have both of ``metric``'s timestamps (``prefix`` for lines)."""
+    start_field, end_field, _ = SLA_METRICS[metric]
+    return {f'{prefix}{start_field}__isnull': False, f'{prefix}{end_field}__isnull': False}
+
+
+def _categories_by_order(lines):
+    categories = defaultdict(set)
+    rows = lines.filter(item__category_id__isnull=False).values_list('order_id', 'item__category_id').distinct()
+    for order_id, category_id in rows:
+        categories[order_id].add(category_id)
+    return categories
+
+
+def record_transition(transition, order_ids):
+    """Add the latencies ended by ``transition`` for ``order_ids``; call inside the transition's transaction."""
+    metric = next((name for name, spec in SLA_METRICS.items() if spec[2] == transition), None)
+    if metric is None or not order_ids:
+        return
+    start_field, end_field, _ = SLA_METRICS[metric]
+    rows = Order.objects.filter(pk__in=order_ids, **_measured(metric)).values('id', start_field, end_field)
+    sketches = defaultdict(LatencySketch)
+    categories_of = _categories_by_order(OrderItem.objects.filter(order_id__in=order_ids, **_measured(metric, 'order__')))
+    for date, hour, name, category_id, seconds in _observations(rows, categories_of, metric):
+        sketches[(date, hour, name, category_id)].add(seconds)
+    if sketches:
+        _merge_into_rows(sketches)
+
+
+def _merge_into_rows(sketches):
+    with transaction.atomic():
+        KitchenLatencySketch.objects.bulk_create(
+            [
+                KitchenLatencySketch(date=date, hour=hour, metric=metric, category_id=category_id)
+                for date, hour, metric, category_id in sketches
+            ],
+            ignore_conflicts=True,
+        )
+        dates = {key[0] for key in sketches}
+        rows = (
+            KitchenLatencySketch.objects.select_for_update()
+            .filter(date__in=dates, metric__in={key[2] for key in sketches}, hour__in={key[1] for key in sketches})
+        )
+        changed = []
+        for row in rows:
+            sketch = sketches.get((row.date, row.hour, row.metric, row.category_id))
+            if sketch is None:
+                continue
+            merged = LatencySketch(row.bins, row.count).merge(sketch)
+            row.bins, row.count = merged.to_json(), merged.count
+            changed.append(row)
+        KitchenLatencySketch.objects.bulk_update(changed, ['bins', 'count'])
+
+
+def kitchen_sla_from_orders(sources=((Order, OrderItem), (ArchivedOrder, ArchivedOrderItem))):
+    """
+    Re-derive every sketch row from the live and archived orders' timestamps,
+    selecting each metric's orders the way ``record_transition`` does.
+    """
+    sketches = defaultdict(LatencySketch)
+    for order_model, line_model in sources:
+        for metric, (start_field, end_field, _) in SLA_METRICS.items():
+            rows = order_model.objects.filter(**_measured(metric)).values('id', start_field, end_field)
+            categories_of = _categories_by_order(line_model.objects.filter(**_measured(metric, 'order__')))
+            for date, hour, name, category_id, seconds in _observations(rows, categories_of, metric):
+                sketches[(date, hour, name, category_id)].add(seconds)
+    return [
+        {'date': date, 'hour': hour, 'metric': metric, 'category_id': category_id,
+         'count': sketch.count, 'bins': sketch.to_json()}
+        for (date, hour, metric, category_id), sketch in sketches.items()
+    ]
+
+
+def kitchen_sla_report(days=7):
+    """
+    p50/p90/p99 per metric over the last ``days`` local days, overall, by hour
+    of day and by item category, merged from the stored sketches.
+    """
+    since = timezone.localdate() - timedelta(days=days - 1)
+    overall = defaultdict(LatencySketch)
+    by_hour = defaultdict(lambda: defaultdict(LatencySketch))
+    by_category = defaultdict(lambda: defaultdict(LatencySketch))
+    rows = KitchenLatencySketch.objects.filter(date__gte=since).values_list('hour', 'metric', 'category_id', 'count', 'bins')
+    for hour, metric, category_id, count, bins in rows:
+        sketch = LatencySketch(bins, count)
+        if category_id is None:
+            overall[metric].merge(sketch)
+            by_hour[hour][metric].merge(sketch)
+        else:
+            by_category[category_id][metric].merge(sketch)
+
+    names = dict(ItemCategory.objects.filter(pk__in=by_category).values_list('pk', 'name'))
+    return {
+        'days': days,
+        'since': since.isoformat(),
+        'metrics': [{'key': key, 'label': label} for key, label in KitchenLatencySketch.METRIC_CHOICES],
+        'overall': {metric: overall[metric].summary() for metric in SLA_METRICS},
+        'by_hour': [
+            {'hour': hour, **{metric: by_hour[hour][metric].summary() for metric in SLA_METRICS}}
+            for hour in sorted(by_hour)
+        ],
+        'by_category': [
+            {'category_id': category_id, 'category': names.get(category_id, ''),
+             **{metric: by_category[category_id][metric].summary() for metric in SLA_METRICS}}
+            for category_id in sorted(by_category, key=lambda pk: names.get(pk, ''))
+        ],
+    }
@@ -1,3 +1,1348 @@
-from django.test import TestCase
+import asyncio
+import importlib.util
+import io
+import json
+import math
+import os
+import tempfile
+import time
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from collections import Counter
+from functools import partial
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib import admin
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser, User
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.contrib.sessions.backends.db import SessionStore
+from django.db import connection
+from django.test import RequestFactory, SimpleTestCase, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from . import services, views
+from .ai_engine import CafeAIEngine
+from .combos import MAX_COURSES, MAX_TABLE, BudgetPlanner, parse_budget_query
+from .context_processors import cart_context
+from .events import FileLogBackend
+from .exports import aiter_export
+from .intents import Intent, IntentRouter
+from .matching import MenuIndex, TypoNormalizer
+from .menu import MENU_SNAPSHOT_MAX_AGE, bump_menu_version, get_menu_snapshot
+from .models import (
+    Address, ArchivedOrder, ArchivedOrderItem, ArchivedPayment, Cart, CartItem, Customer, Item, ItemCategory,
+    KitchenLatencySketch, Order, OrderItem, Payment, TypoCorrection,
+)
+from .notifications import get_order_state, wait_for_order_change
+from .rollups import ROLLUPS, check
+from .services import OrderPlacementError, place_order, transition_orders
+from .utils import CART_MAX_QUANTITY, CART_SUMMARY_SESSION_KEY, apply_cart_changes, get_cart_summary
+
+
+class ManagerDashboardQueryCountTests(TestCase):
+    """The dashboard must cost a fixed number of queries however many orders exist."""
+
+    # session + user lookups, then the metrics: rollup breakdown, 7-day trend,
+    # hourly histogram, top items, pending payments, recent customers
+    UNCACHED_QUERIES = 8
+    # session + user lookups only; the metrics come from the cache
+    CACHED_QUERIES = 2
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.manager = User.objects.create_user('manager', password='manager123', is_staff=True)
+        cls.customer = Customer.objects.create(name='Regular', phone='9876543210')
+        cls.items = [Item.objects.create(name=f'Item {i}', price=f'{50 + i}.00') for i in range(3)]
+
+    def setUp(self):
+        self.client.force_login(self.manager)
+        # First request fills the session's cart badge summary
+        self.client.get(reverse('manager_dashboard'))
+        cache.clear()
+
+    def _place_orders(self, count):
+        order_ids = [
+            place_order(
+                customer=self.customer,
+                order_type='DINING' if i % 2 else 'DELIVERY',
+                lines=[(self.items[i % 3].id, 1 + i % 2)],
+                table_no='5',
+            ).order.id
+            for i in range(count)
+        ]
+        transition_orders(order_ids[: count // 2], 'verify_payment')
+        return order_ids
+
+    def test_query_count_does_not_grow_with_orders(self):
+        for count in (3, 30):
+            self._place_orders(count)
+            cache.clear()
+            with self.assertNumQueries(self.UNCACHED_QUERIES):
+                response = self.client.get(reverse('manager_dashboard'))
+            self.assertEqual(response.status_code, 200)
+
+    def test_cached_until_an_order_changes(self):
+        order_ids = self._place_orders(4)
+        self.client.get(reverse('manager_dashboard'))
+        with self.assertNumQueries(self.CACHED_QUERIES):
+            response = self.client.get(reverse('manager_dashboard'))
+        self.assertEqual(response.context['total_orders'], 4)
+        self.assertEqual(sum(row['c'] for row in response.context['orders_by_hour']), 4)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            transition_orders(order_ids[2:], 'abandon')
+        with self.assertNumQueries(self.UNCACHED_QUERIES):
+            response = self.client.get(reverse('manager_dashboard'))
+        counts = {row['status']: row['count'] for row in response.context['status_percentages']}
+        self.assertEqual(counts, {'PAID': 2, 'CANCELED': 2})
+
+
+class OrderRollupQueryCountTests(TestCase):
+    """Placing and moving an order must cost the same queries however many lines it has."""
+
+    PLACE_ORDER_QUERIES = 15
+    # transition name -> queries, rollup and SLA bookkeeping included
+    TRANSITION_QUERIES = {'verify_payment': 11, 'start_preparing': 17, 'mark_ready': 18, 'complete': 18}
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = Customer.objects.create(name='Regular', phone='9876543210')
+        cls.items = [Item.objects.create(name=f'Item {i}', price=f'{50 + i}.00') for i in range(20)]
+
+    def _place(self, line_count):
+        lines = [(item.id, 1 + i % 3) for i, item in enumerate(self.items[:line_count])]
+        return place_order(customer=self.customer, order_type='DINING', lines=lines, table_no='5').order
+
+    def test_place_order(self):
+        for line_count in (1, 5, 20):
+            with self.subTest(lines=line_count), self.assertNumQueries(self.PLACE_ORDER_QUERIES):
+                self._place(line_count)
+        self.assertEqual(check('item_sales'), [])
+
+    def test_transitions(self):
+        for line_count in (1, 5, 20):
+            order = self._place(line_count)
+            for transition in ('verify_payment', 'send_to_chef', 'start_preparing', 'mark_ready', 'pickup', 'complete'):
+                if transition not in self.TRANSITION_QUERIES:
+                    transition_orders([order.pk], transition)
+                    continue
+                with self.subTest(lines=line_count, transition=transition):
+                    with self.assertNumQueries(self.TRANSITION_QUERIES[transition]):
+                        transition_orders([order.pk], transition)
+        for name in ('daily_sales', 'item_sales', 'hourly_orders', 'customer_stats'):
+            self.assertEqual(check(name), [], name)
+
+
+class KitchenSlaRollupTests(TestCase):
+    """The recorded latency sketches must match a rebuild from the order timestamps."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = Customer.objects.create(name='Regular', phone='9876543210')
+        cls.item = Item.objects.create(name='Latte', price='120.00', category=ItemCategory.objects.create(name='Coffee'))
+
+    def _place(self):
+        return place_order(customer=self.customer, order_type='DINING', lines=[(self.item.id, 1)], table_no='3').order.pk
+
+    def test_order_that_skips_send_to_chef(self):
+        sent, skipped = self._place(), self._place()
+        transition_orders([sent, skipped], 'verify_payment')
+        transition_orders([sent], 'send_to_chef')
+        for transition in ('start_preparing', 'mark_ready', 'pickup', 'complete'):
+            transition_orders([sent, skipped], transition)
+        counts = dict(KitchenLatencySketch.objects.filter(category=None).values_list('metric', 'count'))
+        self.assertEqual(counts, {'queue': 1, 'prep': 2, 'delivery': 2})
+        self.assertEqual(check('kitchen_sla'), [])
+
+
+class CartBatchTests(TestCase):
+    """cart_batch reports a status per item; rejected changes must not touch the cart."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.item = Item.objects.create(name='Latte', price='120.00')
+        cls.retired = Item.objects.create(name='Retired Special', price='90.00', is_active=False)
+
+    def setUp(self):
+        self.cart = Cart.objects.create(session_key='cart-tests')
+
+    def _quantities(self):
+        return dict(CartItem.objects.filter(cart=self.cart).values_list('item_id', 'quantity'))
+
+    def test_non_positive_add_is_invalid(self):
+        apply_cart_changes(self.cart, [(self.item.id, 2, 'add')])
+        results = apply_cart_changes(self.cart, [(self.item.id, 0, 'add')])
+        self.assertEqual(results, {self.item.id: 'invalid'})
+        results = apply_cart_changes(self.cart, [(self.item.id, -3, 'add'), (self.item.id, 5, 'add')])
+        self.assertEqual(results, {self.item.id: 'invalid'})
+        self.assertEqual(self._quantities(), {self.item.id: 2})
+
+    def test_set_on_inactive_item_is_unavailable(self):
+        results = apply_cart_changes(self.cart, [(self.retired.id, 2, 'set'), (self.item.id, 1, 'set')])
+        self.assertEqual(results, {self.retired.id: 'unavailable', self.item.id: 'ok'})
+        self.assertEqual(self._quantities(), {self.item.id: 1})
+
+    def test_batch_endpoint_reports_statuses(self):
+        response = self.client.post(
+            reverse('cart_batch'),
+            json.dumps({'changes': [
+                {'item_id': self.item.id, 'quantity': -1, 'mode': 'add'},
+                {'item_id': self.retired.id, 'quantity': 1, 'mode': 'set'},
+            ]}),
+            content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.json()['results'],
+            {str(self.item.id): 'invalid', str(self.retired.id): 'unavailable'},
+        )
+        self.assertEqual(response.json()['cart_count'], 0)
+
+    def _batch(self, body):
+        return self.client.post(reverse('cart_batch'), body, content_type='application/json')
+
+    def test_out_of_range_quantities_are_rejected(self):
+        for quantity in ('1e400', '-1e400', str(CART_MAX_QUANTITY + 1), '1000000000000'):
+            with self.subTest(quantity=quantity):
+                response = self._batch(f'{{"changes": [{{"item_id": {self.item.id}, "quantity": {quantity}, "mode": "set"}}]}}')
+                self.assertEqual(response.status_code, 400)
+        self.assertFalse(CartItem.objects.exists())
+
+    def test_repeated_adds_stop_at_the_cap(self):
+        apply_cart_changes(self.cart, [(self.item.id, CART_MAX_QUANTITY, 'add')])
+        apply_cart_changes(self.cart, [(self.item.id, 5, 'add'), (self.item.id, CART_MAX_QUANTITY, 'add')])
+        self.assertEqual(self._quantities(), {self.item.id: CART_MAX_QUANTITY})
+
+
+class CartBadgeTests(TestCase):
+    """The cart badge is lazy, cached in the session, and follows every cart change."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.item = Item.objects.create(name='Latte', price='120.00')
+
+    def _request(self, session):
+        request = RequestFactory().get('/')
+        request.session, request.user = session, AnonymousUser()
+        return request
+
+    def _badge(self):
+        response = self.client.get(reverse('homepage_view'))
+        return response.context['cart_count'], response.context['cart_total']
+
+    def test_unread_badge_costs_nothing(self):
+        session = SessionStore()
+        session.create()
+        with self.assertNumQueries(0):
+            cart_context(self._request(session))
+
+    def test_first_visit_creates_no_session_or_cart(self):
+        self.assertEqual(self._badge(), (0, Decimal('0')))
+        self.assertNotIn(settings.SESSION_COOKIE_NAME, self.client.cookies)
+        self.assertFalse(Cart.objects.exists())
+
+    def test_follows_cart_changes(self):
+        self.client.get(reverse('add_to_cart', args=[self.item.id]))
+        self.client.get(reverse('add_to_cart', args=[self.item.id]))
+        self.assertEqual(self._badge(), (2, Decimal('240.00')))
+        self.client.post(reverse('update_cart', args=[self.item.id]), {'quantity': 5})
+        self.assertEqual(self._badge(), (5, Decimal('600.00')))
+
+    def test_summary_is_read_once_then_served_from_the_session(self):
+        self.client.get(reverse('add_to_cart', args=[self.item.id]))
+        session = self.client.session
+        session.pop(CART_SUMMARY_SESSION_KEY, None)
+        request = self._request(session)
+        # Open cart lookup plus one aggregate
+        with self.assertNumQueries(2):
+            self.assertEqual(get_cart_summary(request)['count'], 1)
+        with self.assertNumQueries(0):
+            self.assertEqual(cart_context(request)['cart_count'], 1)
+
+class VerifyPaymentViewTests(TestCase):
+    """The single-payment view settles through the same compare-and-swap as the bulk path."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.manager = User.objects.create_user('manager', password='manager123', is_staff=True)
+        cls.customer = Customer.objects.create(name='Regular', phone='9876543210')
+        cls.item = Item.objects.create(name='Latte', price='120.00')
+
+    def setUp(self):
+        self.client.force_login(self.manager)
+        order = place_order(customer=self.customer, order_type='DINING', lines=[(self.item.id, 1)], table_no='2').order
+        self.payment = Payment.objects.get(order=order)
+
+    def _post(self, action):
+        return self.client.post(reverse('verify_payment', args=[self.payment.pk]), {'action': action}, follow=True)
+
+    def test_verify_then_reject_keeps_payment_and_order_in_step(self):
+        response = self._post('verify')
+        self.assertRedirects(response, reverse('manager_send_to_chef_confirm', args=[self.payment.order_id]))
+
+        response = self._post('reject')
+        self.assertIn('already settled', [str(m) for m in response.context['messages']][-1])
+        self.payment.refresh_from_db()
+        self.assertEqual(self.payment.status, 'VERIFIED')
+        self.assertEqual(Order.objects.get(pk=self.payment.order_id).status, 'PAID')
+
+    def test_reject(self):
+        self._post('reject')
+        self.payment.refresh_from_db()
+        self.assertEqual(self.payment.status, 'FAILED')
+        self.assertEqual(Order.objects.get(pk=self.payment.order_id).status, 'REJECTED')
+
+    def test_single_verify_waits_for_the_send_to_chef_confirmation(self):
+        self._post('verify')
+        self.assertIsNone(Order.objects.get(pk=self.payment.order_id).sent_to_chef_at)
+        self.client.post(reverse('manager_send_to_chef_confirm', args=[self.payment.order_id]), {'action': 'send_to_chef'})
+        self.assertIsNotNone(Order.objects.get(pk=self.payment.order_id).sent_to_chef_at)
+
+    def test_bulk_verify_sends_to_the_chef(self):
+        response = self.client.post(
+            reverse('manager_payments_bulk'),
+            {'action': 'verify', 'payment_ids': [self.payment.pk]},
+            content_type='application/json',
+        )
+        self.assertEqual(response.json(), {'results': {str(self.payment.pk): 'verified'}})
+        order = Order.objects.get(pk=self.payment.order_id)
+        self.assertEqual((order.status, order.sent_to_chef_at), ('PAID', order.updated_at))
+        transition_orders([order.pk], 'start_preparing')
+        self.assertEqual(KitchenLatencySketch.objects.get(metric='queue', category=None).count, 1)
+        self.assertEqual(check('kitchen_sla'), [])
+
+
+class OrderAdminRollupTests(TestCase):
+    """Hand edits in the admin must leave every rollup matching a rebuild from history."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin_user = User.objects.create_superuser('admin', password='admin123')
+        cls.customer = Customer.objects.create(name='Regular', phone='9876543210')
+        cls.other = Customer.objects.create(name='Walk-in', phone='9876500000')
+        cls.latte = Item.objects.create(name='Latte', price='120.00')
+        cls.samosa = Item.objects.create(name='Samosa', price='30.00')
+
+    def setUp(self):
+        self.client.force_login(self.admin_user)
+        self.earlier = place_order(customer=self.customer, order_type='DINING', lines=[(self.samosa.id, 1)], table_no='1').order
+        self.order = place_order(customer=self.customer, order_type='DINING', lines=[(self.latte.id, 2)], table_no='4').order
+
+    def assertRollupsMatchHistory(self):
+        for name in ('daily_sales', 'item_sales', 'hourly_orders', 'customer_stats'):
+            self.assertEqual(check(name), [], name)
+
+    def test_editing_everything_at_once(self):
+        line = OrderItem.objects.get(order=self.order)
+        data = {
+            'customer': self.other.pk, 'order_type': 'DELIVERY', 'table_no': '', 'delivery_address': '',
+            'total_amount': '90.00', 'status': 'PAID',
+            'items-TOTAL_FORMS': '1', 'items-INITIAL_FORMS': '1', 'items-MIN_NUM_FORMS': '0', 'items-MAX_NUM_FORMS': '1000',
+            'items-0-id': line.pk, 'items-0-order': self.order.pk, 'items-0-item': self.samosa.pk,
+            'items-0-quantity': '3', 'items-0-unit_price': '30.00',
+        }
+        for field in ('sent_to_chef_at', 'preparing_started_at', 'ready_at', 'completed_at'):
+            data[f'{field}_0'] = data[f'{field}_1'] = ''
+        response = self.client.post(reverse('admin:cafe_order_change', args=[self.order.pk]), data)
+        self.assertEqual(response.status_code, 302)
+        self.order.refresh_from_db()
+        self.assertEqual((self.order.status, self.order.customer_id), ('PAID', self.other.pk))
+        self.assertRollupsMatchHistory()
+
+    def test_deleting_orders(self):
+        response = self.client.post(reverse('admin:cafe_order_delete', args=[self.order.pk]), {'post': 'yes'})
+        self.assertEqual(response.status_code, 302)
+        self.assertRollupsMatchHistory()
+        response = self.client.post(
+            reverse('admin:cafe_order_changelist'),
+            {'action': 'delete_selected', '_selected_action': [self.earlier.pk], 'post': 'yes'},
+        )
+        self.assertEqual(response.status_code, 302)
+        self.assertFalse(Order.objects.exists())
+        self.assertRollupsMatchHistory()
+
+
+class OrderExportStreamingTests(TestCase):
+    """Under ASGI the export must stream chunk by chunk instead of being read into memory first."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.manager = User.objects.create_user('manager', password='manager123', is_staff=True)
+        cls.customer = Customer.objects.create(name='Regular', phone='9876543210')
+        cls.item = Item.objects.create(name='Latte', price='120.00')
+        for table in range(5):
+            place_order(customer=cls.customer, order_type='DINING', lines=[(cls.item.id, 1)], table_no=str(table))
+
+    def setUp(self):
+        self.client.force_login(self.manager)
+        self.async_client.force_login(self.manager)
+
+    async def test_asgi_response_is_not_buffered(self):
+        with mock.patch('cafe.views.aiter_export', partial(aiter_export, lines_per_chunk=2)):
+            response = await self.async_client.get(reverse('manager_export_orders'))
+            self.assertEqual(response.status_code, 200)
+            self.assertTrue(response.is_async)
+            chunks = [chunk async for chunk in response.streaming_content]
+        # Header plus five orders, two lines at a time
+        self.assertEqual(len(chunks), 3)
+        self.assertEqual(b''.join(chunks).decode().count('\n'), 6)
+
+    def test_wsgi_response_streams_the_generator(self):
+        response = self.client.get(reverse('manager_export_orders'), {'format': 'jsonl'})
+        self.assertFalse(response.is_async)
+        self.assertEqual(len(list(response.streaming_content)), 5)
+
+    def test_unknown_format_is_rejected(self):
+        response = self.client.get(reverse('manager_export_orders'), {'format': 'xlsx'})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.content.decode(), 'format must be one of: csv, jsonl')
+
+
+class OrderStatusLongPollTests(TestCase):
+    """``?wait=`` must always end: non-finite values don't hold the request at all."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = Customer.objects.create(name='Regular', phone='9876543210')
+        cls.item = Item.objects.create(name='Latte', price='120.00')
+
+    def setUp(self):
+        cache.clear()
+        self.order = place_order(customer=self.customer, order_type='DINING', lines=[(self.item.id, 1)], table_no='2').order
+        self.url = reverse('order_status_json', args=[self.order.pk])
+
+    def test_non_finite_wait_answers_at_once(self):
+        etag = self.client.get(self.url)['ETag']
+        for wait in ('nan', 'inf', '-inf', 'NaN'):
+            with self.subTest(wait=wait):
+                started = time.monotonic()
+                response = self.client.get(self.url, {'wait': wait}, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 304)
+                self.assertLess(time.monotonic() - started, 1)
+
+    def test_wait_for_order_change_ignores_a_nan_timeout(self):
+        version = get_order_state(self.order.pk)['version']
+        started = time.monotonic()
+        self.assertEqual(wait_for_order_change(self.order.pk, version, float('nan'))['version'], version)
+        self.assertLess(time.monotonic() - started, 1)
+
+    def test_change_ends_the_wait(self):
+        etag = self.client.get(self.url)['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            transition_orders([self.order.pk], 'verify_payment')
+        response = self.client.get(self.url, {'wait': '5'}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.json()['status'], 'PAID')
+
+
+class MenuSnapshotTests(TestCase):
+    """One snapshot per menu version, rebuilt on a bump or once it is too old."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.item = Item.objects.create(name='Latte', price='120.00')
+
+    def setUp(self):
+        cache.clear()
+
+    def test_reused_until_the_version_changes(self):
+        snapshot = get_menu_snapshot()
+        self.assertEqual([row['name'] for row in snapshot.items], ['Latte'])
+        with self.assertNumQueries(0):
+            self.assertIs(get_menu_snapshot(), snapshot)
+        Item.objects.create(name='Mocha', price='140.00')
+        bump_menu_version()
+        self.assertEqual([row['name'] for row in get_menu_snapshot().items], ['Latte', 'Mocha'])
+
+    def test_rebuilt_once_too_old_even_without_a_bump(self):
+        snapshot = get_menu_snapshot()
+        Item.objects.filter(pk=self.item.pk).update(price='99.00')
+        later = snapshot.built_at + MENU_SNAPSHOT_MAX_AGE + 1
+        with mock.patch('cafe.menu.time.monotonic', return_value=later):
+            rebuilt = get_menu_snapshot()
+        self.assertIsNot(rebuilt, snapshot)
+        self.assertEqual(str(rebuilt.items[0]['price']), '99.00')
+
+    def test_empty_menu(self):
+        Item.objects.all().delete()
+        snapshot = get_menu_snapshot()
+        self.assertEqual(snapshot.items, ())
+        self.assertEqual(snapshot.planner.plan(500, 3), [])
+
+
+class IdempotentOrderTests(TestCase):
+    """A replayed submission returns the first order and writes nothing new."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.item = Item.objects.create(name='Latte', price='120.00')
+
+    def _counts(self):
+        return Order.objects.count(), Payment.objects.count(), Address.objects.count()
+
+    def test_payment_form_replay(self):
+        self.client.post(reverse('add_to_cart', args=[self.item.id]))
+        self.client.post(reverse('checkout_delivery'), {
+            'name': 'Regular', 'phone': '9876543210', 'line1': '1 Main St', 'city': 'Pune', 'make_default': 'on',
+        })
+        form = {'idempotency_key': 'a' * 32, 'reference': 'UPI123'}
+        first = self.client.post(reverse('payment_page'), form)
+        order = Order.objects.get()
+        self.assertRedirects(first, reverse('order_status', args=[order.pk]), fetch_redirect_response=False)
+        counts = self._counts()
+        self.assertEqual(counts, (1, 1, 1))
+
+        second = self.client.post(reverse('payment_page'), form)
+        self.assertRedirects(second, reverse('order_status', args=[order.pk]), fetch_redirect_response=False)
+        self.assertEqual(self._counts(), counts)
+
+    def _engine(self, user, key):
+        request = RequestFactory().post('/api/ai/')
+        request.user = user
+        request.session = SessionStore()
+        engine = CafeAIEngine(request, idempotency_key=key)
+        engine.state.items = [{'id': self.item.id, 'name': self.item.name, 'qty': 2, 'price': str(self.item.price)}]
+        engine.state.details = {
+            'name': 'Regular', 'phone': '9876543210', 'address_line1': '1 Main St', 'city': 'Pune', 'postal_code': '411001',
+        }
+        return engine
+
+    def test_chat_replay(self):
+        user = User.objects.create_user('regular')
+        key = 'b' * 32
+        order = self._engine(user, key)._create_order('DELIVERY')
+        counts = self._counts()
+        self.assertEqual(counts, (1, 1, 1))
+
+        self.assertEqual(self._engine(user, key)._create_order('DELIVERY'), order)
+        self.assertEqual(self._counts(), counts)
+        # Two submissions racing past the key lookup: the loser's address is rolled back too
+        with mock.patch('cafe.ai_engine.find_idempotent_order_id', return_value=None):
+            self.assertEqual(self._engine(user, key)._create_order('DELIVERY'), order)
+        self.assertEqual(self._counts(), counts)
+
+
+class CustomerLifetimeStatsTests(TestCase):
+    """Lifetime spend counts paid orders only, and customer saves never write the counters back."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin_user = User.objects.create_superuser('admin', password='admin123')
+        cls.item = Item.objects.create(name='Latte', price='120.00')
+
+    def setUp(self):
+        self.customer = Customer.objects.create(name='Regular', phone='9876543210')
+
+    def _place(self, quantity=1):
+        return place_order(customer=self.customer, order_type='DINING', lines=[(self.item.id, quantity)], table_no='1').order
+
+    def test_spend_counts_paid_orders_only(self):
+        pending, paid, ready = self._place(1), self._place(2), self._place(3)
+        transition_orders([paid.pk, ready.pk], 'verify_payment')
+        transition_orders([ready.pk], 'start_preparing')
+        transition_orders([ready.pk], 'mark_ready')
+        self.customer.refresh_from_db()
+        self.assertEqual(self.customer.lifetime_spend, 240)
+        self.assertEqual((self.customer.lifetime_orders, self.customer.lifetime_items), (3, 6))
+        self.assertEqual(check('customer_stats'), [])
+
+    def _concurrently(self, target, wrapped):
+        """Patch ``target`` so an order is paid for just before ``wrapped`` runs, after the customer was loaded."""
+        def racing(*args, **kwargs):
+            order = self._place(2)
+            transition_orders([order.pk], 'verify_payment')
+            return wrapped(*args, **kwargs)
+        return mock.patch(target, racing)
+
+    def test_admin_save_keeps_concurrent_increments(self):
+        self.client.force_login(self.admin_user)
+        with self._concurrently('cafe.admin.CustomerAdmin.save_form', admin.ModelAdmin.save_form):
+            response = self.client.post(reverse('admin:cafe_customer_change', args=[self.customer.pk]), {
+                'name': 'Renamed', 'phone': self.customer.phone, 'email': '', 'user': '',
+            })
+        self.assertEqual(response.status_code, 302)
+        self.customer.refresh_from_db()
+        self.assertEqual((self.customer.name, self.customer.lifetime_spend), ('Renamed', 240))
+        self.assertEqual(check('customer_stats'), [])
+
+    def test_checkout_login_keeps_counters(self):
+        self.client.post(reverse('add_to_cart', args=[self.item.id]))
+        with self._concurrently('cafe.views.get_user_model', get_user_model):
+            self.client.post(reverse('checkout_dining'), {'name': 'Regular', 'phone': '9876543210', 'table_no': '4'})
+        self.customer.refresh_from_db()
+        self.assertIsNotNone(self.customer.user_id)
+        self.assertEqual((self.customer.lifetime_orders, self.customer.lifetime_spend), (1, 240))
+
+
+class TransitionRaceTests(TestCase):
+    """Two callers moving the same order: exactly one wins, and the rollups follow the winner."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = Customer.objects.create(name='Regular', phone='9876543210')
+        cls.item = Item.objects.create(name='Latte', price='120.00')
+
+    def _place(self):
+        return place_order(customer=self.customer, order_type='DINING', lines=[(self.item.id, 1)], table_no='1').order.pk
+
+    def _racing(self, competitor):
+        """Run ``competitor`` right after the next transition has read its candidates."""
+        def candidates(queryset, from_statuses):
+            found = original(queryset, from_statuses)
+            if pending:
+                pending.pop()()
+            return found
+        pending = [competitor]
+        original = services._candidates
+        return mock.patch('cafe.services._candidates', side_effect=candidates)
+
+    def assertRollupsMatchHistory(self):
+        for name in ('daily_sales', 'item_sales', 'customer_stats'):
+            self.assertEqual(check(name), [], name)
+
+    def test_exactly_one_wins(self):
+        order = self._place()
+        competing = []
+        with self._racing(lambda: competing.append(transition_orders([order], 'abandon'))):
+            result = transition_orders([order], 'verify_payment')
+        self.assertEqual((competing[0].applied, result.applied, result.skipped), ([order], [], [order]))
+        self.assertEqual(Order.objects.get(pk=order).status, 'CANCELED')
+        self.assertRollupsMatchHistory()
+
+    def test_lost_row_in_a_batch(self):
+        orders = [self._place() for _ in range(3)]
+        competing = []
+        with self._racing(lambda: competing.append(transition_orders(orders[1:2], 'reject_payment'))):
+            result = transition_orders(orders, 'abandon')
+        self.assertEqual(competing[0].applied, orders[1:2])
+        self.assertEqual((result.applied, result.skipped), ([orders[0], orders[2]], orders[1:2]))
+        statuses = dict(Order.objects.values_list('pk', 'status'))
+        self.assertEqual([statuses[pk] for pk in orders], ['CANCELED', 'REJECTED', 'CANCELED'])
+        self.assertRollupsMatchHistory()
+
+    def test_batch_costs_the_same_for_any_size(self):
+        counts = []
+        for size in (2, 10):
+            orders = [self._place() for _ in range(size)]
+            with CaptureQueriesContext(connection) as queries:
+                self.assertEqual(len(transition_orders(orders, 'verify_payment').applied), size)
+            counts.append(len(queries))
+        self.assertEqual(counts[0], counts[1])
+
+
+class KeysetPaginationTests(TestCase):
+    """Order history pages: cursors round-trip, ties on created_at split cleanly, bad cursors are a 400."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.manager = User.objects.create_user('manager', password='manager123', is_staff=True)
+        customer = Customer.objects.create(name='Regular', phone='9876543210')
+        item = Item.objects.create(name='Latte', price='120.00')
+        cls.orders = [
+            place_order(customer=customer, order_type='DINING', lines=[(item.id, 1)], table_no='1').order.pk
+            for _ in range(5)
+        ]
+        # Orders 1-3 share a timestamp, so only the id breaks the tie
+        Order.objects.filter(pk__in=cls.orders[1:4]).update(created_at=Order.objects.get(pk=cls.orders[1]).created_at)
+        cls.newest_first = list(Order.objects.order_by('-created_at', '-id').values_list('pk', flat=True))
+
+    def setUp(self):
+        self.client.force_login(self.manager)
+        patcher = mock.patch('cafe.views.ORDER_HISTORY_PAGE_SIZE', 2)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _page(self, **params):
+        response = self.client.get(reverse('manager_order_history'), params)
+        self.assertEqual(response.status_code, 200)
+        ctx = response.context
+        return [order.pk for order in ctx['orders']], ctx['newer_cursor'], ctx['older_cursor']
+
+    def test_walks_every_order_once_and_back(self):
+        pages, cursors = [], [None]
+        page, newer, older = self._page()
+        self.assertIsNone(newer)
+        while True:
+            pages.append(page)
+            if older is None:
+                break
+            cursors.append(older)
+            page, newer, older = self._page(after=older)
+        self.assertEqual([pk for page in pages for pk in page], self.newest_first)
+        self.assertEqual([len(page) for page in pages], [2, 2, 1])
+        # Going back from the last page lands on the one before it
+        self.assertEqual(self._page(before=newer)[0], pages[-2])
+        self.assertEqual(self._page(after=cursors[1])[0], pages[1])
+
+    def test_past_the_last_order(self):
+        oldest = Order.objects.get(pk=self.newest_first[-1])
+        self.assertEqual(self._page(after=views._encode_cursor(oldest.created_at, oldest.pk)), ([], None, None))
+
+    def test_invalid_or_tampered_cursor_is_a_bad_request(self):
+        for cursor in ('', 'garbage', '12:x', '9' * 30 + ':1', '1:' + '9' * 30, '1:-1'):
+            with self.subTest(cursor=cursor):
+                self.assertEqual(self.client.get(reverse('manager_order_history'), {'after': cursor}).status_code, 400)
+                self.assertEqual(self.client.get(reverse('manager_order_history'), {'before': cursor}).status_code, 400)
+                self.assertEqual(self.client.get(reverse('chef_delta'), {'cursor': cursor}).status_code, 400)
+                self.assertEqual(self.client.get(reverse('waiter_delta'), {'cursor': cursor}).status_code, 400)
+
+
+class ArchiveOrdersTests(TestCase):
+    """archive_orders moves old finished orders without touching the rollups, and tracking still finds them."""
+
+    @classmethod
+    def setUpTestData(cls):
+        customer = Customer.objects.create(name='Regular', phone='9876543210')
+        item = Item.objects.create(name='Latte', price='120.00')
+        place = partial(place_order, customer=customer, order_type='DINING', lines=[(item.id, 2)], table_no='1')
+        cls.completed, cls.canceled, cls.live, cls.recent = (place().order.pk for _ in range(4))
+        for transition in ('verify_payment', 'start_preparing', 'mark_ready', 'pickup', 'complete'):
+            transition_orders([cls.completed, cls.recent], transition)
+        transition_orders([cls.canceled], 'abandon')
+        transition_orders([cls.live], 'verify_payment')
+        Order.objects.exclude(pk=cls.recent).update(updated_at=timezone.now() - timedelta(days=120))
+
+    def setUp(self):
+        cache.clear()
+
+    def _archive(self):
+        call_command('archive_orders', pause=0, batch_size=1, stdout=io.StringIO())
+
+    def _rollups(self):
+        return {name: sorted(ROLLUPS[name][0].objects.values_list(*ROLLUPS[name][1], *ROLLUPS[name][2])) for name in ROLLUPS}
+
+    def test_moves_finished_orders_and_leaves_rollups_alone(self):
+        before = self._rollups()
+        self._archive()
+        archived = [self.completed, self.canceled]
+        self.assertEqual(sorted(ArchivedOrder.objects.values_list('pk', flat=True)), archived)
+        self.assertEqual(sorted(Order.objects.values_list('pk', flat=True)), [self.live, self.recent])
+        self.assertEqual(ArchivedOrderItem.objects.filter(order_id__in=archived).count(), 2)
+        self.assertEqual(ArchivedPayment.objects.filter(order_id__in=archived).count(), 2)
+        self.assertFalse(OrderItem.objects.filter(order_id__in=archived).exists())
+        self.assertEqual(self._rollups(), before)
+        for name in ROLLUPS:
+            self.assertEqual(check(name), [], name)
+        # Running it again finds nothing left to move
+        self._archive()
+        self.assertEqual(ArchivedOrder.objects.count(), 2)
+        self.assertEqual(self._rollups(), before)
+
+    def test_tracking_an_archived_order(self):
+        self._archive()
+        response = self.client.get(reverse('order_status', args=[self.completed]))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['order'].pk, self.completed)
+        self.assertContains(self.client.get(reverse('track_order_detail', args=[self.completed])), f'#{self.completed}')
+        status = self.client.get(reverse('order_status_json', args=[self.completed]))
+        self.assertEqual(status.json()['status'], 'COMPLETED')
+        self.assertEqual(self.client.get(reverse('order_status', args=[self.completed + 100])).status_code, 404)
+
+
+class EventStreamTests(TestCase):
+    """The SSE endpoints: the current state up front, then every transition as it commits."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.manager = User.objects.create_user('manager', password='manager123', is_staff=True)
+        customer = Customer.objects.create(name='Regular', phone='9876543210')
+        item = Item.objects.create(name='Latte', price='120.00')
+        cls.order = place_order(customer=customer, order_type='DINING', lines=[(item.id, 1)], table_no='4').order
+
+    def setUp(self):
+        cache.clear()
+
+    async def _next_event(self, stream):
+        """The next ``(event type, data)`` on ``stream``, skipping the retry hint and pings."""
+        while True:
+            chunk = (await asyncio.wait_for(anext(stream), 5)).decode()
+            fields = dict(line.split(': ', 1) for line in chunk.splitlines() if line and not line.startswith(':'))
+            if 'event' in fields:
+                return fields['event'], json.loads(fields['data'])
+
+    def _verify(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            transition_orders([self.order.pk], 'verify_payment')
+
+    async def _follow(self, url):
+        response = await self.async_client.get(url)
+        self.assertEqual((response.status_code, response['Content-Type']), (200, 'text/event-stream'))
+        stream = aiter(response.streaming_content)
+        try:
+            first = await self._next_event(stream)
+            await sync_to_async(self._verify)()
+            return first, await self._next_event(stream)
+        finally:
+            await stream.aclose()
+
+    async def test_order_events(self):
+        first, change = await self._follow(reverse('order_events', args=[self.order.pk]))
+        self.assertEqual(first, ('order', {'id': self.order.pk, 'status': 'PENDING_PAYMENT', 'version': mock.ANY}))
+        self.assertEqual(change, ('order', {'id': self.order.pk, 'status': 'PAID', 'version': mock.ANY}))
+        self.assertNotEqual(first[1]['version'], change[1]['version'])
+
+    async def test_staff_events(self):
+        await sync_to_async(self.async_client.force_login)(self.manager)
+        response = await self.async_client.get(reverse('staff_events'))
+        self.assertEqual(response.status_code, 200)
+        stream = aiter(response.streaming_content)
+        try:
+            # The stream subscribes when it starts: take the retry hint before changing anything
+            self.assertEqual(await anext(stream), b'retry: 3000\n\n')
+            await sync_to_async(self._verify)()
+            self.assertEqual(await self._next_event(stream), ('order', {'id': self.order.pk, 'status': 'PAID', 'version': mock.ANY}))
+        finally:
+            await stream.aclose()
+
+    async def test_staff_events_are_for_staff_only(self):
+        response = await self.async_client.get(reverse('staff_events'))
+        self.assertEqual(response.status_code, 403)
+
+    def test_unavailable_under_wsgi(self):
+        self.client.force_login(self.manager)
+        for url in (reverse('order_events', args=[self.order.pk]), reverse('staff_events')):
+            self.assertEqual(self.client.get(url).status_code, 503)
+
+
+class FileLogBackendTests(SimpleTestCase):
+    """Tailers follow the event log across rotations without dropping or repeating events."""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'events.log')
+        self.delivered = []
+        self.publisher, self.tailer = FileLogBackend(self.path, max_bytes=300), FileLogBackend(self.path)
+        self.tailer.attach(lambda channel, event: self.delivered.append(event['n']))
+
+    def _publish(self, numbers):
+        for n in numbers:
+            self.publisher.publish('staff', {'n': n})
+
+    def test_new_generation_larger_than_the_old_offset(self):
+        self._publish(range(3))
+        self.tailer._read_new()
+        # Nine lines pass max_bytes, so the tenth starts a new file that ends up
+        # bigger than the three lines the tailer had read of the old one
+        self._publish(range(3, 15))
+        self.assertTrue(os.path.exists(self.path + '.1'))
+        self.tailer._read_new()
+        self.tailer._read_new()
+        self.assertEqual(self.delivered, list(range(15)))
+
+
+class ReapCartsTests(TestCase):
+    """reap_carts removes idle and checked-out carts with their lines, and nothing still in use."""
+
+    @classmethod
+    def setUpTestData(cls):
+        item = Item.objects.create(name='Latte', price='120.00')
+        now = timezone.now()
+
+        def cart(status, days_idle, line_days_idle=None):
+            cart = Cart.objects.create(session_key='s', status=status)
+            Cart.objects.filter(pk=cart.pk).update(updated_at=now - timedelta(days=days_idle))
+            if line_days_idle is not None:
+                line = CartItem.objects.create(cart=cart, item=item, quantity=1, unit_price=item.price)
+                CartItem.objects.filter(pk=line.pk).update(updated_at=now - timedelta(days=line_days_idle))
+            return cart.pk
+
+        cls.expired = [cart('OPEN', 10, 10), cart('OPEN', 10), cart('CHECKED_OUT', 2, 2)]
+        cls.kept = [cart('OPEN', 10, 1), cart('OPEN', 1, 1), cart('CHECKED_OUT', 0, 0)]
+
+    def _reap(self, *args):
+        out = io.StringIO()
+        call_command('reap_carts', '--batch-size=1', '--pause=0', *args, stdout=out)
+        return out.getvalue()
+
+    def test_deletes_only_expired_carts(self):
+        self.assertIn('Deleted 3 cart(s) and 2 cart item(s)', self._reap())
+        self.assertEqual(sorted(Cart.objects.values_list('pk', flat=True)), self.kept)
+        self.assertEqual(CartItem.objects.count(), 3)
+        self.assertIn('Deleted 0 cart(s) and 0 cart item(s)', self._reap())
+
+    def test_dry_run_counts_without_deleting(self):
+        self.assertIn('Would delete 3 cart(s) and 2 cart item(s)', self._reap('--dry-run'))
+        self.assertEqual(Cart.objects.count(), 6)
+
+    def test_empty_table(self):
+        Cart.objects.all().delete()
+        self.assertIn('Deleted 0 cart(s)', self._reap())
+
+
+class PlaceOrderTests(TestCase):
+    """place_order prices lines from the menu and writes everything or nothing."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = Customer.objects.create(name='Regular', phone='9876543210')
+        cls.latte = Item.objects.create(name='Latte', price='120.00')
+        cls.muffin = Item.objects.create(name='Muffin', price='80.00')
+        cls.retired = Item.objects.create(name='Retired', price='10.00', is_active=False)
+
+    def _cart(self):
+        cart = Cart.objects.create(session_key='s')
+        CartItem.objects.create(cart=cart, item=self.latte, quantity=1, unit_price='1.00')
+        return cart
+
+    def _place(self, lines, **kwargs):
+        kwargs.setdefault('order_type', 'DINING')
+        return place_order(customer=self.customer, lines=lines, table_no='7', **kwargs).order
+
+    def test_lines_are_merged_and_priced_from_the_menu(self):
+        cart = self._cart()
+        order = self._place([(self.latte.id, 1), (self.muffin.id, 2), (self.latte.id, 2), (self.muffin.id, 0)], cart=cart)
+        self.assertEqual(order.total_amount, Decimal('520.00'))
+        self.assertEqual(
+            dict(order.items.values_list('item_id', 'quantity')), {self.latte.id: 3, self.muffin.id: 2},
+        )
+        self.assertEqual((order.status, order.table_no), ('PENDING_PAYMENT', '7'))
+        self.assertEqual((order.payment.status, order.payment.amount), ('PENDING', order.total_amount))
+        cart.refresh_from_db()
+        self.assertEqual((cart.status, cart.items.count()), ('CHECKED_OUT', 0))
+
+    def test_delivery_orders_have_no_table(self):
+        self.assertEqual(self._place([(self.latte.id, 1)], order_type='DELIVERY').table_no, '')
+
+    def test_nothing_is_written_for_a_bad_order(self):
+        cart = self._cart()
+        for lines in ([], [(self.latte.id, 0)], [(self.latte.id, 1), (self.retired.id, 1)], [(self.latte.id, 1), (10 ** 6, 1)]):
+            with self.subTest(lines=lines), self.assertRaises(OrderPlacementError):
+                self._place(lines, cart=cart)
+        self.assertFalse(Order.objects.exists())
+        self.assertFalse(Payment.objects.exists())
+        cart.refresh_from_db()
+        self.assertEqual((cart.status, cart.items.count()), ('OPEN', 1))
+
+
+class DashboardDeltaTests(TestCase):
+    """The chef and waiter delta feeds send each changed order once, in the lane it now belongs to."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.manager = User.objects.create_user('manager', password='manager123', is_staff=True)
+        customer = Customer.objects.create(name='Regular', phone='9876543210')
+        item = Item.objects.create(name='Latte', price='120.00')
+        cls.dining, cls.delivery = (
+            place_order(customer=customer, order_type=order_type, lines=[(item.id, 1)], table_no='2').order.pk
+            for order_type in ('DINING', 'DELIVERY')
+        )
+
+    def setUp(self):
+        self.client.force_login(self.manager)
+        self.start = views._encode_cursor(timezone.now() - timedelta(minutes=1), 0)
+
+    def _delta(self, name, cursor):
+        response = self.client.get(reverse(name), {'cursor': cursor})
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def _lanes(self, name):
+        return {change['id']: change['lane'] for change in self._delta(name, self.start)['changes']}
+
+    def _age(self, minutes):
+        Order.objects.update(updated_at=timezone.now() - timedelta(minutes=minutes))
+
+    def test_lanes_follow_the_order(self):
+        orders = [self.dining, self.delivery]
+        self.assertEqual(self._lanes('chef_delta'), {})
+        transition_orders(orders, 'verify_payment')
+        self.assertEqual(self._lanes('chef_delta'), {self.dining: 'pending', self.delivery: 'pending'})
+        transition_orders(orders, 'start_preparing')
+        self.assertEqual(self._lanes('chef_delta'), {self.dining: 'preparing', self.delivery: 'preparing'})
+        transition_orders(orders, 'mark_ready')
+        # Off the chef's board, onto the waiter's
+        self.assertEqual(self._lanes('chef_delta'), {self.dining: None, self.delivery: None})
+        self.assertEqual(self._lanes('waiter_delta'), {self.dining: 'ready_dining', self.delivery: 'ready_delivery'})
+        transition_orders([self.delivery], 'pickup')
+        self.assertEqual(self._lanes('waiter_delta')[self.delivery], 'out_delivery')
+
+    def test_batches_then_catches_up(self):
+        transition_orders([self.dining, self.delivery], 'verify_payment')
+        self._age(10)
+        with mock.patch('cafe.views.DELTA_BATCH_SIZE', 1):
+            first = self._delta('chef_delta', views._encode_cursor(timezone.now() - timedelta(hours=1), 0))
+            second = self._delta('chef_delta', first['cursor'])
+        self.assertEqual([(c['id'], first['more']) for c in first['changes']], [(self.dining, True)])
+        self.assertEqual([(c['id'], second['more']) for c in second['changes']], [(self.delivery, False)])
+        self.assertEqual(self._delta('chef_delta', second['cursor'])['changes'], [])
+
+    def test_recent_changes_are_sent_again(self):
+        transition_orders([self.dining], 'verify_payment')
+        first = self._delta('chef_delta', self.start)
+        # Still inside the settle window, so the same change comes round once more
+        self.assertEqual([c['id'] for c in self._delta('chef_delta', first['cursor'])['changes']], [self.dining])
+
+    def test_staff_only(self):
+        self.client.logout()
+        self.assertEqual(self.client.get(reverse('chef_delta'), {'cursor': self.start}).status_code, 302)
+
+
+@skipUnless(connection.vendor == 'sqlite', 'reads SQLite query plans')
+class DashboardIndexTests(TestCase):
+    """Once the planner has statistics, every dashboard lane reads its own index and needs no sort."""
+
+    # queryset as the view builds it -> index it should use
+    LANES = {
+        'chef pending': (lambda: Order.objects.filter(status='PAID').order_by('sent_to_chef_at', 'created_at'), 'order_chef_queue_idx'),
+        'chef preparing': (lambda: Order.objects.filter(status='PREPARING').order_by('preparing_started_at'), 'order_preparing_idx'),
+        'waiter ready': (lambda: Order.objects.filter(status='READY_FOR_DELIVERY').order_by('ready_at'), 'order_ready_idx'),
+        'waiter out': (lambda: Order.objects.filter(status='OUT_FOR_DELIVERY').order_by('updated_at'), 'order_status_updated_idx'),
+        'history by status': (lambda: Order.objects.filter(status='COMPLETED').order_by('-created_at', '-id'), 'order_status_created_idx'),
+        'pending payments': (lambda: Payment.objects.filter(status='PENDING').order_by('-created_at'), 'payment_pending_idx'),
+    }
+
+    @classmethod
+    def setUpTestData(cls):
+        customer = Customer.objects.create(name='Regular', phone='9876543210')
+        now = timezone.now()
+        # Mostly finished history, a few orders in each live lane
+        statuses = ['COMPLETED'] * 400 + ['PAID', 'PREPARING', 'READY_FOR_DELIVERY', 'OUT_FOR_DELIVERY', 'PENDING_PAYMENT'] * 3
+        orders = Order.objects.bulk_create(
+            Order(customer=customer, order_type='DINING', total_amount=1, status=status,
+                  sent_to_chef_at=now, preparing_started_at=now, ready_at=now)
+            for status in statuses
+        )
+        Payment.objects.bulk_create(
+            Payment(order=order, amount=1, status='PENDING' if order.status == 'PENDING_PAYMENT' else 'VERIFIED')
+            for order in orders
+        )
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    def test_lanes_use_their_index(self):
+        for lane, (queryset, index) in self.LANES.items():
+            with self.subTest(lane=lane):
+                plan = queryset().explain()
+                self.assertIn(f'USING INDEX {index}', plan)
+                self.assertNotIn('TEMP B-TREE', plan)
+
+
+# NumPy is optional outside the forecast page
+@skipUnless(importlib.util.find_spec('numpy'), 'needs NumPy')
+class DemandForecastTests(TestCase):
+    """Hour-of-week demand forecasts, including a history shorter than one week."""
+
+    # A Wednesday, so tomorrow is a Thursday
+    NOW = datetime(2026, 3, 4, 10, 30, tzinfo=dt_timezone.utc)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = Customer.objects.create(name='Regular', phone='9876543210')
+        cls.latte = Item.objects.create(name='Latte', price='120.00')
+        cls.muffin = Item.objects.create(name='Muffin', price='80.00')
+
+    def _sell(self, item, quantity, ago, status='COMPLETED'):
+        order = place_order(customer=self.customer, order_type='DINING', lines=[(item.id, quantity)], table_no='1').order
+        Order.objects.filter(pk=order.pk).update(status=status, created_at=self.NOW - ago)
+
+    def _forecast(self, **kwargs):
+        from .forecast import build_forecast
+        forecast = build_forecast(now=self.NOW, **kwargs)
+        return dict(zip(forecast.item_ids.tolist(), forecast.next_hour.tolist())), forecast
+
+    def test_no_history(self):
+        next_hour, forecast = self._forecast()
+        self.assertEqual(next_hour, {})
+        self.assertEqual(forecast.tomorrow_hourly.shape, (0, 24))
+        manager = User.objects.create_user('manager', password='manager123', is_staff=True)
+        self.client.force_login(manager)
+        self.assertEqual(self.client.get(reverse('manager_forecast')).status_code, 200)
+
+    def test_less_than_a_week_of_history(self):
+        # Last Wednesday 11:15 (next hour's slot) and last Thursday 08:30 (tomorrow morning)
+        self._sell(self.latte, 4, timedelta(days=7) - timedelta(minutes=45))
+        self._sell(self.muffin, 2, timedelta(days=6, hours=2))
+        # Neither unpaid orders nor the hour still in progress count
+        self._sell(self.latte, 9, timedelta(days=7) - timedelta(minutes=50), status='PENDING_PAYMENT')
+        self._sell(self.latte, 9, timedelta(minutes=10))
+
+        next_hour, forecast = self._forecast(weeks=1)
+        self.assertEqual(next_hour, {self.latte.id: 4.0, self.muffin.id: 0.0})
+        self.assertEqual(forecast.tomorrow, date(2026, 3, 5))
+        self.assertEqual(forecast.tomorrow_hourly[1].tolist(), [2.0 if hour == 8 else 0.0 for hour in range(24)])
+        # Earlier weeks are empty, so a longer window only smooths the same week in once
+        next_hour, _ = self._forecast(weeks=8, alpha=0.3)
+        self.assertAlmostEqual(next_hour[self.latte.id], 1.2)
+
+    def test_matches_the_naive_forecast(self):
+        for days in range(1, 40, 3):
+            self._sell(self.latte if days % 2 else self.muffin, 1 + days % 4, timedelta(days=days, hours=days % 24))
+        from .forecast import naive_forecast
+        expected = naive_forecast(now=self.NOW, weeks=6)
+        _, forecast = self._forecast(weeks=6)
+        actual = {
+            pk: (next_hour, total)
+            for pk, next_hour, total in zip(forecast.item_ids.tolist(), forecast.next_hour.tolist(), forecast.tomorrow_total.tolist())
+        }
+        self.assertEqual(actual.keys(), expected.keys())
+        for pk, values in expected.items():
+            for got, want in zip(actual[pk], values):
+                self.assertAlmostEqual(got, want)
+
+
+class MenuIndexTests(SimpleTestCase):
+    """Finding menu items and quantities in chat messages, typos included."""
+
+    ITEMS = [
+        {'id': 1, 'name': 'Coffee'},
+        {'id': 2, 'name': 'Cold Coffee'},
+        {'id': 3, 'name': 'Cappuccino'},
+        {'id': 4, 'name': 'Masala Tea'},
+        {'id': 5, 'name': 'Pie'},
+    ]
+
+    def setUp(self):
+        self.index = MenuIndex(self.ITEMS)
+
+    def test_quantity_forms(self):
+        for text, expected in [
+            ('2 cappuccino please', [(3, 2)]),
+            ('cappuccino x3', [(3, 3)]),
+            ('cappuccino x 4', [(3, 4)]),
+            ('cappuccino 5', [(3, 5)]),
+            ('a cappuccino', [(3, 1)]),
+            ('0 cappuccino', [(3, 1)]),
+            ('2 masala tea and 3 pie', [(4, 2), (5, 3)]),
+        ]:
+            with self.subTest(text=text):
+                self.assertEqual(self.index.match_items(text), expected)
+
+    def test_every_key_word_must_be_present(self):
+        # Plain Coffee is named too, but the number belongs to the phrase it starts
+        self.assertEqual(self.index.match_items('2 cold coffee'), [(1, 1), (2, 2)])
+        self.assertEqual(self.index.match_items('something cold'), [])
+        self.assertEqual(self.index.closest('2 cold coffee')['id'], 2)
+
+    def test_typos(self):
+        self.assertEqual(self.index.match_items('2 capuchino'), [(3, 2)])
+        self.assertEqual(self.index.match_items('masla tea'), [(4, 1)])
+        # Too short to guess at, and too far off to be a misspelling
+        self.assertEqual(self.index.match_items('pei'), [])
+        self.assertEqual(self.index.match_items('capybara'), [])
+        self.assertEqual(self.index.corrections('cofee'), ['coffee'])
+
+    def test_exact_names(self):
+        self.assertEqual([item['id'] for item in self.index.mentioned('Cold coffee or a pie?')], [1, 2, 5])
+        self.assertEqual(self.index.item_named('MASALA TEA')['id'], 4)
+        self.assertEqual(self.index.item(3)['name'], 'Cappuccino')
+        self.assertIsNone(self.index.item(99))
+
+    def test_empty_menu(self):
+        index = MenuIndex([])
+        self.assertEqual(index.match_items('2 cappuccino'), [])
+        self.assertEqual(index.mentioned('cappuccino'), [])
+        self.assertIsNone(index.closest('cappuccino'))
+
+
+class TypoCorrectionTests(TestCase):
+    """Managed typo corrections are applied word by word and reach the assistant on the next snapshot."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.item = Item.objects.create(name='Cappuccino', price='150.00')
+
+    def setUp(self):
+        cache.clear()
+
+    def _matches(self, text):
+        request = RequestFactory().post('/api/ai/')
+        request.user, request.session = AnonymousUser(), SessionStore()
+        return CafeAIEngine(request)._match_items(text)
+
+    def test_whole_words_only(self):
+        normalize = TypoNormalizer({'Capucino': 'cappuccino', 'cldcoffee': 'cold coffee'})
+        self.assertEqual(normalize('2 capucino, 1 cldcoffee'), '2 cappuccino, 1 cold coffee')
+        self.assertEqual(normalize('capucinos'), 'capucinos')
+        self.assertEqual(TypoNormalizer({})('capucino'), 'capucino')
+
+    def test_table_changes_reach_the_assistant(self):
+        # Too far from any menu word for the fuzzy matcher to guess
+        self.assertEqual(self._matches('2 cappu'), [])
+        with self.captureOnCommitCallbacks(execute=True):
+            correction = TypoCorrection.objects.create(wrong='cappu', correct='cappuccino')
+        self.assertEqual(self._matches('2 cappu'), [(self.item.id, 2)])
+        with self.captureOnCommitCallbacks(execute=True):
+            correction.delete()
+        self.assertEqual(self._matches('2 cappu'), [])
+
+
+class IntentRouterTests(TestCase):
+    """Intents come back in declaration order, and a message nobody answers gets the help reply."""
+
+    def setUp(self):
+        self.router = IntentRouter([
+            Intent('cheap', keywords=('cheap',), patterns=(r'under\s*\d+',)),
+            Intent('best_sellers', keywords=('best seller',)),
+            Intent('best', keywords=('best',)),
+            Intent('silent', keywords=('hmm',)),
+        ])
+
+    def test_ranked_in_declaration_order(self):
+        self.assertEqual(self.router.route('Best seller under 200?'), ['cheap', 'best_sellers', 'best'])
+        self.assertEqual(self.router.route('the best one'), ['best'])
+        self.assertEqual(self.router.route('hmm', also=('best',)), ['best', 'silent'])
+        self.assertEqual(self.router.route('nothing here'), [])
+
+    def test_declaration_errors(self):
+        with self.assertRaises(ValueError):
+            IntentRouter([Intent('a'), Intent('a')])
+        with self.assertRaises(ValueError):
+            self.router.handles('unknown')
+
+    def test_no_triggers_at_all(self):
+        self.assertEqual(IntentRouter([Intent('details')]).route('anything', also=('details',)), ['details'])
+
+    def test_intent_without_a_handler_falls_through_to_help(self):
+        cache.clear()
+        request = RequestFactory().post('/api/ai/')
+        request.user, request.session = AnonymousUser(), SessionStore()
+        engine = CafeAIEngine(request)
+        self.assertNotIn('delivery', CafeAIEngine.ROUTER.handlers)
+        reply = engine.handle('delivery please')
+        self.assertEqual(engine.intents, ['delivery'])
+        self.assertTrue(reply['reply'].startswith('I can show best sellers'))
+        # The intent still did its job of setting the order type
+        self.assertEqual(engine.state.order_type, 'DELIVERY')
+
+    def test_benchmark_corpus(self):
+        out = io.StringIO()
+        call_command('benchmark_intents', repeat=1, min_accuracy=0.85, stdout=out)
+        self.assertIn('Accuracy:', out.getvalue())
+
+
+class BudgetPlannerTests(SimpleTestCase):
+    """Budget combos stay within budget and the serving rules, down to budgets nothing fits."""
+
+    MENU = [
+        {'id': i, 'name': name, 'price': Decimal(price), 'category__name': category}
+        for i, (name, price, category) in enumerate([
+            ('Samosa', '30', 'Snacks'), ('Fries', '90', 'Snacks'), ('Sandwich', '120', 'Snacks'),
+            ('Tea', '40', 'Drinks'), ('Latte', '150', 'Drinks'),
+            ('Thali', '250', 'Meals'), ('Biryani', '220', None),
+        ], start=1)
+    ]
+
+    def setUp(self):
+        self.planner = BudgetPlanner(self.MENU)
+
+    def assertValidCombo(self, combo, budget, people):
+        self.assertLessEqual(combo.total, budget)
+        self.assertEqual(combo.total, sum(item['price'] * qty for item, qty in combo.lines))
+        self.assertGreaterEqual(combo.servings, people)
+        # Groups are planned per table, each table rounded up to whole seats
+        tables = math.ceil(people / MAX_TABLE)
+        seated = tables * math.ceil(people / tables)
+        self.assertLessEqual(combo.servings, seated * MAX_COURSES)
+        by_category = Counter()
+        for item, qty in combo.lines:
+            by_category[item['category__name'] or 'Others'] += qty
+        self.assertLessEqual(max(by_category.values()), seated)
+
+    def test_combos_follow_the_rules(self):
+        for budget, people in ((100, 1), (500, 3), (2000, 7), (150, 2)):
+            with self.subTest(budget=budget, people=people):
+                combos = self.planner.plan(budget, people, popular_ids=[6, 5], limit=5)
+                self.assertTrue(combos)
+                for combo in combos:
+                    self.assertValidCombo(combo, budget, people)
+                self.assertEqual([c.score for c in combos], sorted((c.score for c in combos), reverse=True))
+                chosen = [{item['id'] for item, _ in combo.lines} for combo in combos]
+                self.assertFalse(any(a <= b for i, a in enumerate(chosen) for b in chosen[:i]))
+
+    def test_big_groups_are_planned_as_identical_tables(self):
+        # Seven people: three tables of three (rounded up), so every quantity is a multiple of three
+        for combo in self.planner.plan(2000, 7):
+            self.assertTrue(all(qty % 3 == 0 for _, qty in combo.lines))
+
+    def test_budget_below_the_cheapest_item(self):
+        self.assertEqual(self.planner.under(29), [])
+        self.assertEqual(self.planner.plan(29, 1), [])
+        # Enough for one samosa but not for two people
+        self.assertEqual(self.planner.plan(59, 2), [])
+        self.assertEqual([(item['name'], qty) for item, qty in self.planner.plan(30, 1)[0].lines], [('Samosa', 1)])
+
+    def test_empty_menu(self):
+        planner = BudgetPlanner([])
+        self.assertEqual(planner.under(1000), [])
+        self.assertEqual(planner.plan(1000, 4), [])
+
+    def test_parse_budget_query(self):
+        for text, expected in [
+            ('food for 3 under 500', (500, 3)),
+            ('₹300 for two people', (300, 2)),
+            ('combo within rs. 450', (450, None)),
+            ('4 of us, 800', (800, 4)),
+            ('hello', (None, None)),
+        ]:
+            with self.subTest(text=text):
+                self.assertEqual(parse_budget_query(text), expected)
+
+
+class ComboApiTests(TestCase):
+    """The combos endpoint validates its query and answers an unaffordable budget with no combos."""
+
+    @classmethod
+    def setUpTestData(cls):
+        Item.objects.create(name='Latte', price='120.00')
+
+    def setUp(self):
+        cache.clear()
+
+    def _get(self, **params):
+        return self.client.get(reverse('ai_combos_api'), params)
+
+    def test_invalid_queries(self):
+        for params in ({}, {'budget': 'lots'}, {'budget': 0}, {'budget': 500, 'people': 0}, {'budget': 500, 'limit': 11}):
+            with self.subTest(params=params):
+                self.assertEqual(self._get(**params).status_code, 400)
+
+    def test_combos(self):
+        self.assertEqual(self._get(budget=100).json()['combos'], [])
+        combo = self._get(budget=300, people=2).json()['combos'][0]
+        self.assertEqual((combo['total'], combo['servings'], combo['items'][0]['category']), ('240.00', 2, 'Others'))
+
+
+class ExportOrdersCommandTests(TestCase):
+    """export_orders streams live and archived orders, oldest first, within the requested days."""
+
+    @classmethod
+    def setUpTestData(cls):
+        customer = Customer.objects.create(name='Regular', phone='9876543210')
+        item = Item.objects.create(name='Latte', price='120.00')
+        cls.orders = [
+            place_order(customer=customer, order_type='DINING', lines=[(item.id, 1 + day)], table_no='1').order.pk
+            for day in range(3)
+        ]
+        for day, pk in enumerate(cls.orders):
+            Order.objects.filter(pk=pk).update(created_at=datetime(2026, 3, 1 + day, 12, tzinfo=dt_timezone.utc))
+        transition_orders(cls.orders[:1], 'abandon')
+        Order.objects.filter(pk=cls.orders[0]).update(updated_at=timezone.now() - timedelta(days=120))
+        call_command('archive_orders', pause=0, stdout=io.StringIO())
+
+    def _export(self, *args):
+        out = io.StringIO()
+        call_command('export_orders', '--chunk-size=1', *args, stdout=out)
+        return out.getvalue()
+
+    def test_jsonl_covers_the_archive(self):
+        records = [json.loads(line) for line in self._export('--format=jsonl').splitlines()]
+        self.assertEqual([r['id'] for r in records], self.orders)
+        self.assertEqual([r['items'][0]['quantity'] for r in records], [1, 2, 3])
+        self.assertEqual(records[0]['status'], 'CANCELED')
+
+    def test_date_range_and_csv(self):
+        lines = self._export('--from=2026-03-02', '--to=2026-03-02').splitlines()
+        self.assertEqual(len(lines), 2)
+        self.assertTrue(lines[1].startswith(f'{self.orders[1]},'))
+
+    def test_bad_arguments(self):
+        with self.assertRaises(CommandError):
+            self._export('--from=March')
+        with self.assertRaises(CommandError):
+            call_command('export_orders', '--chunk-size=0', stdout=io.StringIO())
@@ -8,17 +8,23 @@ urlpatterns = [
     # AI Bot page
     path('ask-ai/', views.ai_bot_view, name='ai_bot'),
     path('api/ai/chat', views.ai_chat_api, name='ai_chat_api'),
+    path('api/ai/combos', views.ai_combos_api, name='ai_combos_api'),
 
     # Items and management
     path('manager/', views.manager_dashboard, name='manager_dashboard'),
     path('manager/payments/', views.manager_payments_view, name='manager_payments'),
+    path('manager/payments/bulk/', views.manager_payments_bulk, name='manager_payments_bulk'),
     path('manager/payment/<int:payment_id>/verify/', views.verify_payment, name='verify_payment'),
     path('manager/order/<int:order_id>/send-to-chef/', views.manager_send_to_chef_confirm, name='manager_send_to_chef_confirm'),
     path('manager/orders/history/', views.manager_order_history, name='manager_order_history'),
+    path('manager/orders/export/', views.manager_export_orders, name='manager_export_orders'),
     path('manager/order/<int:order_id>/restore/', views.manager_restore_order, name='manager_restore_order'),
     path('manager/analytics/sales/', views.manager_sales_analytics, name='manager_sales'),
     path('manager/analytics/items/', views.manager_items_analytics, name='manager_items'),
     path('manager/analytics/customers/', views.manager_customers_analytics, name='manager_customers'),
+    path('manager/analytics/kitchen/', views.manager_kitchen_sla, name='manager_kitchen_sla'),
+    path('manager/analytics/kitchen.json', views.manager_kitchen_sla_json, name='manager_kitchen_sla_json'),
+    path('manager/analytics/forecast/', views.manager_forecast, name='manager_forecast'),
 
     path('items/', views.items_list, name='items_list'),
     path('items/add/', views.item_create, name='item_create'),
@@ -29,6 +35,7 @@ urlpatterns = [
     path('cart/', views.cart_detail, name='cart_detail'),
     path('cart/add/<int:item_id>/', views.add_to_cart, name='add_to_cart'),
     path('cart/update/<int:item_id>/', views.update_cart, name='update_cart'),
+    path('cart/batch/', views.cart_batch, name='cart_batch'),
 
     # Checkout
     path('checkout/', views.checkout_choose, name='checkout_choose'),
@@ -37,6 +44,7 @@ urlpatterns = [
     path('payment/', views.payment_page, name='payment_page'),
     path('order/<int:order_id>/status/', views.order_status, name='order_status'),
     path('order/<int:order_id>/status.json', views.order_status_json, name='order_status_json'),
+    path('order/<int:order_id>/events/', views.order_events, name='order_events'),
     path('order/<int:order_id>/confirm/', views.order_confirm, name='order_confirm'),
     path('confirmation/', views.order_confirmation, name='order_confirmation'),
 
@@ -61,13 +69,20 @@ urlpatterns = [
     path('track-order/', views.track_order_view, name='track_order'),
     path('track-order/<int:order_id>/', views.track_order_view, name='track_order_detail'),
     
+    # Live order updates for staff dashboards (SSE, ASGI only)
+    path('staff/events/', views.staff_events, name='staff_events'),
+
     # Chef dashboard
     path('chef/', views.chef_dashboard, name='chef_dashboard'),
+    path('chef/delta/', views.chef_delta, name='chef_delta'),
     path('chef/order/<int:order_id>/start/', views.chef_start_preparing, name='chef_start_preparing'),
     path('chef/order/<int:order_id>/ready/', views.chef_mark_ready, name='chef_mark_ready'),
+    path('chef/orders/bulk/', views.chef_bulk_action, name='chef_bulk_action'),
     
     # Waiter/Transit dashboard
     path('waiter/', views.waiter_dashboard, name='waiter_dashboard'),
+    path('waiter/delta/', views.waiter_delta, name='waiter_delta'),
     path('waiter/order/<int:order_id>/pickup/', views.waiter_pickup_order, name='waiter_pickup_order'),
     path('waiter/order/<int:order_id>/complete/', views.waiter_complete_order, name='waiter_complete_order'),
+    path('waiter/orders/bulk/', views.waiter_bulk_action, name='waiter_bulk_action'),
 ]
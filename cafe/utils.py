@@ -1,5 +1,14 @@
+from decimal import Decimal
+from django.db import transaction
+from django.db.models import Case, DecimalField, F, PositiveIntegerField, Sum, Value, When
+from django.db.models.functions import Least
+from django.http import Http404
+from django.utils import timezone
 from .models import Cart, CartItem, Item
-from django.shortcuts import get_object_or_404
+
+CART_SUMMARY_SESSION_KEY = 'cart_summary'
+# Most of one item a cart line may hold; larger quantities are capped
+CART_MAX_QUANTITY = 99
 
 
 def get_or_create_cart(request):
@@ -14,9 +23,10 @@ def get_or_create_cart(request):
     if request.user.is_authenticated and hasattr(request.user, 'customer_profile'):
         customer = request.user.customer_profile
         if cart:
-            # Link existing cart to customer
-            cart.customer = customer
-            cart.save()
+            # Link existing cart to customer (only write when it actually changes)
+            if cart.customer_id != customer.id:
+                cart.customer = customer
+                cart.save(update_fields=['customer', 'updated_at'])
         else:
             # Try to find customer's existing cart or create new one
             cart = Cart.objects.filter(customer=customer, status='OPEN').first()
@@ -29,32 +39,161 @@ def get_or_create_cart(request):
     return cart
 
 
-def add_item(cart: Cart, item_id: int, quantity: int = 1):
-    item = get_object_or_404(Item, pk=item_id, is_active=True)
-    cart_item, created = CartItem.objects.get_or_create(
-        cart=cart,
-        item=item,
-        defaults={'quantity': 0, 'unit_price': item.price}
+def find_open_cart_id(request):
+    """Look up the visitor's open cart without creating a session or a cart."""
+    session_key = request.session.session_key
+    if session_key:
+        cart_id = Cart.objects.filter(session_key=session_key, status='OPEN').values_list('id', flat=True).first()
+        if cart_id:
+            return cart_id
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_authenticated and hasattr(user, 'customer_profile'):
+        return Cart.objects.filter(customer=user.customer_profile, status='OPEN').values_list('id', flat=True).first()
+    return None
+
+
+def summarize_cart(cart_id):
+    """Item count and total for a cart, computed in a single aggregate query."""
+    if not cart_id:
+        return {'count': 0, 'total': Decimal('0')}
+    agg = CartItem.objects.filter(cart_id=cart_id).aggregate(
+        count=Sum('quantity'),
+        total=Sum(F('quantity') * F('unit_price')),
     )
-    cart_item.quantity += max(1, quantity)
-    # snapshot unit price
-    cart_item.unit_price = item.price
-    cart_item.save()
-    return cart_item
-
-
-def set_quantity(cart: Cart, item_id: int, quantity: int):
-    item = get_object_or_404(Item, pk=item_id)
-    try:
-        ci = CartItem.objects.get(cart=cart, item=item)
-    except CartItem.DoesNotExist:
-        return None
-    if quantity <= 0:
-        ci.delete()
-        return None
-    ci.quantity = quantity
-    ci.save()
-    return ci
+    return {'count': agg['count'] or 0, 'total': agg['total'] or Decimal('0')}
+
+
+def store_cart_summary(request, summary):
+    # Sessions are JSON-serialized, so keep the Decimal total as a string
+    request.session[CART_SUMMARY_SESSION_KEY] = {
+        'count': int(summary['count']),
+        'total': str(summary['total']),
+    }
+
+
+def get_cart_summary(request):
+    """
+    Return the cart badge data ({'count', 'total'}), cached in the session.
+
+    Visitors without a session never have a cart, so they get zeros without
+    touching the database or creating a session row.
+    """
+    if not request.session.session_key:
+        return {'count': 0, 'total': Decimal('0')}
+    cached = request.session.get(CART_SUMMARY_SESSION_KEY)
+    if cached is not None:
+        return {'count': cached['count'], 'total': Decimal(cached['total'])}
+    summary = summarize_cart(find_open_cart_id(request))
+    store_cart_summary(request, summary)
+    return summary
+
+
+def invalidate_cart_summary(request):
+    if request is not None and CART_SUMMARY_SESSION_KEY in request.session:
+        del request.session[CART_SUMMARY_SESSION_KEY]
+
+
+def _fold_cart_changes(changes):
+    """Collapse a sequence of (item_id, quantity, mode) into one op per item."""
+    ops = {}
+    for item_id, quantity, mode in changes:
+        prev = ops.get(item_id)
+        if mode == 'set' or prev is None:
+            ops[item_id] = (mode, quantity)
+        else:
+            # 'add' on top of an earlier op keeps the earlier mode
+            ops[item_id] = (prev[0], prev[1] + quantity)
+    return ops
+
+
+def apply_cart_changes(cart: Cart, changes, request=None):
+    """
+    Apply a batch of cart mutations atomically.
+
+    ``changes`` is an iterable of ``(item_id, quantity, mode)`` tuples where
+    mode is ``'add'`` (increment) or ``'set'`` (absolute, ``<= 0`` removes the
+    line); a line never holds more than ``CART_MAX_QUANTITY``. Quantities are
+    changed with ``F()`` expressions, so parallel requests never lose
+    increments, and the statement count does not grow with the batch size: one
+    price lookup, one INSERT ... ON CONFLICT DO NOTHING, one CASE-based UPDATE
+    and one DELETE.
+
+    Returns ``{item_id: status}`` with status ``'ok'``, ``'removed'``,
+    ``'not_found'``, ``'unavailable'`` (inactive item) or ``'invalid'`` (an
+    ``'add'`` of zero or less; nothing is applied for that item).
+    """
+    changes = list(changes)
+    invalid = {item_id for item_id, quantity, mode in changes if mode == 'add' and quantity <= 0}
+    ops = _fold_cart_changes(change for change in changes if change[0] not in invalid)
+    results = {item_id: 'invalid' for item_id in invalid}
+    if not ops:
+        return results
+    with transaction.atomic():
+        items = {
+            row['id']: row
+            for row in Item.objects.filter(pk__in=ops.keys()).values('id', 'price', 'is_active')
+        }
+        upserts = {}
+        removals = []
+        for item_id, (mode, quantity) in ops.items():
+            item = items.get(item_id)
+            if item is None:
+                results[item_id] = 'not_found'
+            elif mode == 'set' and quantity <= 0:
+                removals.append(item_id)
+                results[item_id] = 'removed'
+            elif not item['is_active']:
+                results[item_id] = 'unavailable'
+            else:
+                upserts[item_id] = (mode, quantity)
+                results[item_id] = 'ok'
+
+        if removals:
+            CartItem.objects.filter(cart=cart, item_id__in=removals).delete()
+        if upserts:
+            # Make sure a row exists for every active item; concurrent inserts are ignored
+            CartItem.objects.bulk_create(
+                [
+                    CartItem(cart=cart, item_id=item_id, quantity=0, unit_price=items[item_id]['price'])
+                    for item_id in upserts
+                ],
+                ignore_conflicts=True,
+            )
+            quantity_cases = []
+            price_cases = []
+            for item_id, (mode, quantity) in upserts.items():
+                if mode == 'add':
+                    quantity_cases.append(When(item_id=item_id, then=Least(
+                        F('quantity') + Value(min(quantity, CART_MAX_QUANTITY), output_field=PositiveIntegerField()),
+                        Value(CART_MAX_QUANTITY),
+                    )))
+                    # snapshot unit price on add, as the cart always has
+                    price_cases.append(When(item_id=item_id, then=Value(items[item_id]['price'])))
+                else:
+                    quantity_cases.append(When(item_id=item_id, then=Value(min(quantity, CART_MAX_QUANTITY))))
+            update = {
+                'quantity': Case(*quantity_cases, default=F('quantity'), output_field=PositiveIntegerField()),
+                'updated_at': timezone.now(),
+            }
+            if price_cases:
+                update['unit_price'] = Case(*price_cases, default=F('unit_price'), output_field=DecimalField())
+            CartItem.objects.filter(cart=cart, item_id__in=upserts.keys()).update(**update)
+    invalidate_cart_summary(request)
+    return results
+
+
+def add_item(cart: Cart, item_id: int, quantity: int = 1, request=None):
+    result = apply_cart_changes(cart, [(item_id, max(1, quantity), 'add')], request=request)
+    if result.get(item_id) != 'ok':
+        raise Http404('Item not available')
+    return result[item_id]
+
+
+def set_quantity(cart: Cart, item_id: int, quantity: int, request=None):
+    result = apply_cart_changes(cart, [(item_id, quantity, 'set')], request=request)
+    if result.get(item_id) == 'not_found':
+        raise Http404('Item not found')
+    return result[item_id]
 
 
 def get_session_wishlist_ids(request):
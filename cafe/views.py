@@ -4,20 +4,41 @@ from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib import messages
 from django.urls import reverse
+from django.template.loader import render_to_string
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.forms import AuthenticationForm, SetPasswordForm
 from django.contrib.auth import get_user_model
+from django.core.exceptions import BadRequest
 from django.db import models
-from .models import Item, CartItem, Order, OrderItem, Customer, Address, Offer, WishlistItem, Payment
+from .models import Item, CartItem, Order, OrderItem, Customer, Address, Offer, WishlistItem, Payment, DailySalesRollup, ArchivedOrder
 from .forms import ItemForm, DiningForm, DeliveryForm
-from .utils import get_or_create_cart, add_item, set_quantity, get_session_wishlist_ids
+from .utils import (
+    get_or_create_cart, add_item, set_quantity, apply_cart_changes, get_session_wishlist_ids,
+    invalidate_cart_summary, store_cart_summary, summarize_cart, CART_MAX_QUANTITY,
+)
 from .ai_engine import CafeAIEngine
-from django.http import JsonResponse
+from .archive import archive_includes
+from .combos import MAX_PEOPLE
+from .dashboard import dashboard_metrics
+from .events import STAFF_CHANNEL, get_hub, order_channel
+from .exports import EXPORT_FORMATS, EXPORTERS, aiter_export, orders_for_export, parse_date_range
+from .menu import get_menu_snapshot, top_sellers
+from .notifications import get_order_state, wait_for_order_change
+from .services import (
+    OrderPlacementError, clean_idempotency_key, find_idempotent_order_id, lines_from_cart, place_order,
+    settle_payments, transition_orders,
+)
+from .sla import SLA_MAX_DAYS, kitchen_sla_report
+from asgiref.sync import sync_to_async
+from django.http import Http404, HttpResponse, HttpResponseNotModified, JsonResponse, StreamingHttpResponse
 from django.utils import timezone
 from django.views.decorators.http import require_POST
 from django.views.decorators.csrf import ensure_csrf_cookie
 import json
 import logging
+import math
+import uuid
+from datetime import datetime, timedelta, timezone as dt_timezone
 
 logger = logging.getLogger(__name__)
 
@@ -68,7 +89,13 @@ def ai_chat_api(request):
     if not message:
         return JsonResponse({"error": "Missing 'message'."}, status=400)
 
-    engine = CafeAIEngine(request)
+    # Retried messages carry the same key; if it already placed an order, answer without re-running it
+    idempotency_key = clean_idempotency_key(payload.get('idempotency_key'))
+    replayed_order_id = find_idempotent_order_id(idempotency_key)
+    if replayed_order_id:
+        return JsonResponse(CafeAIEngine.order_placed_reply(replayed_order_id))
+
+    engine = CafeAIEngine(request, idempotency_key=idempotency_key)
     try:
         response = engine.handle(message)
         engine.persist()
@@ -78,6 +105,25 @@ def ai_chat_api(request):
 
     return JsonResponse(response)
 
+
+def ai_combos_api(request):
+    """Best combos within ?budget= rupees for ?people= (default 1), as JSON"""
+    try:
+        budget = int(request.GET['budget'])
+        people = int(request.GET.get('people', 1))
+        limit = int(request.GET.get('limit', 3))
+    except KeyError:
+        return JsonResponse({"error": "Missing 'budget'."}, status=400)
+    except ValueError:
+        return JsonResponse({"error": "'budget', 'people' and 'limit' must be whole numbers."}, status=400)
+    if budget < 1 or not 1 <= people <= MAX_PEOPLE or not 1 <= limit <= 10:
+        return JsonResponse({"error": f"Need budget >= 1, people between 1 and {MAX_PEOPLE}, limit between 1 and 10."}, status=400)
+
+    combos = get_menu_snapshot().planner.plan(
+        budget, people, popular_ids=[row['id'] for row in top_sellers()], limit=limit,
+    )
+    return JsonResponse({"budget": budget, "people": people, "combos": [combo.as_dict() for combo in combos]})
+
 # ---- Manager permission helper ----
 def is_manager(user):
     return user.is_authenticated and (user.is_staff or user.groups.filter(name='Manager').exists())
@@ -92,79 +138,8 @@ def items_list(request):
 @login_required
 @user_passes_test(is_manager)
 def manager_dashboard(request):
-    # Aggregations for analytics
-    from django.db.models import Sum, Count, Avg, F
-    from django.db.models.functions import ExtractHour, TruncDate
-    from decimal import Decimal
-    
-    # Top items by quantity
-    top_items = (
-        OrderItem.objects
-        .values('item__name', 'item_id')
-        .annotate(total_qty=Sum('quantity'), total_revenue=Sum(F('quantity') * F('unit_price')))
-        .order_by('-total_qty')[:10]
-    )
-    
-    # Orders by hour
-    orders_by_hour = (
-        Order.objects
-        .annotate(hour=ExtractHour('created_at'))
-        .values('hour')
-        .annotate(c=Count('id'))
-        .order_by('hour')
-    )
-    
-    # Daily revenue trend (last 7 days)
-    from datetime import timedelta
-    from django.utils import timezone
-    week_ago = timezone.now() - timedelta(days=7)
-    daily_revenue = (
-        Order.objects
-        .filter(created_at__gte=week_ago, status__in=['PAID', 'PREPARING', 'COMPLETED'])
-        .annotate(date=TruncDate('created_at'))
-        .values('date')
-        .annotate(revenue=Sum('total_amount'), orders=Count('id'))
-        .order_by('date')
-    )
-    
-    # Order statistics
-    total_orders = Order.objects.count()
-    status_counts = Order.objects.values('status').annotate(c=Count('id'))
-    
-    # Revenue metrics
-    total_revenue = Order.objects.filter(status__in=['PAID', 'PREPARING', 'COMPLETED']).aggregate(Sum('total_amount'))['total_amount__sum'] or Decimal('0')
-    avg_order_value = Order.objects.filter(status__in=['PAID', 'PREPARING', 'COMPLETED']).aggregate(Avg('total_amount'))['total_amount__avg'] or Decimal('0')
-    
-    # Pending payments
-    payments_pending = Payment.objects.filter(status='PENDING').select_related('order', 'order__customer').order_by('-created_at')[:20]
-    
-    # Recent customers
-    customers = Customer.objects.annotate(
-        order_count=Count('orders')
-    ).order_by('-created_at')[:10]
-    
-    # Order type distribution
-    order_type_dist = Order.objects.values('order_type').annotate(c=Count('id'))
-    
-    # Calculate percentage for status distribution
-    status_percentages = []
-    for sc in status_counts:
-        percentage = (sc['c'] / total_orders * 100) if total_orders > 0 else 0
-        status_percentages.append({'status': sc['status'], 'count': sc['c'], 'percentage': round(percentage, 1)})
-    
-    context = {
-        'top_items': list(top_items),
-        'orders_by_hour': list(orders_by_hour),
-        'daily_revenue': list(daily_revenue),
-        'total_orders': total_orders,
-        'total_revenue': total_revenue,
-        'avg_order_value': avg_order_value,
-        'status_counts': list(status_counts),
-        'status_percentages': status_percentages,
-        'order_type_dist': list(order_type_dist),
-        'payments_pending': payments_pending,
-        'customers': customers,
-    }
+    # Aggregations for analytics (rollup-backed, cached briefly; see cafe.dashboard)
+    context = dashboard_metrics()
     return render(request, 'cafe/manager_dashboard.html', context)
 
 
@@ -218,15 +193,17 @@ def item_delete(request, pk):
 
 def cart_detail(request):
     cart = get_or_create_cart(request)
-    items = cart.items.select_related('item')
+    items = list(cart.items.select_related('item'))
     total = sum(ci.subtotal for ci in items)
+    # Items are already loaded, so refresh the badge summary for free
+    store_cart_summary(request, {'count': sum(ci.quantity for ci in items), 'total': total})
     return render(request, 'cafe/cart.html', {"cart": cart, "items": items, "total": total})
 
 
 
 def add_to_cart(request, item_id):
     cart = get_or_create_cart(request)
-    add_item(cart, item_id, quantity=1)
+    add_item(cart, item_id, quantity=1, request=request)
     messages.success(request, 'Added to cart')
     # Redirect back with a flag to trigger the dining/delivery prompt
     referer = request.META.get('HTTP_REFERER', reverse('items_list'))
@@ -239,11 +216,49 @@ def update_cart(request, item_id):
     if request.method == 'POST':
         qty = int(request.POST.get('quantity', '1'))
         cart = get_or_create_cart(request)
-        set_quantity(cart, item_id, qty)
+        set_quantity(cart, item_id, qty, request=request)
         messages.success(request, 'Cart updated')
     return redirect('cart_detail')
 
 
+CART_BATCH_MAX_CHANGES = 100
+
+
+@require_POST
+def cart_batch(request):
+    """
+    Apply several cart changes in one round trip.
+
+    Body: {"changes": [{"item_id": 3, "quantity": 2, "mode": "add"|"set"}, ...]}
+    """
+    try:
+        payload = json.loads(request.body.decode('utf-8'))
+        raw_changes = payload['changes']
+        changes = [
+            (int(c['item_id']), int(c.get('quantity', 1)), c.get('mode', 'add'))
+            for c in raw_changes
+        ]
+    except (AttributeError, KeyError, TypeError, ValueError, OverflowError, UnicodeDecodeError, json.JSONDecodeError):
+        # OverflowError: a JSON 1e400 parses to float inf
+        return JsonResponse({"error": "Invalid JSON body."}, status=400)
+    if not changes or len(changes) > CART_BATCH_MAX_CHANGES:
+        return JsonResponse({"error": f"Send between 1 and {CART_BATCH_MAX_CHANGES} changes."}, status=400)
+    if any(mode not in ('add', 'set') for _, _, mode in changes):
+        return JsonResponse({"error": "mode must be 'add' or 'set'."}, status=400)
+    if any(quantity > CART_MAX_QUANTITY for _, quantity, _ in changes):
+        return JsonResponse({"error": f"quantity can be at most {CART_MAX_QUANTITY}."}, status=400)
+
+    cart = get_or_create_cart(request)
+    results = apply_cart_changes(cart, changes, request=request)
+    summary = summarize_cart(cart.id)
+    store_cart_summary(request, summary)
+    return JsonResponse({
+        "results": {str(item_id): status for item_id, status in results.items()},
+        "cart_count": summary['count'],
+        "cart_total": str(summary['total']),
+    })
+
+
 # ---- Checkout ----
 
 def checkout_choose(request):
@@ -275,7 +290,8 @@ def _ensure_customer_user_and_login(request, customer: Customer, cart=None):
         user.set_unusable_password()
         user.save()
         customer.user = user
-        customer.save()
+        # Only the link: a full save would write back stale lifetime_* counters
+        customer.save(update_fields=['user', 'updated_at'])
         user_just_created = True
     
     login(request, customer.user)
@@ -365,7 +381,7 @@ def checkout_delivery(request):
             customer, _ = Customer.objects.get_or_create(name=name, phone=phone, defaults={'email': email})
             if email and not customer.email:
                 customer.email = email
-                customer.save()
+                customer.save(update_fields=['email', 'updated_at'])
             addr = Address.objects.create(
                 customer=customer,
                 line1=form.cleaned_data['line1'],
@@ -418,6 +434,11 @@ def checkout_delivery(request):
 
 def payment_page(request):
     from .models import PaymentConfig, Payment  # local import to avoid circular
+    idempotency_key = clean_idempotency_key(request.POST.get('idempotency_key')) if request.method == 'POST' else None
+    # A replayed submission (double click, client retry) goes straight to the original order
+    replayed_order_id = find_idempotent_order_id(idempotency_key)
+    if replayed_order_id:
+        return redirect('order_status', order_id=replayed_order_id)
     cart = get_or_create_cart(request)
     paycfg = PaymentConfig.objects.first()
     account_created_username = request.session.pop('account_created_username', None)
@@ -439,29 +460,32 @@ def payment_page(request):
         else:
             table_no = request.session.get('table_no', '')
 
-        items = list(cart.items.select_related('item'))
-        total = sum(ci.subtotal for ci in items)
         # Create order in PENDING_PAYMENT and record a Payment awaiting verification
-        order = Order.objects.create(
-            customer=customer,
-            order_type=order_type,
-            table_no=table_no,
-            delivery_address=address,
-            total_amount=total,
-            status='PENDING_PAYMENT',
-        )
-        for ci in items:
-            OrderItem.objects.create(order=order, item=ci.item, quantity=ci.quantity, unit_price=ci.unit_price)
-        # Clear cart
-        cart.items.all().delete()
-        cart.status = 'CHECKED_OUT'
-        cart.save()
-        # Save payment reference from user input (optional)
-        reference = request.POST.get('reference', '').strip()
-        Payment.objects.create(order=order, amount=total, reference=reference, status='PENDING')
+        try:
+            placed = place_order(
+                customer=customer,
+                order_type=order_type,
+                lines=lines_from_cart(cart),
+                table_no=table_no,
+                delivery_address=address,
+                # Save payment reference from user input (optional)
+                reference=request.POST.get('reference', '').strip(),
+                cart=cart,
+                idempotency_key=idempotency_key,
+            )
+        except OrderPlacementError as exc:
+            messages.error(request, str(exc))
+            return redirect('cart_detail')
+        invalidate_cart_summary(request)
+        order = placed.order
         return redirect('order_status', order_id=order.id)
 
-    return render(request, 'cafe/payment.html', {"paycfg": paycfg, "cart": cart, "account_created_username": account_created_username})
+    return render(request, 'cafe/payment.html', {
+        "paycfg": paycfg,
+        "cart": cart,
+        "account_created_username": account_created_username,
+        "idempotency_key": uuid.uuid4().hex,
+    })
 
 
 
@@ -472,47 +496,56 @@ def order_confirmation(request):
 
 
 
+ANALYTICS_MAX_DAYS = 3650
+
+
+def _analytics_days(request, default=30):
+    """The ``?days=`` window of an analytics page, clamped to something sensible."""
+    try:
+        days = int(request.GET.get('days', default))
+    except (TypeError, ValueError):
+        return default
+    return min(max(days, 1), ANALYTICS_MAX_DAYS)
+
+
 @login_required
 @user_passes_test(is_manager)
 
 def manager_sales_analytics(request):
-    """Detailed sales analytics page."""
-    from django.db.models import Sum, Count, Avg, F
-    from django.db.models.functions import TruncDate, TruncWeek, TruncMonth
+    """Detailed sales analytics page, read from the daily sales rollup."""
+    from django.db.models import Sum
     from datetime import timedelta
     from django.utils import timezone
     from decimal import Decimal
+    from .rollups import REVENUE_STATUSES
     
-    # Date range filter
-    days = int(request.GET.get('days', 30))
-    start_date = timezone.now() - timedelta(days=days)
+    # Date range filter (whole days; the rollup has one row per day, type and status)
+    days = _analytics_days(request)
+    start_date = timezone.localdate() - timedelta(days=days - 1)
+    in_range = DailySalesRollup.objects.filter(date__gte=start_date)
+    revenue_rows = in_range.filter(status__in=REVENUE_STATUSES)
     
     # Daily revenue
     daily_revenue = (
-        Order.objects
-        .filter(created_at__gte=start_date, status__in=['PAID', 'PREPARING', 'COMPLETED'])
-        .annotate(date=TruncDate('created_at'))
+        revenue_rows
         .values('date')
-        .annotate(revenue=Sum('total_amount'), orders=Count('id'))
+        .annotate(revenue=Sum('revenue'), orders=Sum('order_count'))
         .order_by('date')
     )
     
     # Total metrics
-    total_revenue = Order.objects.filter(
-        created_at__gte=start_date, 
-        status__in=['PAID', 'PREPARING', 'COMPLETED']
-    ).aggregate(Sum('total_amount'))['total_amount__sum'] or Decimal('0')
+    total_revenue = revenue_rows.aggregate(s=Sum('revenue'))['s'] or Decimal('0')
     
-    total_orders = Order.objects.filter(created_at__gte=start_date).count()
+    total_orders = in_range.aggregate(c=Sum('order_count'))['c'] or 0
     avg_order_value = total_revenue / total_orders if total_orders > 0 else Decimal('0')
     
     # Order type breakdown
-    order_type_revenue = Order.objects.filter(
-        created_at__gte=start_date,
-        status__in=['PAID', 'PREPARING', 'COMPLETED']
-    ).values('order_type').annotate(
-        revenue=Sum('total_amount'),
-        count=Count('id')
+    order_type_revenue = (
+        revenue_rows
+        .values('order_type')
+        .annotate(revenue=Sum('revenue'), count=Sum('order_count'))
+        .filter(count__gt=0)
+        .order_by()
     )
     
     context = {
@@ -531,36 +564,21 @@ def manager_sales_analytics(request):
 @user_passes_test(is_manager)
 
 def manager_items_analytics(request):
-    """Detailed items performance analytics."""
-    from django.db.models import Sum, Count, F, Avg
+    """Detailed items performance analytics, read from the item sales rollup."""
     from datetime import timedelta
     from django.utils import timezone
+    from .rollups import REVENUE_STATUSES, item_sales
     
     # Date range filter
-    days = int(request.GET.get('days', 30))
-    start_date = timezone.now() - timedelta(days=days)
+    days = _analytics_days(request)
+    start_date = timezone.localdate() - timedelta(days=days - 1)
+    sales = item_sales(since=start_date, statuses=REVENUE_STATUSES)
     
     # Most popular items
-    top_items = (
-        OrderItem.objects
-        .filter(order__created_at__gte=start_date, order__status__in=['PAID', 'PREPARING', 'COMPLETED'])
-        .values('item__name', 'item__id', 'item__price')
-        .annotate(
-            total_qty=Sum('quantity'),
-            total_revenue=Sum(F('quantity') * F('unit_price')),
-            order_count=Count('order', distinct=True)
-        )
-        .order_by('-total_qty')
-    )
+    top_items = sales.order_by('-total_qty')
     
     # Items that need restocking attention (low performers)
-    low_performers = (
-        OrderItem.objects
-        .filter(order__created_at__gte=start_date, order__status__in=['PAID', 'PREPARING', 'COMPLETED'])
-        .values('item__name', 'item__id')
-        .annotate(total_qty=Sum('quantity'))
-        .order_by('total_qty')[:10]
-    )
+    low_performers = sales.order_by('total_qty')[:10]
     
     context = {
         'top_items': list(top_items),
@@ -575,21 +593,15 @@ def manager_items_analytics(request):
 @user_passes_test(is_manager)
 
 def manager_customers_analytics(request):
-    """Detailed customer analytics."""
-    from django.db.models import Sum, Count, Avg
+    """Detailed customer analytics, read from the stored lifetime stats."""
+    from django.db.models import Sum
     from datetime import timedelta
     from django.utils import timezone
+    from decimal import Decimal
+    from .rollups import REVENUE_STATUSES
     
     # Top customers by spending
-    top_customers = (
-        Customer.objects
-        .annotate(
-            spent_amount=Sum('orders__total_amount', filter=models.Q(orders__status__in=['PAID', 'PREPARING', 'COMPLETED'])),
-            order_count=Count('orders')
-        )
-        .filter(spent_amount__isnull=False)
-        .order_by('-spent_amount')[:20]
-    )
+    top_customers = Customer.objects.filter(lifetime_spend__gt=0).order_by('-lifetime_spend')[:20]
     
     # Customer acquisition trend
     days = 30
@@ -597,10 +609,11 @@ def manager_customers_analytics(request):
     new_customers = Customer.objects.filter(created_at__gte=start_date).count()
     total_customers = Customer.objects.count()
     
-    # Average customer metrics
-    avg_customer_value = Customer.objects.aggregate(
-        avg_spent=Avg('orders__total_amount', filter=models.Q(orders__status__in=['PAID', 'PREPARING', 'COMPLETED']))
-    )['avg_spent'] or 0
+    # Average customer metrics (average paid order value)
+    paid = DailySalesRollup.objects.filter(status__in=REVENUE_STATUSES).aggregate(
+        revenue=Sum('revenue'), orders=Sum('order_count'),
+    )
+    avg_customer_value = paid['revenue'] / paid['orders'] if paid['orders'] else Decimal('0')
     
     context = {
         'top_customers': list(top_customers),
@@ -613,6 +626,95 @@ def manager_customers_analytics(request):
 
 
 
+def _as_clock(seconds):
+    """Seconds as m:ss (or h:mm:ss) for the SLA tables"""
+    if seconds is None:
+        return '—'
+    minutes, secs = divmod(int(round(seconds)), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}:{minutes:02d}:{secs:02d}" if hours else f"{minutes}:{secs:02d}"
+
+
+@login_required
+@user_passes_test(is_manager)
+
+def manager_kitchen_sla(request):
+    """Kitchen latency percentiles by hour of day and item category, read from the SLA sketches"""
+    days = min(_analytics_days(request, default=7), SLA_MAX_DAYS)
+    report = kitchen_sla_report(days)
+    metrics = [m['key'] for m in report['metrics']]
+
+    def cells(summary_row):
+        return [
+            {'count': summary_row[m]['count'], **{q: _as_clock(summary_row[m][q]) for q in ('p50', 'p90', 'p99')}}
+            for m in metrics
+        ]
+
+    context = {
+        'days': days,
+        'metrics': report['metrics'],
+        'overall': cells(report['overall']),
+        'by_hour': [{'hour': row['hour'], 'cells': cells(row)} for row in report['by_hour']],
+        'by_category': [{'category': row['category'], 'cells': cells(row)} for row in report['by_category']],
+    }
+    return render(request, 'cafe/manager_kitchen_sla.html', context)
+
+
+@login_required
+@user_passes_test(is_manager)
+
+def manager_kitchen_sla_json(request):
+    """Same percentiles as the kitchen SLA page, in seconds, as JSON"""
+    return JsonResponse(kitchen_sla_report(min(_analytics_days(request, default=7), SLA_MAX_DAYS)))
+
+
+@login_required
+@user_passes_test(is_manager)
+
+def manager_forecast(request):
+    """Units per item expected in the next hour and tomorrow, for prep planning"""
+    # NumPy is only needed here, so the rest of the site runs without it
+    from .forecast import DEFAULT_WEEKS, FORECAST_MAX_WEEKS, build_forecast
+
+    try:
+        weeks = int(request.GET.get('weeks', DEFAULT_WEEKS))
+    except (TypeError, ValueError):
+        weeks = DEFAULT_WEEKS
+    weeks = min(max(weeks, 1), FORECAST_MAX_WEEKS)
+    forecast = build_forecast(weeks=weeks)
+
+    item_ids = forecast.item_ids.tolist()
+    names = dict(Item.objects.filter(pk__in=item_ids).values_list('pk', 'name'))
+    rows = [
+        {
+            'name': names.get(pk, f'Item #{pk}'),
+            'next_hour': round(float(next_hour), 1),
+            'tomorrow': round(float(tomorrow), 1),
+            'peak_hour': int(hourly.argmax()),
+        }
+        for pk, next_hour, tomorrow, hourly in zip(
+            item_ids, forecast.next_hour, forecast.tomorrow_total, forecast.tomorrow_hourly,
+        )
+    ]
+    rows.sort(key=lambda row: (-row['tomorrow'], row['name']))
+
+    hourly_totals = forecast.tomorrow_hourly.sum(axis=0)
+    busiest = float(hourly_totals.max()) or 1.0
+    context = {
+        'weeks': weeks,
+        'rows': rows,
+        'next_hour_start': forecast.next_hour_start,
+        'tomorrow': forecast.tomorrow,
+        'tomorrow_hourly': [
+            {'hour': hour, 'units': round(float(units), 1), 'width': round(float(units) / busiest * 100)}
+            for hour, units in enumerate(hourly_totals)
+        ],
+        'next_hour_total': round(float(forecast.next_hour.sum()), 1),
+        'tomorrow_total': round(float(hourly_totals.sum()), 1),
+    }
+    return render(request, 'cafe/manager_forecast.html', context)
+
+
 @login_required
 @user_passes_test(is_manager)
 
@@ -641,34 +743,90 @@ def manager_payments_view(request):
 
 
 
+PAYMENT_BULK_MAX = 500
+
+
+@login_required
+@user_passes_test(is_manager)
+
+def manager_payments_bulk(request):
+    """
+    Verify or reject many payments in one request.
+
+    Form posts (``action`` + repeated ``payment_ids``) redirect back to the
+    payments page with a summary; JSON bodies ({"action": ..., "payment_ids": [...]})
+    get the per-payment results back.
+    """
+    if request.method != 'POST':
+        return redirect('manager_payments')
+    wants_json = request.content_type == 'application/json'
+    try:
+        if wants_json:
+            payload = json.loads(request.body.decode('utf-8'))
+            action = payload.get('action')
+            payment_ids = [int(pk) for pk in payload.get('payment_ids', [])]
+        else:
+            action = request.POST.get('action')
+            payment_ids = [int(pk) for pk in request.POST.getlist('payment_ids')]
+    except (AttributeError, TypeError, ValueError, UnicodeDecodeError, json.JSONDecodeError):
+        if wants_json:
+            return JsonResponse({"error": "Invalid JSON body."}, status=400)
+        messages.error(request, 'Invalid payment selection.')
+        return redirect('manager_payments')
+
+    error = None
+    if action not in ('verify', 'reject'):
+        error = "action must be 'verify' or 'reject'."
+    elif not payment_ids or len(payment_ids) > PAYMENT_BULK_MAX:
+        error = f"Select between 1 and {PAYMENT_BULK_MAX} payments."
+    if error:
+        if wants_json:
+            return JsonResponse({"error": error}, status=400)
+        messages.error(request, error)
+        return redirect('manager_payments')
+
+    results = settle_payments(payment_ids, action)
+    if wants_json:
+        return JsonResponse({"results": {str(pk): result for pk, result in results.items()}})
+
+    done = [pk for pk, result in results.items() if result in ('verified', 'rejected')]
+    if done:
+        messages.success(request, f"{'Verified' if action == 'verify' else 'Rejected'} {len(done)} payment(s).")
+    skipped = len(results) - len(done)
+    if skipped:
+        messages.warning(request, f'{skipped} payment(s) skipped: already settled or no longer awaiting payment.')
+    return redirect('manager_payments')
+
+
 @login_required
 @user_passes_test(is_manager)
 
 def verify_payment(request, payment_id: int):
     """Manager/Admin can verify a payment."""
-    from .models import Payment
-    from django.utils import timezone
-    
     payment = get_object_or_404(Payment, pk=payment_id)
     if request.method == 'POST':
         action = request.POST.get('action')
-        if action == 'verify':
-            payment.status = 'VERIFIED'
-            payment.verified_at = timezone.now()
-            payment.save()
-            # Update order status to PAID
-            payment.order.status = 'PAID'
-            payment.order.save()
-            messages.success(request, f'Payment for Order #{payment.order.id} verified.')
-            # Store order ID in session for next step
-            request.session['verified_order_id'] = payment.order.id
-            return redirect('manager_send_to_chef_confirm', order_id=payment.order.id)
-        elif action == 'reject':
-            payment.status = 'FAILED'
-            payment.save()
-            payment.order.status = 'REJECTED'
-            payment.order.save()
-            messages.warning(request, f'Payment for Order #{payment.order.id} rejected.')
+        if action in ('verify', 'reject'):
+            # Same compare-and-swap as the bulk path, so two managers can't settle it both ways;
+            # the confirmation page below then sends the order to the chef or abandons it
+            result = settle_payments([payment.pk], action, send_to_chef=False).get(payment.pk)
+            if result == 'verified':
+                messages.success(request, f'Payment for Order #{payment.order_id} verified.')
+                # Store order ID in session for next step
+                request.session['verified_order_id'] = payment.order_id
+                return redirect('manager_send_to_chef_confirm', order_id=payment.order_id)
+            elif result == 'rejected':
+                messages.warning(request, f'Payment for Order #{payment.order_id} rejected.')
+            elif result == 'order_skipped':
+                messages.warning(
+                    request,
+                    f"Payment for Order #{payment.order_id} {'verified' if action == 'verify' else 'rejected'}, "
+                    f"but the order had already moved past the payment step.",
+                )
+            elif result == 'not_pending':
+                messages.error(request, f'Payment for Order #{payment.order_id} was already settled.')
+            else:
+                messages.error(request, f'Payment #{payment_id} not found.')
     # Check where to redirect - if from dedicated payments page, go back there
     referer = request.META.get('HTTP_REFERER', '')
     if 'payments' in referer:
@@ -682,22 +840,22 @@ def verify_payment(request, payment_id: int):
 
 def manager_send_to_chef_confirm(request, order_id):
     """Confirmation page to send order to chef or abandon"""
-    from django.utils import timezone
-    
     order = get_object_or_404(Order, pk=order_id)
     
     if request.method == 'POST':
         action = request.POST.get('action')
         if action == 'send_to_chef':
-            order.sent_to_chef_at = timezone.now()
-            order.save()
-            messages.success(request, f'Order #{order_id} sent to chef for preparation!')
+            if transition_orders([order_id], 'send_to_chef'):
+                messages.success(request, f'Order #{order_id} sent to chef for preparation!')
+            else:
+                messages.error(request, f'Order #{order_id} is not awaiting the kitchen')
             return redirect('manager_payments')
         elif action == 'abandon':
             # Move to canceled but keep in history
-            order.status = 'CANCELED'
-            order.save()
-            messages.info(request, f'Order #{order_id} abandoned. You can restore it from order history.')
+            if transition_orders([order_id], 'abandon'):
+                messages.info(request, f'Order #{order_id} abandoned. You can restore it from order history.')
+            else:
+                messages.error(request, f'Order #{order_id} can no longer be abandoned')
             return redirect('manager_order_history')
     
     # Show order details for confirmation
@@ -710,24 +868,91 @@ def manager_send_to_chef_confirm(request, order_id):
 
 
 
+ORDER_HISTORY_PAGE_SIZE = 50
+
+
+@login_required
+@user_passes_test(is_manager)
+
+def manager_export_orders(request):
+    """Stream the order ledger (?format=csv|jsonl, optional ?from= / ?to= dates) as a download"""
+    fmt = request.GET.get('format', 'csv')
+    if fmt not in EXPORT_FORMATS:
+        return HttpResponse(f"format must be one of: {', '.join(EXPORT_FORMATS)}", status=400, content_type='text/plain')
+    date_from = request.GET.get('from', '').strip()
+    date_to = request.GET.get('to', '').strip()
+    try:
+        start, end = parse_date_range(date_from, date_to)
+    except ValueError:
+        return HttpResponse('Dates must look like YYYY-MM-DD', status=400, content_type='text/plain')
+
+    rows = EXPORTERS[fmt](orders_for_export(start, end))
+    if 'wsgi.version' not in request.META:
+        # Served by ASGI: a sync iterator would be read into memory in full before sending
+        rows = aiter_export(rows)
+    response = StreamingHttpResponse(
+        rows,
+        content_type='text/csv; charset=utf-8' if fmt == 'csv' else 'application/x-ndjson',
+    )
+    span = f"{date_from or 'start'}_to_{date_to or 'now'}"
+    response['Content-Disposition'] = f'attachment; filename="orders_{span}.{fmt}"'
+    return response
+
+
+
 @login_required
 @user_passes_test(is_manager)
 
 def manager_order_history(request):
-    """View all orders including canceled ones with option to restore"""
-    from django.db.models import Q
+    """View all orders including canceled ones with option to restore (keyset-paginated, filterable)"""
+    from urllib.parse import urlencode
     
-    # Get status filter from query params
+    # Filters from query params
     status_filter = request.GET.get('status', 'all')
+    type_filter = request.GET.get('type', 'all')
+    phone_filter = request.GET.get('phone', '').strip()
+    date_from = request.GET.get('from', '').strip()
+    date_to = request.GET.get('to', '').strip()
     
-    orders = Order.objects.all().select_related('customer', 'payment').prefetch_related('items__item').order_by('-created_at')
-    
+    lookups = {}
     if status_filter != 'all':
-        orders = orders.filter(status=status_filter)
+        lookups['status'] = status_filter
+    if type_filter != 'all':
+        lookups['order_type'] = type_filter
+    if phone_filter:
+        lookups['customer__phone'] = phone_filter
+    try:
+        start, end = parse_date_range(date_from, date_to)
+    except ValueError:
+        messages.error(request, 'Dates must look like YYYY-MM-DD')
+        start = end = None
+    if start:
+        lookups['created_at__gte'] = start
+    if end:
+        lookups['created_at__lt'] = end
+    
+    # Finished orders may have been moved to the archive; page through both
+    models_to_read = [Order, ArchivedOrder] if archive_includes(status_filter) else [Order]
+    page, newer_cursor, older_cursor = _keyset_page(
+        request,
+        [
+            model.objects.filter(**lookups).select_related('customer', 'payment').prefetch_related('items__item')
+            for model in models_to_read
+        ],
+        ORDER_HISTORY_PAGE_SIZE,
+    )
+    filters = {'status': status_filter, 'type': type_filter, 'phone': phone_filter, 'from': date_from, 'to': date_to}
     
     context = {
-        'orders': orders,
+        'orders': page,
         'status_filter': status_filter,
+        'type_filter': type_filter,
+        'phone_filter': phone_filter,
+        'date_from': date_from,
+        'date_to': date_to,
+        'newer_cursor': newer_cursor,
+        'older_cursor': older_cursor,
+        'filter_query': urlencode({k: v for k, v in filters.items() if v and v != 'all'}),
     }
     return render(request, 'cafe/manager_order_history.html', context)
 
@@ -738,22 +963,18 @@ def manager_order_history(request):
 
 def manager_restore_order(request, order_id):
     """Restore a canceled order and send to chef"""
-    from django.utils import timezone
-    
-    order = get_object_or_404(Order, pk=order_id)
-    if request.method == 'POST' and order.status == 'CANCELED':
-        # Restore order to PAID status
-        order.status = 'PAID'
-        order.sent_to_chef_at = timezone.now()
-        order.save()
+    if request.method == 'POST' and transition_orders([order_id], 'restore'):
+        # Restored to PAID and sent to chef
         messages.success(request, f'Order #{order_id} restored and sent to chef!')
-        return redirect('manager_order_history')
     return redirect('manager_order_history')
 
 
 
 def order_status(request, order_id: int):
-    order = get_object_or_404(Order, pk=order_id)
+    # Old finished orders live in the archive
+    order = Order.objects.filter(pk=order_id).first() or ArchivedOrder.objects.filter(pk=order_id).first()
+    if order is None:
+        raise Http404('No order matches the given query.')
     # If paid, show confirmation; else show waiting page
     if order.status == 'PAID':
         request.session['last_order_type'] = order.order_type
@@ -762,9 +983,112 @@ def order_status(request, order_id: int):
 
 
 
+ORDER_STATUS_MAX_WAIT = 25
+
+
 def order_status_json(request, order_id: int):
-    order = get_object_or_404(Order, pk=order_id)
-    return JsonResponse({"status": order.status})
+    """
+    Order status for polling clients.
+
+    Sends an ETag per order version and answers ``If-None-Match`` with 304
+    straight from the cache. With ``?wait=<seconds>`` (max 25) and a known
+    ETag, the request is held until the status changes or the wait expires.
+    """
+    state = get_order_state(order_id)
+    if state is None:
+        raise Http404('Order not found')
+    etag_prefix = f'"{order_id}-'
+    client_etag = request.headers.get('If-None-Match', '').removeprefix('W/')
+    known_version = client_etag[len(etag_prefix):-1] if client_etag.startswith(etag_prefix) else None
+
+    try:
+        wait = float(request.GET.get('wait', 0))
+    except ValueError:
+        wait = 0
+    # "nan" and "inf" parse as floats; nan would survive the clamp below
+    wait = min(max(wait, 0), ORDER_STATUS_MAX_WAIT) if math.isfinite(wait) else 0
+    if wait and known_version == state['version']:
+        state = wait_for_order_change(order_id, known_version, wait)
+        if state is None:
+            raise Http404('Order not found')
+
+    etag = f'{etag_prefix}{state["version"]}"'
+    if known_version == state['version']:
+        response = HttpResponseNotModified()
+    else:
+        response = JsonResponse({"status": state['status'], "version": state['version']})
+    response['ETag'] = etag
+    response['Cache-Control'] = 'no-cache'
+    return response
+
+
+
+SSE_HEARTBEAT_SECONDS = 15
+
+
+def _sse_message(event_type: str, data: dict, event_id: str = '') -> str:
+    head = f"id: {event_id}\n" if event_id else ''
+    return f"{head}event: {event_type}\ndata: {json.dumps(data)}\n\n"
+
+
+async def _sse_stream(channels, initial=()):
+    hub = get_hub()
+    sub = hub.subscribe(channels)
+    try:
+        yield "retry: 3000\n\n"
+        for event in initial:
+            yield _sse_message('order', event, event.get('version', ''))
+        while True:
+            item = await sub.get(SSE_HEARTBEAT_SECONDS)
+            if sub.lagged:
+                # We dropped events for this client; tell it to refetch everything
+                sub.lagged = False
+                yield _sse_message('resync', {})
+            if item is None:
+                yield ": ping\n\n"
+                continue
+            _, event = item
+            yield _sse_message('order', event, event.get('version', ''))
+    finally:
+        hub.unsubscribe(sub)
+
+
+def _sse_response(stream):
+    response = StreamingHttpResponse(stream, content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+def _sse_requires_asgi(request):
+    # Under WSGI an endless async stream would tie up a worker thread forever
+    if 'wsgi.version' in request.META:
+        return JsonResponse({"error": "Live updates need the ASGI server."}, status=503)
+    return None
+
+
+async def order_events(request, order_id: int):
+    """SSE stream of status changes for one order (same access rule as order tracking)."""
+    unavailable = _sse_requires_asgi(request)
+    if unavailable:
+        return unavailable
+    state = await sync_to_async(get_order_state)(order_id)
+    if state is None:
+        raise Http404('Order not found')
+    initial = [{'id': order_id, **state}]
+    return _sse_response(_sse_stream([order_channel(order_id)], initial))
+
+
+async def staff_events(request):
+    """SSE stream of every order status change, for the chef and waiter dashboards."""
+    unavailable = _sse_requires_asgi(request)
+    if unavailable:
+        return unavailable
+    user = await request.auser()
+    allowed = await sync_to_async(lambda: is_chef(user) or is_waiter(user) or is_manager(user))()
+    if not allowed:
+        return JsonResponse({"error": "Staff only."}, status=403)
+    return _sse_response(_sse_stream([STAFF_CHANNEL]))
 
 
 
@@ -775,17 +1099,32 @@ def order_confirm(request, order_id: int):
 
 
 
+ACCOUNT_RECENT_ORDERS = 10
+MY_ORDERS_PAGE_SIZE = 20
+
+
 def my_account_view(request):
     cart = get_or_create_cart(request)
     customer = cart.customer
     offers = Offer.objects.filter(active=True)
     session_wishlist_ids = get_session_wishlist_ids(request)
     wishlist_items = []
+    recent_orders = []
     if customer:
         wishlist_items = list(WishlistItem.objects.filter(customer=customer).select_related('item'))
+        # Most recent few only; the full history is paginated on My Orders
+        recent_orders = sorted(
+            [
+                *customer.orders.order_by('-created_at', '-id')[:ACCOUNT_RECENT_ORDERS + 1],
+                *customer.archived_orders.order_by('-created_at', '-id')[:ACCOUNT_RECENT_ORDERS + 1],
+            ],
+            key=lambda order: (order.created_at, order.id),
+            reverse=True,
+        )
     context = {
         'customer': customer,
-        'orders': customer.orders.all().prefetch_related('items', 'payment').order_by('-created_at') if customer else [],
+        'orders': recent_orders[:ACCOUNT_RECENT_ORDERS],
+        'more_orders': len(recent_orders) > ACCOUNT_RECENT_ORDERS,
         'addresses': customer.addresses.all() if customer else [],
         'offers': offers,
         'session_wishlist_ids': session_wishlist_ids,
@@ -800,14 +1139,23 @@ def my_orders_view(request):
     cart = get_or_create_cart(request)
     customer = cart.customer
     
-    # Get orders for logged-in customer
-    orders = []
+    # Get orders for logged-in customer, one keyset page at a time
+    orders, newer_cursor, older_cursor = [], None, None
     if customer:
-        orders = customer.orders.all().prefetch_related('items__item', 'payment').order_by('-created_at')
+        orders, newer_cursor, older_cursor = _keyset_page(
+            request,
+            [
+                related.select_related('payment', 'delivery_address').prefetch_related('items__item')
+                for related in (customer.orders, customer.archived_orders)
+            ],
+            MY_ORDERS_PAGE_SIZE,
+        )
     
     context = {
         'customer': customer,
         'orders': orders,
+        'newer_cursor': newer_cursor,
+        'older_cursor': older_cursor,
     }
     return render(request, 'cafe/my_orders.html', context)
 
@@ -815,18 +1163,21 @@ def my_orders_view(request):
 
 def track_order_view(request, order_id=None):
     """Track a specific order by ID - accessible to anyone with the order ID"""
-    if order_id:
-        order = get_object_or_404(Order, pk=order_id)
-    else:
+    from_form = not order_id
+    if from_form:
         # Allow tracking by order ID from form
         order_id = request.GET.get('order_id') or request.POST.get('order_id')
         if not order_id:
             return render(request, 'cafe/track_order.html', {'order': None})
-        try:
-            order = Order.objects.get(pk=order_id)
-        except Order.DoesNotExist:
-            messages.error(request, f'Order #{order_id} not found')
-            return render(request, 'cafe/track_order.html', {'order': None, 'not_found': True})
+    # Old finished orders live in the archive
+    order = None
+    if str(order_id).isdigit():
+        order = Order.objects.filter(pk=order_id).first() or ArchivedOrder.objects.filter(pk=order_id).first()
+    if order is None:
+        if not from_form:
+            raise Http404('No order matches the given query.')
+        messages.error(request, f'Order #{order_id} not found')
+        return render(request, 'cafe/track_order.html', {'order': None, 'not_found': True})
     
     # Get order items and payment info
     order_items = order.items.all().select_related('item')
@@ -958,6 +1309,154 @@ def is_waiter(user):
     return user.is_authenticated and (user.groups.filter(name='Waiter').exists() or user.is_staff)
 
 
+# ---- Dashboard delta feed (shared by chef and waiter boards) ----
+
+DELTA_BATCH_SIZE = 100
+# Transactions can commit slightly out of updated_at order, so the newest few
+# seconds are always re-sent; applying a change twice is harmless.
+DELTA_SETTLE_WINDOW = timedelta(seconds=2)
+_EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+
+CHEF_LANES = {'PAID': 'pending', 'PREPARING': 'preparing'}
+CHEF_LANE_TEMPLATES = {
+    'pending': 'cafe/partials/chef_pending_order.html',
+    'preparing': 'cafe/partials/chef_preparing_order.html',
+}
+# Board statuses plus the ones an order can leave the board into
+CHEF_WATCHED_STATUSES = ('PAID', 'PREPARING', 'READY_FOR_DELIVERY', 'CANCELED', 'REJECTED')
+
+WAITER_LANE_TEMPLATES = {
+    'ready_dining': 'cafe/partials/waiter_ready_dining_order.html',
+    'ready_delivery': 'cafe/partials/waiter_ready_delivery_order.html',
+    'out_dining': 'cafe/partials/waiter_out_dining_order.html',
+    'out_delivery': 'cafe/partials/waiter_out_delivery_order.html',
+}
+WAITER_WATCHED_STATUSES = ('READY_FOR_DELIVERY', 'OUT_FOR_DELIVERY', 'COMPLETED', 'CANCELED')
+
+
+def _chef_lane(order):
+    return CHEF_LANES.get(order.status)
+
+
+def _waiter_lane(order):
+    stage = {'READY_FOR_DELIVERY': 'ready', 'OUT_FOR_DELIVERY': 'out'}.get(order.status)
+    if not stage:
+        return None
+    return f"{stage}_{'delivery' if order.order_type == 'DELIVERY' else 'dining'}"
+
+
+def _encode_cursor(ts, order_id):
+    delta = ts - _EPOCH
+    micros = (delta.days * 86400 + delta.seconds) * 1_000_000 + delta.microseconds
+    return f"{micros}:{order_id}"
+
+
+def _decode_cursor(value):
+    """Inverse of _encode_cursor; ValueError for anything it could not have produced."""
+    micros, order_id = value.split(':', 1)
+    micros, order_id = int(micros), int(order_id)
+    if not 0 <= order_id < 2 ** 63:
+        raise ValueError(f"cursor id out of range: {value!r}")
+    try:
+        return _EPOCH + timedelta(microseconds=micros), order_id
+    except OverflowError:
+        raise ValueError(f"cursor time out of range: {value!r}") from None
+
+
+def _keyset_page(request, orders, page_size):
+    """
+    One page of ``orders``, newest first, keyed on ``(created_at, id)``.
+
+    ``?after=<cursor>`` continues with older orders and ``?before=<cursor>``
+    goes back towards newer ones, so every page costs the same index range
+    scan however deep it is. ``orders`` may also be a list of querysets (live
+    and archived orders), each paged the same way and merged. Returns
+    ``(orders, newer_cursor, older_cursor)``; a cursor is ``None`` when there
+    is nothing further that way. A cursor that does not decode raises
+    BadRequest (a 400) rather than quietly showing the first page.
+    """
+    sources = orders if isinstance(orders, (list, tuple)) else [orders]
+    backwards = 'before' in request.GET and 'after' not in request.GET
+    since = since_id = None
+    cursor = request.GET.get('before' if backwards else 'after')
+    if cursor is not None:
+        try:
+            since, since_id = _decode_cursor(cursor)
+        except ValueError:
+            raise BadRequest("Invalid page cursor.") from None
+
+    rows = []
+    for orders in sources:
+        if since is None:
+            orders = orders.order_by('-created_at', '-id')
+        elif backwards:
+            orders = (
+                orders.filter(models.Q(created_at__gt=since) | models.Q(created_at=since, id__gt=since_id))
+                .order_by('created_at', 'id')
+            )
+        else:
+            orders = (
+                orders.filter(models.Q(created_at__lt=since) | models.Q(created_at=since, id__lt=since_id))
+                .order_by('-created_at', '-id')
+            )
+        rows.extend(orders[:page_size + 1])
+    if len(sources) > 1:
+        rows.sort(key=lambda order: (order.created_at, order.id), reverse=not backwards)
+        rows = rows[:page_size + 1]
+    more = len(rows) > page_size
+    rows = rows[:page_size]
+    if backwards:
+        rows.reverse()
+    if not rows:
+        return rows, None, None
+    newest, oldest = rows[0], rows[-1]
+    newer = _encode_cursor(newest.created_at, newest.id) if (more if backwards else since is not None) else None
+    older = _encode_cursor(oldest.created_at, oldest.id) if (since is not None if backwards else more) else None
+    return rows, newer, older
+
+
+def _initial_delta_cursor():
+    return _encode_cursor(timezone.now() - DELTA_SETTLE_WINDOW, 0)
+
+
+def _dashboard_delta(request, watched_statuses, lane_for, lane_templates):
+    """
+    Orders that changed since ``?cursor=<updated_at micros>:<id>``.
+
+    Each change is ``{"id", "lane", "html"}``: ``lane`` is where the card now
+    belongs (``null`` means remove it) and ``html`` the freshly rendered card.
+    Uses the (status, updated_at) index; ``more`` is true when another page
+    is waiting.
+    """
+    try:
+        since, since_id = _decode_cursor(request.GET['cursor'])
+    except (KeyError, ValueError):
+        return JsonResponse({"error": "Missing or invalid cursor."}, status=400)
+
+    rows = list(
+        Order.objects
+        .filter(status__in=watched_statuses)
+        .filter(models.Q(updated_at__gt=since) | models.Q(updated_at=since, id__gt=since_id))
+        .select_related('customer', 'delivery_address')
+        .prefetch_related('items__item')
+        .order_by('updated_at', 'id')[:DELTA_BATCH_SIZE + 1]
+    )
+    more = len(rows) > DELTA_BATCH_SIZE
+    rows = rows[:DELTA_BATCH_SIZE]
+
+    changes = []
+    for order in rows:
+        lane = lane_for(order)
+        html = render_to_string(lane_templates[lane], {'order': order}, request=request) if lane else ''
+        changes.append({'id': order.id, 'lane': lane, 'html': html})
+
+    cursor = (rows[-1].updated_at, rows[-1].id) if rows else (since, since_id)
+    settle_from = timezone.now() - DELTA_SETTLE_WINDOW
+    if not more and cursor[0] > settle_from:
+        cursor = (settle_from, 0)
+    return JsonResponse({'cursor': _encode_cursor(*cursor), 'changes': changes, 'more': more})
+
+
 # ---- Chef Dashboard ----
 
 @login_required
@@ -980,23 +1479,27 @@ def chef_dashboard(request):
     context = {
         'pending_orders': pending_orders,
         'preparing_orders': preparing_orders,
+        'delta_url': reverse('chef_delta'),
+        'delta_cursor': _initial_delta_cursor(),
     }
     return render(request, 'cafe/chef_dashboard.html', context)
 
 
+@login_required
+@user_passes_test(is_chef)
+
+def chef_delta(request):
+    """Chef board changes since the client's cursor (see _dashboard_delta)."""
+    return _dashboard_delta(request, CHEF_WATCHED_STATUSES, _chef_lane, CHEF_LANE_TEMPLATES)
+
+
 
 @login_required
 @user_passes_test(is_chef)
 
 def chef_start_preparing(request, order_id):
     """Mark order as being prepared"""
-    from django.utils import timezone
-    
-    order = get_object_or_404(Order, pk=order_id)
-    if order.status == 'PAID':
-        order.status = 'PREPARING'
-        order.preparing_started_at = timezone.now()
-        order.save()
+    if transition_orders([order_id], 'start_preparing'):
         messages.success(request, f'Started preparing Order #{order_id}')
     else:
         messages.error(request, f'Order #{order_id} cannot be moved to preparing')
@@ -1010,13 +1513,7 @@ def chef_start_preparing(request, order_id):
 
 def chef_mark_ready(request, order_id):
     """Mark order as ready for delivery/pickup"""
-    from django.utils import timezone
-    
-    order = get_object_or_404(Order, pk=order_id)
-    if order.status == 'PREPARING':
-        order.status = 'READY_FOR_DELIVERY'
-        order.ready_at = timezone.now()
-        order.save()
+    if transition_orders([order_id], 'mark_ready'):
         messages.success(request, f'Order #{order_id} is ready for delivery!')
     else:
         messages.error(request, f'Order #{order_id} is not in preparing status')
@@ -1024,6 +1521,31 @@ def chef_mark_ready(request, order_id):
     return redirect('chef_dashboard')
 
 
+def _bulk_transition(request, actions, redirect_to):
+    """POST ``action`` + ``order_ids`` (repeated): apply one transition to all of them at once."""
+    transition = actions.get(request.POST.get('action'))
+    if request.method != 'POST' or not transition:
+        return redirect(redirect_to)
+    try:
+        order_ids = [int(pk) for pk in request.POST.getlist('order_ids')]
+    except ValueError:
+        order_ids = []
+    result = transition_orders(order_ids, transition)
+    if result.applied:
+        messages.success(request, f"Updated {len(result.applied)} order(s): " + ", ".join(f"#{pk}" for pk in result.applied))
+    if result.skipped:
+        messages.warning(request, "Skipped (already moved on): " + ", ".join(f"#{pk}" for pk in result.skipped))
+    return redirect(redirect_to)
+
+
+@login_required
+@user_passes_test(is_chef)
+
+def chef_bulk_action(request):
+    """Start or finish several tickets in one statement"""
+    return _bulk_transition(request, {'start': 'start_preparing', 'ready': 'mark_ready'}, 'chef_dashboard')
+
+
 # ---- Waiter/Transit Dashboard ----
 
 @login_required
@@ -1054,22 +1576,36 @@ def waiter_dashboard(request):
         'delivery_ready': delivery_ready,
         'dining_out': dining_out,
         'delivery_out': delivery_out,
+        'delta_url': reverse('waiter_delta'),
+        'delta_cursor': _initial_delta_cursor(),
     }
     return render(request, 'cafe/waiter_dashboard.html', context)
 
 
+@login_required
+@user_passes_test(is_waiter)
+
+def waiter_delta(request):
+    """Waiter board changes since the client's cursor (see _dashboard_delta)."""
+    return _dashboard_delta(request, WAITER_WATCHED_STATUSES, _waiter_lane, WAITER_LANE_TEMPLATES)
+
+
+
+@login_required
+@user_passes_test(is_waiter)
+
+def waiter_bulk_action(request):
+    """Pick up or complete several orders (e.g. a whole table) in one statement"""
+    return _bulk_transition(request, {'pickup': 'pickup', 'complete': 'complete'}, 'waiter_dashboard')
+
+
 
 @login_required
 @user_passes_test(is_waiter)
 
 def waiter_pickup_order(request, order_id):
     """Mark order as picked up by waiter/delivery person"""
-    from django.utils import timezone
-    
-    order = get_object_or_404(Order, pk=order_id)
-    if order.status == 'READY_FOR_DELIVERY':
-        order.status = 'OUT_FOR_DELIVERY'
-        order.save()
+    if transition_orders([order_id], 'pickup'):
         messages.success(request, f'Picked up Order #{order_id}')
     else:
         messages.error(request, f'Order #{order_id} is not ready for pickup')
@@ -1083,13 +1619,7 @@ def waiter_pickup_order(request, order_id):
 
 def waiter_complete_order(request, order_id):
     """Mark order as delivered/completed"""
-    from django.utils import timezone
-    
-    order = get_object_or_404(Order, pk=order_id)
-    if order.status == 'OUT_FOR_DELIVERY':
-        order.status = 'COMPLETED'
-        order.completed_at = timezone.now()
-        order.save()
+    if transition_orders([order_id], 'complete'):
         messages.success(request, f'Order #{order_id} completed!')
     else:
         messages.error(request, f'Order #{order_id} is not out for delivery')
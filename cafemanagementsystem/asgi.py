@@ -3,6 +3,10 @@ ASGI config for cafemanagementsystem project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Serve the project through it (e.g. ``uvicorn cafemanagementsystem.asgi:application``)
+to enable the live order streams (``/order/<id>/events/`` and ``/staff/events/``);
+under WSGI those endpoints answer 503 and the pages fall back to polling.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 """
@@ -154,3 +154,20 @@ MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Cache shared by every worker process on the host: order status versions
+# (cafe.notifications) and the menu version (cafe.menu) must be seen by all
+# of them. Point CAFE_CACHE_BACKEND/CAFE_CACHE_LOCATION at Redis or Memcached
+# when running on several hosts.
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get('CAFE_CACHE_BACKEND', 'django.core.cache.backends.filebased.FileBasedCache'),
+        'LOCATION': os.environ.get('CAFE_CACHE_LOCATION', os.path.join(BASE_DIR, '.cache')),
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    }
+}
+
+# Live order updates (Server-Sent Events)
+# Single ASGI worker: the in-process backend is enough. With several workers on
+# one host, switch to 'cafe.events.FileLogBackend' so they share events.
+CAFE_EVENT_BACKEND = os.environ.get('CAFE_EVENT_BACKEND', 'cafe.events.InProcessBackend')
+CAFE_EVENT_LOG = os.environ.get('CAFE_EVENT_LOG', os.path.join(BASE_DIR, 'events.log'))